@@ -1,12 +1,57 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g, has_app_context, has_request_context, make_response, send_from_directory, stream_with_context
+from flask import request_started, request_finished, before_render_template, template_rendered
+import click
 import urllib.parse
+import urllib.request
+import urllib.error
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import os
+import sys
+import glob
+import re
+import ast
 import time
-from datetime import datetime
+import hashlib
+import tempfile
+import functools
+import threading
+import gzip
+import io
+import csv
+import json
+import random
+import uuid
+import zlib
+import hmac
+import atexit
+import bisect
+import queue
+import logging
+import logging.handlers
+from collections import deque, OrderedDict
+import smtplib
+import mimetypes
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from email.message import EmailMessage
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from markupsafe import Markup, escape
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it uploads are stored as-is
+    Image = None
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; quote sizing and bulk features need it
+    np = None
+try:
+    import brotli
+except ImportError:  # Brotli is optional; without it responses fall back to gzip
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
@@ -37,57 +82,289 @@ DB_CONFIG = {
     'password': ''  # Default XAMPP password is empty
 }
 
-def get_db_connection():
-    """Get database connection"""
+# Connection pool configuration (mysql.connector caps pool_size at 32)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+_db_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_db_pool_stats = {
+    'checkouts': 0,
+    'in_use': 0,
+    'peak_in_use': 0,
+    'waits': 0,
+    'wait_time': 0.0,
+    'timeouts': 0,
+    'errors': 0,
+    'leaks': 0
+}
+
+def update_pool_stats(**changes):
+    """Apply counter deltas to the pool statistics"""
+    with _db_pool_lock:
+        for key, delta in changes.items():
+            _db_pool_stats[key] += delta
+        _db_pool_stats['peak_in_use'] = max(_db_pool_stats['peak_in_use'], _db_pool_stats['in_use'])
+
+def get_pool_stats():
+    """Snapshot of the pool statistics for the health endpoint"""
+    with _db_pool_lock:
+        stats = dict(_db_pool_stats)
+    stats['pool_size'] = DB_POOL_SIZE
+    stats['timeout'] = DB_POOL_TIMEOUT
+    stats['available'] = DB_POOL_SIZE - stats['in_use']
+    stats['wait_time'] = round(stats['wait_time'], 4)
+    return stats
+
+def get_db_pool():
+    """Create the MySQL connection pool on first use"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = pooling.MySQLConnectionPool(
+                    pool_name='veeteq_pool',
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    consume_results=True,
+                    **DB_CONFIG
+                )
+    return _db_pool
+
+
+class PooledConnection:
+    """A connection checked out of the pool.
+
+    Request-scoped connections are shared by every helper that runs during the
+    request, so close() only records that the caller is done with it and the
+    teardown handler hands it back to the pool.
+    """
+
+    def __init__(self, connection, request_scoped=False):
+        self._connection = connection
+        self._request_scoped = request_scoped
+        self.opens = 0
+        self.closes = 0
+        self.returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def close(self):
+        self.closes += 1
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        """Return the connection to the pool exactly once"""
+        if self.returned:
+            return
+        self.returned = True
+        try:
+            self._connection.close()
+        except Error as e:
+            print(f"Error returning connection to pool: {e}")
+        finally:
+            _db_pool_slots.release()
+            update_pool_stats(in_use=-1)
+
+
+class InstrumentedCursor:
+    """A cursor that reports how long each statement takes.
+
+    Everything except execute/executemany is passed straight through to the
+    mysql.connector cursor; timings go to record_query.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, **kwargs)
+        finally:
+            record_query(operation, params, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            record_query(operation, seq_params, time.perf_counter() - started)
+
+
+def checkout_db_connection(request_scoped=False):
+    """Check a connection out of the pool, waiting up to DB_POOL_TIMEOUT seconds"""
+    if not _db_pool_slots.acquire(blocking=False):
+        started = time.perf_counter()
+        acquired = _db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT)
+        update_pool_stats(waits=1, wait_time=time.perf_counter() - started)
+        if not acquired:
+            update_pool_stats(timeouts=1)
+            print(f"Timed out after {DB_POOL_TIMEOUT}s waiting for a database connection")
+            return None
+    
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        connection = get_db_pool().get_connection()
     except Error as e:
+        _db_pool_slots.release()
+        update_pool_stats(errors=1)
         print(f"Error connecting to MySQL: {e}")
         return None
+    
+    update_pool_stats(checkouts=1, in_use=1)
+    return PooledConnection(connection, request_scoped=request_scoped)
 
-def get_setting(key, default_value=None):
-    """Get a setting value from the database"""
+def get_db_connection():
+    """Get database connection.
+
+    Inside an app context one pooled connection is checked out lazily and
+    reused until teardown; elsewhere (migrations, scripts) each call gets its own.
+    """
+    if not has_app_context():
+        return checkout_db_connection()
+    
+    connection = g.get('db')
+    if connection is None:
+        connection = checkout_db_connection(request_scoped=True)
+        if connection is None:
+            g.db_unavailable = True
+            return None
+        g.db = connection
+    connection.opens += 1
+    return connection
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request's pooled connection and record unclosed checkouts"""
+    connection = g.pop('db', None)
+    if connection is None:
+        return
+    if connection.closes < connection.opens:
+        update_pool_stats(leaks=1)
+    connection.release()
+
+# Settings are cached per process; other workers' writes are noticed by
+# comparing the table version at most once every SETTINGS_CACHE_TTL seconds.
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', 30))
+
+_settings_cache = {
+    'values': None,
+    'invalid': set(),
+    'version': None,
+    'checked_at': 0.0
+}
+_settings_lock = threading.Lock()
+
+def parse_setting_value(value, setting_type):
+    """Convert a stored setting string to its typed value; NULL stays None"""
+    if value is None:
+        return None
+    if setting_type == 'boolean':
+        return value.strip().lower() == 'true'
+    elif setting_type == 'integer':
+        return int(value)
+    elif setting_type == 'float':
+        return float(value)
+    elif setting_type == 'number':
+        return float(value) if '.' in value else int(value)
+    return value
+
+def get_settings_version(cursor):
+    """Cheap fingerprint of the settings table used to detect writes by other workers"""
+    cursor.execute("SELECT MAX(updated_at), COUNT(*) FROM settings")
+    return tuple(cursor.fetchone())
+
+def load_settings():
+    """Return the cached settings, reloading them with a single query when stale"""
+    now = time.time()
+    values = _settings_cache['values']
+    if values is not None and now - _settings_cache['checked_at'] < SETTINGS_CACHE_TTL:
+        return values
+    
     connection = get_db_connection()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT setting_value, setting_type FROM settings WHERE setting_key = %s", (key,))
-        result = cursor.fetchone()
+    if not connection:
+        return values
+    
+    cursor = connection.cursor()
+    try:
+        if values is not None:
+            version = get_settings_version(cursor)
+            if version == _settings_cache['version']:
+                _settings_cache['checked_at'] = now
+                return values
+        
+        cursor.execute("SELECT setting_key, setting_value, setting_type, updated_at FROM settings")
+        rows = cursor.fetchall()
+    except Error as e:
+        print(f"Error loading settings: {e}")
+        return values
+    finally:
         cursor.close()
         connection.close()
-        
-        if result:
-            value = result['setting_value']
-            setting_type = result['setting_type']
-            
-            # Convert value based on type
-            if setting_type == 'boolean':
-                return value.lower() == 'true'
-            elif setting_type == 'number':
-                try:
-                    return float(value) if '.' in value else int(value)
-                except ValueError:
-                    return default_value
-            else:
-                return value
-        
+    
+    values = {}
+    invalid = set()
+    latest = None
+    for key, value, setting_type, updated_at in rows:
+        try:
+            values[key] = parse_setting_value(value, setting_type)
+        except ValueError:
+            values[key] = value
+            invalid.add(key)
+        if updated_at is not None and (latest is None or updated_at > latest):
+            latest = updated_at
+    
+    with _settings_lock:
+        _settings_cache['values'] = values
+        _settings_cache['invalid'] = invalid
+        _settings_cache['version'] = (latest, len(rows))
+        _settings_cache['checked_at'] = now
+    return values
+
+def invalidate_settings_cache():
+    """Drop the cached settings so the next read reloads them"""
+    with _settings_lock:
+        _settings_cache['values'] = None
+        _settings_cache['version'] = None
+        _settings_cache['checked_at'] = 0.0
+
+def get_setting(key, default_value=None):
+    """Get a setting value from the settings cache"""
+    settings = load_settings()
+    if not settings or key not in settings or key in _settings_cache['invalid']:
         return default_value
-    return default_value
+    return settings[key]
 
-def set_setting(key, value, setting_type='string', description=None):
-    """Set a setting value in the database"""
+def set_settings(settings):
+    """Write (key, value, setting_type, description) tuples in one transaction"""
     connection = get_db_connection()
-    if connection:
-        cursor = connection.cursor()
-        
+    if not connection:
+        return False
+    
+    rows = []
+    for key, value, setting_type, description in settings:
         # Convert value to string for storage
         if setting_type == 'boolean':
             value_str = 'true' if value else 'false'
         else:
             value_str = str(value)
-        
-        
-        cursor.execute("""
+        rows.append((key, value_str, setting_type, description))
+    
+    cursor = connection.cursor()
+    try:
+        cursor.executemany("""
             INSERT INTO settings (setting_key, setting_value, setting_type, description) 
             VALUES (%s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE 
@@ -95,235 +372,2196 @@ def set_setting(key, value, setting_type='string', description=None):
             setting_type = VALUES(setting_type),
             description = VALUES(description),
             updated_at = CURRENT_TIMESTAMP
-        """, (key, value_str, setting_type, description))
+        """, rows)
+        connection.commit()
+    except Error as e:
+        connection.rollback()
+        print(f"Error saving settings: {e}")
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+    invalidate_settings_cache()
+    return True
+
+def set_setting(key, value, setting_type='string', description=None):
+    """Set a setting value in the database"""
+    return set_settings([(key, value, setting_type, description)])
+
+def get_all_settings():
+    """Get all settings as a dictionary"""
+    return dict(load_settings() or {})
+
+
+# Analytics rollups: daily counts and sums per status, kept in step with the
+# quotes/installations tables by the routes that write them. Each helper
+# applies a row's current contribution with sign +1 (after insert/update) or
+# -1 (before update/delete) inside the caller's transaction.
+def apply_quote_rollup(cursor, quote_id, sign):
+    """Add or remove a quote's contribution to daily_quote_stats"""
+    cursor.execute("""
+        INSERT INTO daily_quote_stats (stat_date, status, quote_count, estimated_cost, system_size)
+        SELECT DATE(created_at), COALESCE(status, ''), %s, %s * COALESCE(estimated_cost, 0), %s * COALESCE(system_size, 0)
+        FROM quotes WHERE id = %s
+        ON DUPLICATE KEY UPDATE
+        quote_count = quote_count + VALUES(quote_count),
+        estimated_cost = estimated_cost + VALUES(estimated_cost),
+        system_size = system_size + VALUES(system_size)
+    """, (sign, sign, sign, quote_id))
+
+def apply_installation_rollup(cursor, installation_id, sign):
+    """Add or remove an installation's contribution to daily_installation_stats"""
+    # Unscheduled installations are bucketed by the day they were recorded
+    cursor.execute("""
+        INSERT INTO daily_installation_stats (stat_date, status, installation_count, total_cost)
+        SELECT COALESCE(installation_date, DATE(created_at)), COALESCE(status, ''), %s, %s * COALESCE(total_cost, 0)
+        FROM installations WHERE id = %s
+        ON DUPLICATE KEY UPDATE
+        installation_count = installation_count + VALUES(installation_count),
+        total_cost = total_cost + VALUES(total_cost)
+    """, (sign, sign, installation_id))
+
+def rebuild_analytics_rollups(cursor):
+    """Recompute the daily rollup tables from the quotes and installations tables"""
+    cursor.execute("DELETE FROM daily_quote_stats")
+    cursor.execute("""
+        INSERT INTO daily_quote_stats (stat_date, status, quote_count, estimated_cost, system_size)
+        SELECT DATE(created_at), COALESCE(status, ''), COUNT(*), COALESCE(SUM(estimated_cost), 0), COALESCE(SUM(system_size), 0)
+        FROM quotes
+        GROUP BY DATE(created_at), COALESCE(status, '')
+    """)
+    cursor.execute("DELETE FROM daily_installation_stats")
+    cursor.execute("""
+        INSERT INTO daily_installation_stats (stat_date, status, installation_count, total_cost)
+        SELECT COALESCE(installation_date, DATE(created_at)), COALESCE(status, ''), COUNT(*), COALESCE(SUM(total_cost), 0)
+        FROM installations
+        GROUP BY COALESCE(installation_date, DATE(created_at)), COALESCE(status, '')
+    """)
+
+def get_quote_totals(cursor):
+    """Quote count, estimated cost and system size per status from the rollups (dictionary cursor)"""
+    cursor.execute("""
+        SELECT status, SUM(quote_count) AS count, SUM(estimated_cost) AS total, SUM(system_size) AS system_size
+        FROM daily_quote_stats
+        GROUP BY status
+    """)
+    return {row['status']: {'count': int(row['count'] or 0), 'total': row['total'] or 0, 'system_size': row['system_size'] or 0}
+            for row in cursor.fetchall()}
+
+def get_installation_totals(cursor):
+    """Installation count and total cost per status from the rollups (dictionary cursor)"""
+    cursor.execute("""
+        SELECT status, SUM(installation_count) AS count, SUM(total_cost) AS total
+        FROM daily_installation_stats
+        GROUP BY status
+    """)
+    return {row['status']: {'count': int(row['count'] or 0), 'total': row['total'] or 0}
+            for row in cursor.fetchall()}
+
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    """Rebuild the analytics rollup tables from scratch"""
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed.")
+        return
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    rebuild_analytics_rollups(cursor)
+    connection.commit()
+    cursor.execute("SELECT COUNT(*) FROM daily_quote_stats")
+    quote_rows = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM daily_installation_stats")
+    installation_rows = cursor.fetchone()[0]
+    cursor.close()
+    connection.close()
+    print(f"Rebuilt analytics rollups ({quote_rows} quote rows, {installation_rows} installation rows) in {time.perf_counter() - started:.2f}s")
+
+
+# Schema migrations: each step runs once, in order, and is recorded in the
+# schema_version table. Apply them with `flask --app app migrate`.
+def migration_001_core_tables(cursor):
+    """Create the core tables"""
+    tables = [
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            description TEXT,
+            price DECIMAL(10,2) NOT NULL,
+            wattage INT,
+            efficiency DECIMAL(5,2),
+            warranty_years INT,
+            manufacturer VARCHAR(100),
+            image_url VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id INT,
+            property_type VARCHAR(50),
+            roof_size DECIMAL(8,2),
+            energy_usage DECIMAL(8,2),
+            system_size DECIMAL(8,2),
+            estimated_cost DECIMAL(10,2),
+            estimated_savings DECIMAL(10,2),
+            status VARCHAR(20) DEFAULT 'pending',
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS installations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id INT,
+            quote_id INT,
+            installation_date DATE,
+            system_size DECIMAL(8,2),
+            total_cost DECIMAL(10,2),
+            status VARCHAR(50) DEFAULT 'scheduled',
+            technician VARCHAR(100),
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (quote_id) REFERENCES quotes(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            first_name VARCHAR(50),
+            last_name VARCHAR(50),
+            phone VARCHAR(20),
+            address TEXT,
+            city VARCHAR(50),
+            state VARCHAR(50),
+            zip_code VARCHAR(10),
+            role VARCHAR(20) DEFAULT 'client',
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS portfolio (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            image_url VARCHAR(255) NOT NULL,
+            category VARCHAR(50) DEFAULT 'installation',
+            location VARCHAR(100),
+            system_size DECIMAL(8,2),
+            installation_date DATE,
+            is_featured BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS settings (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            setting_key VARCHAR(100) UNIQUE NOT NULL,
+            setting_value TEXT,
+            setting_type VARCHAR(20) DEFAULT 'string',
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """
+    ]
+    
+    for table_sql in tables:
+        cursor.execute(table_sql)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS team_members (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            role VARCHAR(100) NOT NULL,
+            bio TEXT,
+            image_url VARCHAR(255),
+            bg_color VARCHAR(50) DEFAULT 'solar-blue',
+            display_order INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def migration_002_products_manufacturer(cursor):
+    """Add the manufacturer column to products tables created before it existed"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'products' AND COLUMN_NAME = 'manufacturer'
+    """)
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE products ADD COLUMN manufacturer VARCHAR(100)")
+
+def migration_003_default_data(cursor):
+    """Insert the default admin user, settings and team members"""
+    # Default admin user (username: admin, password: admin123)
+    admin_hash = generate_password_hash('admin123')
+    cursor.execute("""
+        INSERT IGNORE INTO users (username, password_hash, email, first_name, last_name, role) 
+        VALUES ('admin', %s, 'admin@veeteqsolar.com', 'Admin', 'User', 'admin')
+    """, (admin_hash,))
+    
+    default_settings = [
+        ('company_name', 'Veeteq Solar', 'string', 'The name of the company'),
+        ('default_currency', 'KSh', 'string', 'Currency symbol for prices'),
+        ('residential_cost_per_watt', '375', 'float', 'Cost per watt for residential installations'),
+        ('commercial_cost_per_watt', '325', 'float', 'Cost per watt for commercial installations'),
+        ('cost_per_kwh', '20', 'float', 'Average utility cost per kWh'),
+        ('email_notification_enabled', 'false', 'boolean', 'Enable email notifications'),
+        ('session_timeout', '30', 'integer', 'Session timeout in minutes'),
+        ('max_login_attempts', '5', 'integer', 'Maximum login attempts before lockout')
+    ]
+    
+    for key, value, type_key, description in default_settings:
+        cursor.execute("""
+            INSERT IGNORE INTO settings (setting_key, setting_value, setting_type, description)
+            VALUES (%s, %s, %s, %s)
+        """, (key, value, type_key, description))
+    
+    cursor.execute("SELECT COUNT(*) as count FROM team_members")
+    if cursor.fetchone()[0] == 0:
+        default_team = [
+            ('Cedric Sumba', 'CEO & Founder', '4+ years in renewable energy', 'cedric_sumba.jpg', 'solar-blue', 1),
+            ('Grace Wanjiku', 'Head of Engineering', 'Expert in system design', 'grace_wanjiku.jpg', 'solar-green', 2),
+            ('Peter Kamau', 'Installation Manager', 'Certified master electrician', 'peter_kamau.jpg', 'solar-orange', 3),
+            ('Mary Akinyi', 'Customer Success', 'Dedicated to customer satisfaction', 'mary_akinyi.jpg', 'solar-yellow', 4)
+        ]
+        
+        for name, role, bio, image, color, order in default_team:
+            cursor.execute("""
+                INSERT INTO team_members (name, role, bio, image_url, bg_color, display_order)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (name, role, bio, image, color, order))
+
+def migration_004_drop_legacy_tables(cursor):
+    """Remove the tables and foreign keys left over from the old user system"""
+    cursor.execute("DROP TABLE IF EXISTS admin_users")
+    cursor.execute("DROP TABLE IF EXISTS client_users")
+    cursor.execute("DROP TABLE IF EXISTS customers")
+    
+    # DROP FOREIGN KEY IF EXISTS is MariaDB syntax; plain MySQL may reject it
+    try:
+        cursor.execute("ALTER TABLE quotes DROP FOREIGN KEY IF EXISTS quotes_ibfk_1")
+        cursor.execute("ALTER TABLE installations DROP FOREIGN KEY IF EXISTS installations_ibfk_1")
+    except Error as e:
+        print(f"Note: Foreign key constraints may not exist: {e}")
+
+def migration_005_analytics_rollups(cursor):
+    """Create and backfill the daily analytics rollup tables"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_quote_stats (
+            stat_date DATE NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            quote_count INT NOT NULL DEFAULT 0,
+            estimated_cost DECIMAL(14,2) NOT NULL DEFAULT 0,
+            system_size DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, status)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_installation_stats (
+            stat_date DATE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            installation_count INT NOT NULL DEFAULT 0,
+            total_cost DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, status)
+        )
+    """)
+    rebuild_analytics_rollups(cursor)
+
+def create_index_if_missing(cursor, table, name, columns, kind=''):
+    """CREATE [kind] INDEX unless an index with that name already exists"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, name))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"CREATE {kind} INDEX {name} ON {table} ({columns})")
+
+def migration_006_query_indexes(cursor):
+    """Secondary indexes for the filters and orderings the routes use"""
+    indexes = [
+        ('users', 'idx_users_role_created', 'role, created_at'),
+        ('users', 'idx_users_role_name', 'role, first_name, last_name'),
+        ('quotes', 'idx_quotes_created', 'created_at'),
+        ('quotes', 'idx_quotes_status_created', 'status, created_at'),
+        ('quotes', 'idx_quotes_customer_created', 'customer_id, created_at'),
+        ('installations', 'idx_installations_created', 'created_at'),
+        ('installations', 'idx_installations_status_created', 'status, created_at'),
+        ('installations', 'idx_installations_date', 'installation_date'),
+        ('installations', 'idx_installations_customer_created', 'customer_id, created_at'),
+        ('portfolio', 'idx_portfolio_created', 'created_at'),
+        ('portfolio', 'idx_portfolio_category_created', 'category, created_at'),
+        ('products', 'idx_products_created', 'created_at'),
+        ('products', 'idx_products_category_created', 'category, created_at'),
+        ('team_members', 'idx_team_members_display_order', 'display_order')
+    ]
+    for table, name, columns in indexes:
+        create_index_if_missing(cursor, table, name, columns)
+
+def migration_007_notification_outbox(cursor):
+    """Outbox of notifications written in the same transaction as the change they announce"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            recipient VARCHAR(255),
+            subject VARCHAR(255) NOT NULL,
+            body TEXT NOT NULL,
+            status ENUM('pending', 'sent', 'failed') DEFAULT 'pending',
+            attempts INT DEFAULT 0,
+            next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            locked_by VARCHAR(64),
+            locked_until DATETIME,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME,
+            INDEX idx_outbox_status_next (status, next_attempt_at),
+            INDEX idx_outbox_locked_by (locked_by)
+        )
+    """)
+
+def migration_008_quote_idempotency_key(cursor):
+    """Let a resubmitted quote form be recognised by the key it was rendered with"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'quotes' AND COLUMN_NAME = 'idempotency_key'
+    """)
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            ALTER TABLE quotes
+            ADD COLUMN idempotency_key VARCHAR(64) NULL,
+            ADD UNIQUE KEY uq_quotes_idempotency_key (idempotency_key)
+        """)
+
+def migration_009_load_profiles(cursor):
+    """One compact hourly load profile per customer, built from meter data or bills"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS load_profiles (
+            user_id INT PRIMARY KEY,
+            source VARCHAR(20) NOT NULL,
+            interval_minutes INT,
+            readings INT NOT NULL,
+            coverage DECIMAL(5,4) NOT NULL,
+            annual_kwh DECIMAL(12,2) NOT NULL,
+            hourly_kwh MEDIUMBLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+def migration_010_telemetry(cursor):
+    """Raw inverter readings plus hourly and daily rollups"""
+    # Keyed by time first so ingestion appends and retention deletes a range;
+    # per-site reads go to the rollups. No foreign key: sites are validated
+    # against a cached set of completed installations instead of per row.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS telemetry_raw (
+            ts INT UNSIGNED NOT NULL,
+            installation_id INT NOT NULL,
+            power_w INT,
+            energy_wh BIGINT UNSIGNED,
+            soc TINYINT UNSIGNED,
+            PRIMARY KEY (ts, installation_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS telemetry_hourly (
+            installation_id INT NOT NULL,
+            hour_ts INT UNSIGNED NOT NULL,
+            samples SMALLINT UNSIGNED NOT NULL,
+            avg_power_w INT,
+            max_power_w INT,
+            energy_start_wh BIGINT UNSIGNED,
+            energy_end_wh BIGINT UNSIGNED,
+            min_soc TINYINT UNSIGNED,
+            max_soc TINYINT UNSIGNED,
+            PRIMARY KEY (installation_id, hour_ts),
+            KEY idx_telemetry_hourly_hour (hour_ts)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS telemetry_daily (
+            installation_id INT NOT NULL,
+            day DATE NOT NULL,
+            samples INT UNSIGNED NOT NULL,
+            avg_power_w INT,
+            max_power_w INT,
+            energy_start_wh BIGINT UNSIGNED,
+            energy_end_wh BIGINT UNSIGNED,
+            min_soc TINYINT UNSIGNED,
+            max_soc TINYINT UNSIGNED,
+            PRIMARY KEY (installation_id, day)
+        )
+    """)
+
+def migration_011_search_indexes(cursor):
+    """FULLTEXT indexes behind admin and product search"""
+    # InnoDB builds one FULLTEXT index per statement; each must list exactly
+    # the columns its MATCH() clauses name (see SEARCH_COLUMNS)
+    for table, name, columns in (
+        ('users', 'ft_users_search', 'first_name, last_name, email, phone, city'),
+        ('quotes', 'ft_quotes_notes', 'notes'),
+        ('products', 'ft_products_search', 'name, manufacturer, description')
+    ):
+        create_index_if_missing(cursor, table, name, columns, kind='FULLTEXT')
+
+def migration_012_lookup_indexes(cursor):
+    """Indexes behind the typeahead prefix lookups"""
+    # (role, first_name, last_name) from migration 006 and the unique email
+    # index already cover first-name and email prefixes
+    create_index_if_missing(cursor, 'users', 'idx_users_role_last_name', 'role, last_name')
+    create_index_if_missing(cursor, 'users', 'idx_users_role_phone', 'role, phone')
+
+def migration_013_battery_cost_setting(cursor):
+    """Seed the battery price used by the hourly simulation"""
+    cursor.execute("""
+        INSERT IGNORE INTO settings (setting_key, setting_value, setting_type, description)
+        VALUES ('battery_cost_per_kwh', %s, 'float', 'Cost per kWh of battery storage')
+    """, (str(BATTERY_COST_PER_KWH),))
+
+MIGRATIONS = [
+    (1, 'Create core tables', migration_001_core_tables),
+    (2, 'Add products.manufacturer', migration_002_products_manufacturer),
+    (3, 'Insert default admin, settings and team', migration_003_default_data),
+    (4, 'Drop legacy user tables', migration_004_drop_legacy_tables),
+    (5, 'Create analytics rollups', migration_005_analytics_rollups),
+    (6, 'Add indexes for route query patterns', migration_006_query_indexes),
+    (7, 'Create notification outbox', migration_007_notification_outbox),
+    (8, 'Add quotes.idempotency_key', migration_008_quote_idempotency_key),
+    (9, 'Create load_profiles', migration_009_load_profiles),
+    (10, 'Create telemetry tables', migration_010_telemetry),
+    (11, 'Add FULLTEXT search indexes', migration_011_search_indexes),
+    (12, 'Add typeahead lookup indexes', migration_012_lookup_indexes),
+    (13, 'Insert battery_cost_per_kwh setting', migration_013_battery_cost_setting)
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(cursor):
+    """Highest applied migration, or 0 for a database that has never been migrated"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'schema_version'
+    """)
+    if cursor.fetchone()[0] == 0:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+def ensure_database():
+    """Create the database itself, which the pool cannot connect to until it exists"""
+    server_config = {key: value for key, value in DB_CONFIG.items() if key != 'database'}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}`")
+    cursor.close()
+    connection.close()
+
+def run_migrations():
+    """Apply pending migrations in order, printing the time each one takes"""
+    ensure_database()
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed.")
+        return False
+    
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            duration_ms INT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    current = get_schema_version(cursor)
+    pending = [migration for migration in MIGRATIONS if migration[0] > current]
+    if not pending:
+        print(f"Database schema is up to date (version {current}).")
+    
+    for version, description, migrate in pending:
+        started = time.perf_counter()
+        try:
+            migrate(cursor)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            cursor.execute("""
+                INSERT INTO schema_version (version, description, duration_ms)
+                VALUES (%s, %s, %s)
+            """, (version, description, duration_ms))
+            connection.commit()
+        except Error as e:
+            connection.rollback()
+            print(f"Migration {version:03d} ({description}) failed: {e}")
+            cursor.close()
+            connection.close()
+            return False
+        print(f"Applied migration {version:03d} {description} in {duration_ms} ms")
+    
+    cursor.close()
+    connection.close()
+    return True
+
+def check_schema_version():
+    """Startup check: one query comparing the database schema to SCHEMA_VERSION"""
+    connection = get_db_connection()
+    if not connection:
+        return
+    cursor = connection.cursor()
+    try:
+        current = get_schema_version(cursor)
+    finally:
+        cursor.close()
+        connection.close()
+    if current < SCHEMA_VERSION:
+        print(f"Database schema is at version {current}, expected {SCHEMA_VERSION}. Run `flask --app app migrate` to upgrade.")
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='List applied and pending migrations without running them.')
+def migrate_command(status):
+    """Apply pending database migrations"""
+    if status:
+        connection = get_db_connection()
+        if not connection:
+            print("Database connection failed.")
+            return
+        cursor = connection.cursor()
+        current = get_schema_version(cursor)
+        cursor.close()
+        connection.close()
+        for version, description, _ in MIGRATIONS:
+            state = 'applied' if version <= current else 'pending'
+            print(f"{version:03d} {state:8} {description}")
+        return
+    if not run_migrations():
+        raise SystemExit(1)
+
+class RecordedRow(dict):
+    """Result row from a RecordingCursor: every column (or index) reads as 0"""
+
+    def __missing__(self, key):
+        return 0
+
+
+class RecordingCursor:
+    """Cursor that records statements, and the app.py line issuing them, instead of running them"""
+
+    rowcount = 0
+    lastrowid = None
+    column_names = ()
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, operation, params=None):
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_filename != __file__:
+            frame = frame.f_back
+        self.statements.append((frame.f_lineno if frame else 0, operation, params))
+
+    def executemany(self, operation, seq_params):
+        self.execute(operation, None)
+
+    def fetchone(self):
+        return RecordedRow()
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, size=None):
+        return []
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    """Stands in for the request's pooled connection while a route is replayed"""
+
+    def __init__(self):
+        self.statements = []
+        self.opens = 0
+        self.closes = 0
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self.statements)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closes += 1
+
+    def release(self):
+        pass
+
+# Routes whose queries are assembled at runtime (keyset pagination, FULLTEXT
+# search, typeahead lookups). check-indexes replays them as an admin against
+# a RecordingConnection and EXPLAINs what they would have run.
+EXPLAIN_ROUTES = (
+    '/admin/dashboard',
+    '/admin/analytics',
+    '/admin/customers',
+    '/admin/customers?q=wanjiku&after=2024-01-01T00:00:00_100',
+    '/admin/customers?q=07',
+    '/admin/quotes?status=pending&q=nakuru',
+    '/admin/quotes?before=2024-01-01T00:00:00_100',
+    '/admin/installations?q=otieno',
+    '/admin/portfolio?q=rooftop',
+    '/admin/products?q=inverter',
+    '/admin/search?q=solar+nakuru',
+    '/admin/search?q=solar&scope=quotes&page=2',
+    '/admin/lookup/customers?q=wan',
+    '/admin/lookup/customers?q=wanjiku+kam',
+    '/admin/lookup/quotes?q=wan',
+    '/admin/lookup/quotes?customer_id=1',
+    '/products?q=panel',
+    '/portfolio',
+)
+
+def is_select(sql):
+    """Whether a statement reads rows (including parenthesised UNION branches)"""
+    return sql.lstrip('( ').upper().startswith(('SELECT', 'WITH')) and 'information_schema' not in sql
+
+def replay_route_queries(path):
+    """(line, sql, params) for every statement a GET of path issues, or raises what the view raised"""
+    connection = RecordingConnection()
+    # A fresh app context, so the caller's g.db is left alone
+    with app.app_context(), app.test_request_context(path):
+        session['user'] = {'id': 0, 'username': 'check-indexes', 'role': 'admin'}
+        g.db = connection
+        try:
+            app.preprocess_request()
+            app.dispatch_request()
+        finally:
+            g.pop('db', None)
+    return connection.statements
+
+def static_sql(node):
+    """SQL text of a string literal, or of an f-string whose only interpolations are %s lists"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif "'%s'" in ast.unparse(value.value):
+                # e.g. {', '.join(['%s'] * len(ids))}: one placeholder is a representative IN list
+                parts.append('%s')
+            else:
+                return None
+        return ''.join(parts)
+    return None
+
+def collect_app_queries():
+    """SELECT statements app.py can run, as (line, sql, params, source), plus the call sites not covered.
+
+    Static string queries come from the source; queries built at runtime come
+    from replaying EXPLAIN_ROUTES and the export builder. params is None
+    when representative values should be filled in by explain_params().
+    """
+    with open(__file__, encoding='utf-8') as source:
+        tree = ast.parse(source.read())
+    queries = {}
+    dynamic_sites = {}
+    for function in ast.walk(tree):
+        if not isinstance(function, (ast.FunctionDef, ast.Module)):
+            continue
+        for node in ast.walk(function):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr == 'execute' and node.args):
+                continue
+            sql = static_sql(node.args[0])
+            if sql is not None:
+                sql = ' '.join(sql.split())
+                if is_select(sql):
+                    queries[sql] = (node.lineno, sql, None, 'static')
+            elif isinstance(function, ast.FunctionDef):
+                # Innermost function wins: ast.walk visits outer functions first
+                dynamic_sites[node.lineno] = (function.name, ast.unparse(node.args[0]))
+    
+    covered = set()
+    skipped = []
+    for path in EXPLAIN_ROUTES:
+        try:
+            statements = replay_route_queries(path)
+        except Exception as e:
+            skipped.append((0, f"replaying {path} failed: {e}"))
+            continue
+        for lineno, operation, params in statements:
+            covered.add(lineno)
+            sql = ' '.join(operation.split())
+            if is_select(sql):
+                queries.setdefault(sql, (lineno, sql, params, path))
+    for kind in EXPORTS:
+        sql, params = build_export_query(kind, date(2024, 1, 1), date(2024, 1, 31), 'pending')
+        sql = ' '.join(sql.split())
+        queries.setdefault(sql, (0, sql, params, f"export {kind}"))
+    covered.update(lineno for lineno, (function, _) in dynamic_sites.items() if function == 'stream_export')
+    
+    for lineno, (function, text) in sorted(dynamic_sites.items()):
+        if lineno not in covered:
+            skipped.append((lineno, f"{function}: {' '.join(text.split())[:100]}"))
+    return sorted(queries.values(), key=lambda query: query[0]), skipped
+
+def explain_params(sql):
+    """Representative parameters for EXPLAIN: integers for LIMIT, strings elsewhere"""
+    params = []
+    for match in re.finditer(r'(\w+)?\s*%s', sql):
+        params.append(1 if (match.group(1) or '').upper() in ('LIMIT', 'OFFSET') else '1')
+    return tuple(params) or None
+
+@app.cli.command('check-indexes')
+@click.option('--min-rows', default=1000, show_default=True,
+              help='Only fail full scans on tables with at least this many rows.')
+def check_indexes_command(min_rows):
+    """EXPLAIN app.py's queries (static and replayed) and fail on full table scans of large tables"""
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed.")
+        raise SystemExit(1)
+    
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT TABLE_NAME AS name, TABLE_ROWS AS row_count FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)
+    table_rows = {row['name']: row['row_count'] or 0 for row in cursor.fetchall()}
+    
+    failures = 0
+    queries, skipped = collect_app_queries()
+    for lineno, sql, params, origin in queries:
+        # Map aliases back to table names ("FROM quotes q JOIN users u ...")
+        aliases = {}
+        for table, alias in re.findall(r'(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+            aliases[table] = table
+            if alias and alias.upper() not in ('WHERE', 'JOIN', 'LEFT', 'INNER', 'ON', 'ORDER', 'GROUP', 'LIMIT'):
+                aliases[alias] = table
         
+        try:
+            cursor.execute(f"EXPLAIN {sql}", explain_params(sql) if params is None else params)
+            plan = cursor.fetchall()
+        except Error as e:
+            print(f"line {lineno}: EXPLAIN failed: {e}")
+            failures += 1
+            continue
+        
+        scans = []
+        for step in plan:
+            table = aliases.get(step['table'], step['table'])
+            if step['type'] == 'ALL' and table_rows.get(table, 0) >= min_rows:
+                scans.append(f"{table} (~{table_rows[table]} rows)")
+        if scans:
+            failures += 1
+            print(f"line {lineno} ({origin}): FULL SCAN on {', '.join(scans)}: {sql[:100]}")
+        else:
+            print(f"line {lineno} ({origin}): ok")
+    
+    cursor.close()
+    connection.close()
+    # Runtime-built statements that neither the source scan nor the replays reached
+    for lineno, description in skipped:
+        print(f"line {lineno}: not checked: {description}")
+    if failures:
+        print(f"{failures} queries scan tables with {min_rows}+ rows.")
+        raise SystemExit(1)
+    print("No full table scans on large tables.")
+
+# Admin list pages are paginated by keyset on (created_at, id), newest first
+ADMIN_PAGE_SIZE = 25
+ADMIN_MAX_PAGE_SIZE = 200
+
+def encode_page_cursor(row):
+    """Keyset cursor for a row: its created_at and id"""
+    return f"{row['created_at']:%Y-%m-%dT%H:%M:%S}_{row['id']}"
+
+def decode_page_cursor(token):
+    """Parse a keyset cursor, returning None when it is missing or malformed"""
+    try:
+        created_at, row_id = token.rsplit('_', 1)
+        return datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S'), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def admin_list_url(**changes):
+    """URL of the current list page with its filters kept and the cursor replaced"""
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(changes)
+    return url_for(request.endpoint, **args)
+
+def fetch_keyset_page(cursor, select_sql, alias, conditions, params):
+    """Fetch one page of an admin list and the links to its neighbours.
+
+    `alias` is the table whose created_at/id drive the ordering; `conditions`
+    are ANDed into the WHERE clause together with the cursor bound.
+    """
+    try:
+        page_size = int(request.args.get('per_page', ADMIN_PAGE_SIZE))
+    except ValueError:
+        page_size = ADMIN_PAGE_SIZE
+    page_size = max(1, min(page_size, ADMIN_MAX_PAGE_SIZE))
+    
+    after = decode_page_cursor(request.args.get('after'))
+    before = None if after else decode_page_cursor(request.args.get('before'))
+    conditions = list(conditions)
+    params = list(params)
+    order = 'DESC'
+    
+    bound = after or before
+    if bound:
+        op = '<' if after else '>'
+        conditions.append(f"({alias}.created_at {op} %s OR ({alias}.created_at = %s AND {alias}.id {op} %s))")
+        params += [bound[0], bound[0], bound[1]]
+        if before:
+            # Walk backwards from the cursor, then restore newest-first order
+            order = 'ASC'
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cursor.execute(f"""
+        {select_sql}
+        {where}
+        ORDER BY {alias}.created_at {order}, {alias}.id {order}
+        LIMIT %s
+    """, (*params, page_size + 1))
+    rows = cursor.fetchall()
+    
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before:
+        rows.reverse()
+    has_next = True if before else has_more
+    has_prev = has_more if before else after is not None
+    
+    pagination = {
+        'page_size': page_size,
+        'first_url': admin_list_url() if bound else None,
+        'next_url': admin_list_url(after=encode_page_cursor(rows[-1])) if rows and has_next else None,
+        'prev_url': admin_list_url(before=encode_page_cursor(rows[0])) if rows and has_prev else None
+    }
+    return rows, pagination
+
+# Search uses the FULLTEXT indexes from migration 011. Words shorter than
+# InnoDB's minimum token size, or on its default stopword list, are never
+# indexed, so they are dropped from queries rather than matching nothing.
+FULLTEXT_MIN_TOKEN = 3
+FULLTEXT_STOPWORDS = frozenset((
+    'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'in', 'is', 'it',
+    'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will',
+    'with', 'und', 'www'
+))
+SEARCH_MAX_TERMS = 8
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGES = 50
+SEARCH_COLUMNS = {
+    'users': 'u.first_name, u.last_name, u.email, u.phone, u.city',
+    'quotes': 'q.notes',
+    'products': 'p.name, p.manufacturer, p.description'
+}
+
+def fulltext_query(text):
+    """Boolean-mode query requiring every indexable word as a prefix, or None if there are none"""
+    terms = [term for term in re.findall(r'\w+', text.lower())
+             if len(term) >= FULLTEXT_MIN_TOKEN and term not in FULLTEXT_STOPWORDS]
+    return ' '.join(f'+{term}*' for term in terms[:SEARCH_MAX_TERMS]) or None
+
+def search_condition(columns, fulltext=()):
+    """SQL fragment and parameters matching the ?q= text filter against columns.
+
+    `fulltext` names SEARCH_COLUMNS entries to MATCH instead; LIKE over
+    `columns` is the fallback for queries with no indexable word.
+    """
+    search = request.args.get('q', '').strip()
+    if not search:
+        return None, []
+    query = fulltext_query(search) if fulltext else None
+    if query:
+        return ("(" + " OR ".join(f"MATCH({SEARCH_COLUMNS[name]}) AGAINST (%s IN BOOLEAN MODE)" for name in fulltext) + ")",
+                [query] * len(fulltext))
+    like = f"%{search}%"
+    return "(" + " OR ".join(f"{column} LIKE %s" for column in columns) + ")", [like] * len(columns)
+
+# Ranked search: (table alias, select list, FROM/JOIN, SEARCH_COLUMNS entry, extra condition)
+SEARCH_SCOPES = {
+    'customers': ('u', "u.id, u.first_name, u.last_name, u.email, u.phone, u.city, u.created_at",
+                  "users u", 'users', "u.role = 'client'"),
+    'quotes': ('q', "q.id, q.customer_id, q.status, q.system_size, q.estimated_cost, q.notes, q.created_at, u.first_name, u.last_name",
+               "quotes q JOIN users u ON q.customer_id = u.id", 'quotes', None),
+    'products': ('p', "p.id, p.name, p.category, p.manufacturer, p.price, p.wattage, p.description, p.image_url",
+                 "products p", 'products', None)
+}
+
+def search_records(cursor, scope, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    """One page of `scope` rows matching text, best match first; returns (rows, has_more)"""
+    query = fulltext_query(text)
+    if not query:
+        return [], False
+    alias, select, source, columns, condition = SEARCH_SCOPES[scope]
+    match = f"MATCH({SEARCH_COLUMNS[columns]}) AGAINST (%s IN BOOLEAN MODE)"
+    where = f"{condition} AND {match}" if condition else match
+    cursor.execute(f"""
+        SELECT {select}, {match} as score
+        FROM {source}
+        WHERE {where}
+        ORDER BY score DESC, {alias}.id DESC
+        LIMIT %s OFFSET %s
+    """, (query, query, page_size + 1, (page - 1) * page_size))
+    rows = cursor.fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+# Rendered-HTML cache for public pages. Entries are tagged with the data they
+# show and dropped by the admin routes that change it; PAGE_CACHE_TTL bounds
+# how long another worker's copy can lag behind such a change.
+# PAGE_CACHE_MAX_ENTRIES caps memory; the least recently used page goes first.
+PAGE_CACHE_TTL = float(os.environ.get('PAGE_CACHE_TTL', 300))
+PAGE_CACHE_MAX_ENTRIES = 256
+
+_page_cache = OrderedDict()
+_page_cache_lock = threading.Lock()
+
+def invalidate_page_cache(*tags):
+    """Drop cached pages that carry any of the given tags"""
+    with _page_cache_lock:
+        for key in [key for key, entry in _page_cache.items() if entry['tags'].intersection(tags)]:
+            del _page_cache[key]
+
+def cached_page(*tags, query_args=()):
+    """Serve anonymous GETs of a view from the page cache, with ETag/Last-Modified validation.
+
+    Only the query arguments named in `query_args` are part of the cache key; the
+    view must ignore any others, so `/?x=1`, `/?x=2`... share one entry.
+    """
+    # Every page renders the company name, so settings changes invalidate all of them
+    tags = frozenset(tags) | {'settings'}
+    
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Logged-in visitors and pending flash messages change the rendered layout
+            if request.method != 'GET' or 'user' in session or session.get('_flashes'):
+                return view(*args, **kwargs)
+            # Every search string would be a new cache entry
+            if request.args.get('q'):
+                return view(*args, **kwargs)
+            
+            key = (request.path,) + tuple(request.args.get(name, '') for name in query_args)
+            with _page_cache_lock:
+                entry = _page_cache.get(key)
+                if entry is not None:
+                    _page_cache.move_to_end(key)
+            if entry is None or entry['expires'] < time.time():
+                response = make_response(view(*args, **kwargs))
+                # Don't pin a page rendered without its data for the whole TTL
+                if response.status_code != 200 or g.get('db_unavailable'):
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'last_modified': datetime.utcnow().replace(microsecond=0),
+                    'expires': time.time() + PAGE_CACHE_TTL,
+                    'tags': tags
+                }
+                with _page_cache_lock:
+                    _page_cache[key] = entry
+                    _page_cache.move_to_end(key)
+                    while len(_page_cache) > PAGE_CACHE_MAX_ENTRIES:
+                        _page_cache.popitem(last=False)
+            
+            g.page_cache_entry = entry
+            response = app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+# Uploaded images are re-encoded without EXIF data and resized into JPEG and
+# WebP variants in static/uploads/variants for srcset-based delivery.
+IMAGE_WIDTHS = (320, 640, 1024)
+IMAGE_MAX_WIDTH = 1600
+IMAGE_QUALITY = 82
+VARIANT_FOLDER = os.path.join(UPLOAD_FOLDER, 'variants')
+
+_variant_widths = {}
+
+def variant_filename(filename, width, extension):
+    """Name of the resized copy of an upload, e.g. solar-640w.webp"""
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}-{width}w.{extension}"
+
+def flatten_image(image):
+    """RGB copy of an image, compositing any transparency onto white"""
+    if image.mode == 'RGB':
+        return image
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+def normalize_image(path, rewrite=True):
+    """Decode an uploaded image, rewriting it in place without EXIF and within IMAGE_MAX_WIDTH.
+
+    The file is only rewritten when it carries EXIF data or is too wide, so
+    re-running this on the same file does not re-compress it. Returns the
+    decoded image (None when it isn't one we handle) and whether the file changed.
+    """
+    if Image is None:
+        return None, False
+    try:
+        with Image.open(path) as source:
+            image_format = source.format
+            has_exif = bool(source.getexif())
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        print(f"Skipping image optimization for {path}: {e}")
+        return None, False
+    if image_format not in ('JPEG', 'PNG', 'WEBP'):
+        return None, False
+    
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    
+    rewritten = rewrite and (has_exif or image.width > IMAGE_MAX_WIDTH)
+    if rewritten:
+        if image.width > IMAGE_MAX_WIDTH:
+            image = image.resize((IMAGE_MAX_WIDTH, round(image.height * IMAGE_MAX_WIDTH / image.width)), Image.LANCZOS)
+        if image_format == 'JPEG':
+            flatten_image(image).save(path, 'JPEG', quality=IMAGE_QUALITY, optimize=True, progressive=True)
+        elif image_format == 'PNG':
+            image.save(path, 'PNG', optimize=True)
+        else:
+            image.save(path, 'WEBP', quality=IMAGE_QUALITY)
+    return image, rewritten
+
+def write_image_variants(image, filename):
+    """Write the resized variants of the upload stored as filename; returns their widths"""
+    # Smaller widths get JPEG and WebP copies; the full width only needs WebP
+    # because the stored original already serves as its JPEG candidate.
+    os.makedirs(VARIANT_FOLDER, exist_ok=True)
+    widths = tuple(width for width in IMAGE_WIDTHS if width < image.width)
+    for width in widths:
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        resized.save(os.path.join(VARIANT_FOLDER, variant_filename(filename, width, 'webp')), 'WEBP', quality=IMAGE_QUALITY, method=4)
+        flatten_image(resized).save(os.path.join(VARIANT_FOLDER, variant_filename(filename, width, 'jpg')), 'JPEG', quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    image.save(os.path.join(VARIANT_FOLDER, variant_filename(filename, image.width, 'webp')), 'WEBP', quality=IMAGE_QUALITY, method=4)
+    return widths + (image.width,)
+
+def optimize_image(path, rewrite=True):
+    """Normalize an image already stored at path and write its variants; returns the variant widths.
+
+    Content-addressed uploads must be passed rewrite=False, or their bytes
+    would no longer match their name.
+    """
+    image, _ = normalize_image(path, rewrite)
+    if image is None:
+        return ()
+    return write_image_variants(image, os.path.basename(path))
+
+def get_variant_widths(filename):
+    """Variant widths of an upload, ending with its full width, or () if any are missing.
+
+    Memoised against the upload's mtime so templates only stat one file per image.
+    """
+    path = os.path.join(app.root_path, UPLOAD_FOLDER, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return ()
+    cached = _variant_widths.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    widths = ()
+    if Image is not None:
+        try:
+            with Image.open(path) as source:
+                full_width = ImageOps.exif_transpose(source).width if source.getexif() else source.width
+        except (OSError, Image.DecompressionBombError):
+            full_width = None
+        if full_width:
+            variant_folder = os.path.join(app.root_path, VARIANT_FOLDER)
+            smaller = tuple(width for width in IMAGE_WIDTHS if width < full_width)
+            expected = [variant_filename(filename, width, extension) for width in smaller for extension in ('webp', 'jpg')]
+            expected.append(variant_filename(filename, full_width, 'webp'))
+            if all(os.path.exists(os.path.join(variant_folder, name)) for name in expected):
+                widths = smaller + (full_width,)
+    _variant_widths[filename] = (mtime, widths)
+    return widths
+
+@app.template_global()
+def responsive_image(image_url, alt='', sizes='100vw', css_class='', **attributes):
+    """<picture> for an upload with WebP/JPEG srcsets, sizes and lazy loading.
+
+    Accepts any of the stored image_url conventions ("/static/uploads/x.jpg"
+    or a bare filename); extra keyword arguments become <img> attributes.
+    """
+    filename = os.path.basename(image_url or '') or 'placeholder.jpg'
+    src = url_for('static', filename=f'uploads/{filename}')
+    extra = ''.join(f' {escape(name)}="{escape(value)}"' for name, value in attributes.items())
+    img_attributes = f'alt="{escape(alt)}" class="{escape(css_class)}" loading="lazy" decoding="async"{extra}'
+    
+    widths = get_variant_widths(filename)
+    if not widths:
+        return Markup(f'<picture style="display: contents"><img src="{escape(src)}" {img_attributes}></picture>')
+    
+    def variant_url(width, extension):
+        return url_for('static', filename='uploads/variants/' + variant_filename(filename, width, extension))
+    
+    webp_srcset = ', '.join(f"{variant_url(width, 'webp')} {width}w" for width in widths)
+    jpeg_srcset = ', '.join([f"{variant_url(width, 'jpg')} {width}w" for width in widths[:-1]] + [f"{src} {widths[-1]}w"])
+    return Markup(
+        f'<picture style="display: contents">'
+        f'<source type="image/webp" srcset="{escape(webp_srcset)}" sizes="{escape(sizes)}">'
+        f'<img src="{escape(src)}" srcset="{escape(jpeg_srcset)}" sizes="{escape(sizes)}" {img_attributes}>'
+        f'</picture>'
+    )
+
+# Uploads are stored as <sha256 of content>.<ext>, so identical files share
+# one blob and a URL only ever refers to one version of a file.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMMUTABLE_UPLOAD_PATH = re.compile(r'^/static/uploads/(variants/)?[0-9a-f]{64}(-\d+w)?\.\w+$')
+
+def save_upload(file):
+    """Store an uploaded file under the SHA-256 of its content and return the filename.
+
+    The upload is hashed while it streams to a temporary file, and hashed again
+    if normalize_image rewrites it, so the name always matches the stored
+    bytes. When a blob with the same digest already exists the copy is
+    discarded and the blob reused.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    extension = os.path.splitext(secure_filename(file.filename or ''))[1].lower()
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=folder, prefix='.upload-', delete=False) as temp:
+        for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            temp.write(chunk)
+    
+    image, rewritten = normalize_image(temp.name)
+    if rewritten:
+        digest = hashlib.sha256()
+        with open(temp.name, 'rb') as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    filename = f"{digest.hexdigest()}{extension}"
+    path = os.path.join(folder, filename)
+    try:
+        # Restart gc-uploads' grace period for a reused blob (and its
+        # variants), which may be an orphan old enough to be collected
+        os.utime(path)
+        for variant in glob.glob(os.path.join(VARIANT_FOLDER, glob.escape(os.path.splitext(filename)[0]) + '-*w.*')):
+            os.utime(variant)
+        os.remove(temp.name)
+    except FileNotFoundError:
+        os.replace(temp.name, path)
+        if image is not None:
+            write_image_variants(image, filename)
+    return filename
+
+# Static assets outside uploads/ are linked as name.<hash>.ext; the manifest
+# maps each file to its current fingerprint and is refreshed when mtime changes.
+FINGERPRINT_LENGTH = 12
+FINGERPRINTED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.\w+)$' % FINGERPRINT_LENGTH)
+_static_manifest = {}
+_static_manifest_lock = threading.Lock()
+
+def static_fingerprint(filename):
+    """Content hash of a static file, or None when it should be linked as-is"""
+    if not filename or filename.startswith('uploads/'):
+        return None
+    path = os.path.join(app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    entry = _static_manifest.get(filename)
+    if entry and entry[0] == (stat.st_mtime, stat.st_size):
+        return entry[1]
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()[:FINGERPRINT_LENGTH]
+    with _static_manifest_lock:
+        _static_manifest[filename] = ((stat.st_mtime, stat.st_size), fingerprint)
+    return fingerprint
+
+def build_static_manifest():
+    """Fingerprint every static asset up front so the first requests don't pay for hashing"""
+    for directory, subdirectories, files in os.walk(app.static_folder):
+        relative = os.path.relpath(directory, app.static_folder).replace(os.sep, '/')
+        if relative == 'uploads' or relative.startswith('uploads/'):
+            subdirectories[:] = []
+            continue
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            static_fingerprint(name if relative == '.' else f"{relative}/{name}")
+    return {name: entry[1] for name, entry in _static_manifest.items()}
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """Rewrite url_for('static', filename=...) to the fingerprinted name"""
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    fingerprint = static_fingerprint(values['filename'])
+    if fingerprint:
+        stem, extension = os.path.splitext(values['filename'])
+        values['filename'] = f"{stem}.{fingerprint}{extension}"
+
+def serve_static(filename):
+    """Serve static files, resolving fingerprinted names to the file on disk"""
+    match = FINGERPRINTED_NAME.match(filename)
+    if match and not os.path.isfile(os.path.join(app.static_folder, filename)):
+        original = match.group('stem') + match.group('ext')
+        g.static_fingerprint_current = static_fingerprint(original) == match.group('fingerprint')
+        filename = original
+    
+    precompressed = precompressed_sibling(filename)
+    if precompressed:
+        sibling, encoding = precompressed
+        response = send_from_directory(app.static_folder, sibling, mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+    return app.send_static_file(filename)
+
+app.view_functions['static'] = serve_static
+
+@app.after_request
+def cache_immutable_static(response):
+    """Content-addressed uploads and fingerprinted assets never change, so let browsers keep them for a year"""
+    if response.status_code == 200 and (IMMUTABLE_UPLOAD_PATH.match(request.path) or g.get('static_fingerprint_current')):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
+# Response compression. Dynamic HTML/JSON is compressed per request (and
+# memoised on page cache entries); static assets are compressed ahead of time
+# by `flask compress-static` and served from their .br/.gz siblings.
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+MINIFY_HTML = os.environ.get('MINIFY_HTML', '').lower() in ('1', 'true', 'yes')
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/plain', 'text/css', 'application/javascript', 'text/csv', 'image/svg+xml'}
+PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.ico'}
+PRESERVE_WHITESPACE = re.compile(r'(<(pre|textarea|script)\b.*?</\2\s*>)', re.S | re.I)
+
+def minify_html(html):
+    """Drop indentation and blank lines, leaving <pre>, <textarea> and <script> untouched"""
+    parts = PRESERVE_WHITESPACE.split(html)
+    # split() yields [text, block, tag name, text, block, tag name, ...]
+    for index in range(0, len(parts), 3):
+        parts[index] = re.sub(r'\n\s+', '\n', parts[index])
+    return ''.join(part for index, part in enumerate(parts) if index % 3 != 2)
+
+def accepted_encoding():
+    """Best content coding the client accepts: 'br', 'gzip' or None"""
+    offers = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offers)
+
+def compress_body(body, encoding):
+    """Compress a response body with the configured level"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+def precompressed_sibling(filename):
+    """(sibling filename, encoding) of an up-to-date precompressed static file the client accepts"""
+    encoding = accepted_encoding()
+    if not encoding:
+        return None
+    path = os.path.join(app.static_folder, filename)
+    for candidate in (['br', 'gzip'] if encoding == 'br' else ['gzip']):
+        sibling = filename + ('.br' if candidate == 'br' else '.gz')
+        sibling_path = os.path.join(app.static_folder, sibling)
+        try:
+            if os.path.getmtime(sibling_path) >= os.path.getmtime(path):
+                return sibling, candidate
+        except OSError:
+            continue
+    return None
+
+@app.after_request
+def compress_response(response):
+    """Minify and gzip/Brotli-compress dynamic HTML and JSON responses"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    minify = MINIFY_HTML and response.mimetype == 'text/html'
+    if not encoding and not minify:
+        return response
+    
+    # Cached pages keep their encoded bodies so hits skip the compressor
+    entry = g.get('page_cache_entry')
+    encoded = entry.setdefault('encoded', {}) if entry else {}
+    key = encoding or 'identity'
+    if key not in encoded:
+        body = response.get_data()
+        if minify:
+            body = minify_html(body.decode(response.charset)).encode(response.charset)
+        if encoding and len(body) >= COMPRESS_MIN_SIZE:
+            body = compress_body(body, encoding)
+        else:
+            key = 'identity'
+        encoded[key] = body
+    
+    response.set_data(encoded[key])
+    if key != 'identity':
+        response.headers['Content-Encoding'] = encoding
+        # The body differs from the uncompressed one, so the validator can only be weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+    return response
+
+def compress_static_files(force=False):
+    """Write .gz (and .br when available) siblings for compressible static assets"""
+    written = []
+    for directory, subdirectories, files in os.walk(app.static_folder):
+        if os.path.relpath(directory, app.static_folder).split(os.sep)[0] == 'uploads':
+            subdirectories[:] = []
+            continue
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                body = f.read()
+            siblings = [(path + '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli:
+                siblings.append((path + '.br', lambda data: brotli.compress(data, quality=11)))
+            for sibling, compress in siblings:
+                if not force and os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+                    continue
+                compressed = compress(body)
+                if len(compressed) >= len(body):
+                    continue
+                with open(sibling, 'wb') as f:
+                    f.write(compressed)
+                written.append((os.path.relpath(sibling, app.static_folder), len(body), len(compressed)))
+    return written
+
+@app.cli.command('compress-static')
+@click.option('--force', is_flag=True, help='Rewrite siblings that are already up to date.')
+def compress_static_command(force):
+    """Precompress static CSS/JS into .gz and .br siblings"""
+    for name, original, compressed in compress_static_files(force=force):
+        print(f"{name}: {original:,} -> {compressed:,} bytes")
+    if not brotli:
+        print("Brotli is not installed; only .gz files were written.")
+
+def url_for_static(filename):
+    """Fingerprinted static URL outside of a request"""
+    with app.test_request_context():
+        return url_for('static', filename=filename)
+
+@app.cli.command('bench-compression')
+@click.argument('paths', nargs=-1)
+def bench_compression_command(paths):
+    """Compare bytes on the wire per page with and without compression"""
+    paths = paths or ('/', '/about', '/services', '/products', '/portfolio', '/contact', '/quote',
+                      url_for_static('css/style.css'), url_for_static('js/main.js'))
+    client = app.test_client()
+    encodings = ['gzip', 'br'] if brotli else ['gzip']
+    print(f"{'path':<40}{'identity':>12}" + ''.join(f"{encoding:>12}" for encoding in encodings))
+    totals = [0] * (len(encodings) + 1)
+    for path in paths:
+        sizes = []
+        for encoding in ['identity'] + encodings:
+            response = client.get(path, headers={'Accept-Encoding': encoding})
+            sizes.append(len(response.get_data()))
+            response.close()
+        totals = [total + size for total, size in zip(totals, sizes)]
+        print(f"{path[:39]:<40}" + ''.join(f"{size:>12,}" for size in sizes))
+    print(f"{'total':<40}" + ''.join(f"{size:>12,}" for size in totals))
+
+@app.cli.command('optimize-images')
+@click.option('--workers', default=os.cpu_count(), show_default=True, help='Parallel worker processes.')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+def optimize_images_command(workers, force):
+    """Strip EXIF and generate responsive variants for existing uploads"""
+    folder = os.path.join(app.root_path, UPLOAD_FOLDER)
+    paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+             if os.path.isfile(os.path.join(folder, name)) and (force or not get_variant_widths(name))]
+    if not paths:
+        print("All uploads already have variants.")
+        return
+    
+    started = time.perf_counter()
+    before = sum(os.path.getsize(path) for path in paths)
+    # Content-addressed uploads were normalized before being named; rewriting
+    # them now would break the name/content match they are cached on
+    rewrite = [not IMMUTABLE_UPLOAD_PATH.match(f"/static/uploads/{os.path.basename(path)}") for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, widths in zip(paths, executor.map(optimize_image, paths, rewrite)):
+            print(f"{os.path.basename(path)}: {', '.join(f'{w}w' for w in widths) or 'no variants'}")
+    after = sum(os.path.getsize(path) for path in paths)
+    print(f"Processed {len(paths)} files in {time.perf_counter() - started:.1f}s; originals {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+# Notifications go through an outbox table: routes insert a row in their own
+# transaction and a worker leases, sends and retries rows with backoff, so a
+# slow or down mail server never blocks a request and a crashed worker's
+# lease simply expires.
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 25))
+SMTP_USER = os.environ.get('SMTP_USER')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', '').lower() in ('1', 'true', 'yes')
+SMTP_TIMEOUT = 10
+MAIL_FROM = os.environ.get('MAIL_FROM', 'noreply@veeteqsolar.com')
+NOTIFY_EMAIL = os.environ.get('NOTIFY_EMAIL')
+OUTBOX_BATCH_SIZE = 20
+# The lease is renewed before every send, so it only has to outlast one
+# message: connect, STARTTLS, login and send, each bounded by SMTP_TIMEOUT
+OUTBOX_LEASE_SECONDS = 4 * SMTP_TIMEOUT + 30
+OUTBOX_POLL_SECONDS = 5
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 30
+OUTBOX_BACKOFF_MAX = 3600
+
+_outbox_wakeup = threading.Event()
+
+def notifications_enabled():
+    """Whether staff should be emailed about new quotes"""
+    return get_setting('email_notifications', get_setting('email_notification_enabled', False))
+
+def enqueue_notification(cursor, kind, subject, body, recipient=None):
+    """Queue an email on the caller's cursor; it is sent only if the caller commits.
+
+    A recipient of None means the staff address (NOTIFY_EMAIL or the admin users).
+    """
+    cursor.execute("""
+        INSERT INTO notification_outbox (kind, recipient, subject, body)
+        VALUES (%s, %s, %s, %s)
+    """, (kind, recipient, subject, body))
+
+def wake_outbox_worker():
+    """Let an in-process worker pick up a just-committed notification without waiting for its poll"""
+    _outbox_wakeup.set()
+
+def outbox_backoff(attempts):
+    """Seconds until the next attempt: exponential with jitter, capped"""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return int(delay * random.uniform(0.8, 1.2))
+
+def staff_recipients(cursor):
+    """Addresses that receive staff notifications"""
+    if NOTIFY_EMAIL:
+        return [address.strip() for address in NOTIFY_EMAIL.split(',') if address.strip()]
+    cursor.execute("SELECT email FROM users WHERE role = 'admin' AND email IS NOT NULL")
+    return [row['email'] for row in cursor.fetchall()]
+
+def send_email(smtp, recipients, subject, body):
+    """Send one plain-text message over an open SMTP connection"""
+    message = EmailMessage()
+    message['From'] = MAIL_FROM
+    message['To'] = ', '.join(recipients)
+    message['Subject'] = subject
+    message.set_content(body)
+    smtp.send_message(message)
+
+def open_smtp():
+    """Connect (and log in, if configured) to the SMTP server"""
+    smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    if SMTP_USE_TLS:
+        smtp.starttls()
+    if SMTP_USER:
+        smtp.login(SMTP_USER, SMTP_PASSWORD or '')
+    return smtp
+
+def drain_outbox(worker_id):
+    """Lease a batch of due notifications, send them and record the outcome; returns rows processed"""
+    connection = get_db_connection()
+    if not connection:
+        return 0
+    cursor = connection.cursor(dictionary=True)
+    
+    # Leasing with an UPDATE works on MySQL and MariaDB alike; SKIP LOCKED does not
+    cursor.execute("""
+        UPDATE notification_outbox
+        SET locked_by = %s, locked_until = NOW() + INTERVAL %s SECOND
+        WHERE status = 'pending' AND next_attempt_at <= NOW()
+          AND (locked_until IS NULL OR locked_until < NOW())
+        ORDER BY id
+        LIMIT %s
+    """, (worker_id, OUTBOX_LEASE_SECONDS, OUTBOX_BATCH_SIZE))
+    connection.commit()
+    if cursor.rowcount == 0:
         cursor.close()
         connection.close()
-        return True
-    return False
+        return 0
+    
+    cursor.execute("""
+        SELECT id, kind, recipient, subject, body, attempts
+        FROM notification_outbox
+        WHERE locked_by = %s AND status = 'pending'
+        ORDER BY id
+    """, (worker_id,))
+    messages = cursor.fetchall()
+    
+    smtp = None
+    staff = None
+    for message in messages:
+        # Push back the lease on everything this worker still holds, so rows
+        # waiting behind slow sends are not picked up and sent twice
+        cursor.execute("""
+            UPDATE notification_outbox
+            SET locked_until = NOW() + INTERVAL %s SECOND
+            WHERE locked_by = %s AND status = 'pending'
+        """, (OUTBOX_LEASE_SECONDS, worker_id))
+        connection.commit()
+        try:
+            if message['recipient']:
+                recipients = [message['recipient']]
+            else:
+                if staff is None:
+                    staff = staff_recipients(cursor)
+                recipients = staff
+            if recipients:
+                if smtp is None:
+                    smtp = open_smtp()
+                send_email(smtp, recipients, message['subject'], message['body'])
+            else:
+                print(f"Notification {message['id']} has no recipients; set NOTIFY_EMAIL")
+            cursor.execute("""
+                UPDATE notification_outbox
+                SET status = 'sent', sent_at = NOW(), attempts = attempts + 1, locked_by = NULL, locked_until = NULL
+                WHERE id = %s
+            """, (message['id'],))
+        except (smtplib.SMTPException, OSError) as e:
+            attempts = message['attempts'] + 1
+            print(f"Notification {message['id']} attempt {attempts} failed: {e}")
+            cursor.execute("""
+                UPDATE notification_outbox
+                SET status = %s, attempts = %s, last_error = %s,
+                    next_attempt_at = NOW() + INTERVAL %s SECOND, locked_by = NULL, locked_until = NULL
+                WHERE id = %s
+            """, ('failed' if attempts >= OUTBOX_MAX_ATTEMPTS else 'pending', attempts, str(e)[:1000],
+                  outbox_backoff(attempts), message['id']))
+            # A broken connection fails every later message too; reconnect for the next one
+            if smtp is not None:
+                try:
+                    smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                smtp = None
+        connection.commit()
+    
+    if smtp is not None:
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    cursor.close()
+    connection.close()
+    return len(messages)
 
-def get_all_settings():
-    """Get all settings as a dictionary"""
+def run_outbox_worker(stop=None):
+    """Drain the outbox until stopped, sleeping between polls unless woken by a new row"""
+    worker_id = f"{os.uname().nodename if hasattr(os, 'uname') else 'worker'}:{os.getpid()}:{threading.get_ident()}"[:64]
+    print(f"Outbox worker {worker_id} started")
+    while stop is None or not stop.is_set():
+        try:
+            processed = drain_outbox(worker_id)
+        except Exception as e:
+            print(f"Outbox worker error: {e}")
+            processed = 0
+        if processed < OUTBOX_BATCH_SIZE:
+            _outbox_wakeup.wait(OUTBOX_POLL_SECONDS)
+            _outbox_wakeup.clear()
+
+def start_outbox_worker():
+    """Run the outbox worker in a daemon thread of this process"""
+    thread = threading.Thread(target=run_outbox_worker, name='outbox-worker', daemon=True)
+    thread.start()
+    return thread
+
+def get_outbox_stats():
+    """Notification counts by status plus the age of the oldest pending row"""
+    stats = {'pending': 0, 'sent': 0, 'failed': 0, 'oldest_pending_seconds': None}
     connection = get_db_connection()
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT setting_key, setting_value, setting_type, description FROM settings")
-        results = cursor.fetchall()
+        cursor.execute("""
+            SELECT status, COUNT(*) as count,
+                   TIMESTAMPDIFF(SECOND, MIN(created_at), NOW()) as oldest_seconds
+            FROM notification_outbox
+            GROUP BY status
+        """)
+        for row in cursor.fetchall():
+            stats[row['status']] = row['count']
+            if row['status'] == 'pending':
+                stats['oldest_pending_seconds'] = row['oldest_seconds']
         cursor.close()
         connection.close()
-        
-        settings = {}
-        for result in results:
-            key = result['setting_key']
-            value = result['setting_value']
-            setting_type = result['setting_type']
-            
-            # Convert value based on type
-            if setting_type == 'boolean':
-                settings[key] = value.lower() == 'true'
-            elif setting_type == 'number':
-                try:
-                    settings[key] = float(value) if '.' in value else int(value)
-                except ValueError:
-                    settings[key] = value
-            else:
-                settings[key] = value
-        
-        return settings
-    return {}
+    return stats
 
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Send what is due now and exit.')
+def outbox_worker_command(once):
+    """Send queued notification emails, retrying failures with backoff"""
+    if once:
+        worker_id = f"cli:{os.getpid()}"
+        total = 0
+        while True:
+            processed = drain_outbox(worker_id)
+            total += processed
+            if processed < OUTBOX_BATCH_SIZE:
+                break
+        print(f"Processed {total} notifications.")
+        return
+    run_outbox_worker()
 
-def init_db():
-    """Initialize database with required tables"""
-    connection = get_db_connection()
+# Inverter telemetry. Readings are validated and appended to an in-process
+# buffer, which a background thread writes with multi-row inserts; the same
+# thread rolls recent raw points up into hourly and daily aggregates and
+# applies the retention policy. Points are [installation_id, unix_ts,
+# power_w, energy_wh, soc] where energy_wh is the inverter's lifetime counter.
+TELEMETRY_API_KEY = os.environ.get('TELEMETRY_API_KEY')
+TELEMETRY_MAX_POINTS = 10000
+TELEMETRY_MAX_BUFFERED = 200000
+TELEMETRY_FLUSH_ROWS = 5000
+TELEMETRY_FLUSH_SECONDS = 2
+TELEMETRY_INSERT_ROWS = 1000
+TELEMETRY_SITE_CACHE_SECONDS = 60
+TELEMETRY_MAX_CLOCK_SKEW = 300
+TELEMETRY_ROLLUP_SECONDS = 300
+TELEMETRY_ROLLUP_LOOKBACK_HOURS = 3
+TELEMETRY_RETENTION_SECONDS = 3600
+TELEMETRY_RAW_RETENTION_DAYS = 14
+TELEMETRY_HOURLY_RETENTION_DAYS = 400
+TELEMETRY_DELETE_BATCH = 10000
+TELEMETRY_UTC_OFFSET = 3 * 3600  # Daily rollups use East Africa Time (no DST)
+
+_telemetry_buffer = []
+_telemetry_lock = threading.Lock()
+_telemetry_wakeup = threading.Event()
+_telemetry_worker = None
+_telemetry_sites = {'ids': frozenset(), 'loaded_at': 0.0}
+_telemetry_stats = {
+    'received': 0,
+    'rejected': 0,
+    'written': 0,
+    'dropped': 0,
+    'flushes': 0,
+    'flush_errors': 0,
+    'last_flush_seconds': None,
+    'last_rollup_at': None,
+    # Oldest reading written since the last successful rollup; late or
+    # backfilled points push the next rollup back to cover them
+    'rollup_pending_since': None
+}
+
+def update_telemetry_stats(**changes):
+    """Apply counter deltas to the telemetry statistics"""
+    with _telemetry_lock:
+        for key, delta in changes.items():
+            _telemetry_stats[key] += delta
+
+def get_telemetry_stats():
+    """Snapshot of the ingestion counters for the health endpoint"""
+    with _telemetry_lock:
+        stats = dict(_telemetry_stats)
+        stats['buffered'] = len(_telemetry_buffer)
+    stats['sites'] = len(_telemetry_sites['ids'])
+    return stats
+
+def telemetry_site_ids():
+    """Ids of completed installations, refreshed at most once a minute"""
+    if time.monotonic() - _telemetry_sites['loaded_at'] > TELEMETRY_SITE_CACHE_SECONDS:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT id FROM installations WHERE status = 'completed'")
+            _telemetry_sites['ids'] = frozenset(row[0] for row in cursor.fetchall())
+            _telemetry_sites['loaded_at'] = time.monotonic()
+            cursor.close()
+            connection.close()
+    return _telemetry_sites['ids']
+
+def parse_telemetry_points(points, site_ids, now):
+    """Validated row tuples plus (index, reason) for each rejected point"""
+    oldest = now - TELEMETRY_RAW_RETENTION_DAYS * 86400
+    newest = now + TELEMETRY_MAX_CLOCK_SKEW
+    rows = []
+    errors = []
+    for index, point in enumerate(points):
+        try:
+            installation_id, ts, power_w, energy_wh, soc = (list(point) + [None])[:5]
+            installation_id = int(installation_id)
+            ts = int(ts)
+            power_w = None if power_w is None else int(round(power_w))
+            energy_wh = None if energy_wh is None else int(round(energy_wh))
+            soc = None if soc is None else int(round(soc))
+        except (TypeError, ValueError, OverflowError):
+            errors.append((index, 'expected [installation_id, ts, power_w, energy_wh, soc]'))
+            continue
+        if installation_id not in site_ids:
+            errors.append((index, 'unknown or incomplete installation'))
+        elif not oldest <= ts <= newest:
+            errors.append((index, 'timestamp out of range'))
+        elif ((power_w is not None and abs(power_w) >= 2 ** 31) or (energy_wh is not None and not 0 <= energy_wh < 2 ** 63)
+              or (soc is not None and not 0 <= soc <= 100)):
+            errors.append((index, 'value out of range'))
+        else:
+            rows.append((ts, installation_id, power_w, energy_wh, soc))
+    return rows, errors
+
+def insert_telemetry_rows(cursor, rows):
+    """One multi-row INSERT per TELEMETRY_INSERT_ROWS rows; duplicate readings are ignored"""
+    for start in range(0, len(rows), TELEMETRY_INSERT_ROWS):
+        chunk = rows[start:start + TELEMETRY_INSERT_ROWS]
+        cursor.execute(
+            "INSERT IGNORE INTO telemetry_raw (ts, installation_id, power_w, energy_wh, soc) VALUES "
+            + ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk)),
+            [value for row in chunk for value in row])
+
+def flush_telemetry():
+    """Write everything buffered so far; returns rows written"""
+    with _telemetry_lock:
+        rows = _telemetry_buffer[:]
+        del _telemetry_buffer[:]
+    if not rows:
+        return 0
+    
+    started = time.perf_counter()
+    written = False
+    connection = checkout_db_connection()
     if connection:
         cursor = connection.cursor()
-        
-        # Create database if not exists
-        cursor.execute("CREATE DATABASE IF NOT EXISTS veeteq_solar")
-        cursor.execute("USE veeteq_solar")
-        
-        # Create tables
-        tables = [
-            """
-            CREATE TABLE IF NOT EXISTS products (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                category VARCHAR(50) NOT NULL,
-                description TEXT,
-                price DECIMAL(10,2) NOT NULL,
-                wattage INT,
-                efficiency DECIMAL(5,2),
-                warranty_years INT,
-                manufacturer VARCHAR(100),
-                image_url VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS quotes (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id INT,
-                property_type VARCHAR(50),
-                roof_size DECIMAL(8,2),
-                energy_usage DECIMAL(8,2),
-                system_size DECIMAL(8,2),
-                estimated_cost DECIMAL(10,2),
-                estimated_savings DECIMAL(10,2),
-                status VARCHAR(20) DEFAULT 'pending',
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS installations (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id INT,
-                quote_id INT,
-                installation_date DATE,
-                system_size DECIMAL(8,2),
-                total_cost DECIMAL(10,2),
-                status VARCHAR(50) DEFAULT 'scheduled',
-                technician VARCHAR(100),
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (quote_id) REFERENCES quotes(id)
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                first_name VARCHAR(50),
-                last_name VARCHAR(50),
-                phone VARCHAR(20),
-                address TEXT,
-                city VARCHAR(50),
-                state VARCHAR(50),
-                zip_code VARCHAR(10),
-                role VARCHAR(20) DEFAULT 'client',
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS portfolio (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                description TEXT,
-                image_url VARCHAR(255) NOT NULL,
-                category VARCHAR(50) DEFAULT 'installation',
-                location VARCHAR(100),
-                system_size DECIMAL(8,2),
-                installation_date DATE,
-                is_featured BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS settings (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                setting_key VARCHAR(100) UNIQUE NOT NULL,
-                setting_value TEXT,
-                setting_type VARCHAR(20) DEFAULT 'string',
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-            """
-        ]
-        
-        for table_sql in tables:
-            cursor.execute(table_sql)
-        
-        # Add manufacturer column to products table if it doesn't exist
         try:
-            cursor.execute("ALTER TABLE products ADD COLUMN manufacturer VARCHAR(100)")
-            print("Added manufacturer column to products table")
-        except Exception as e:
-            # Column might already exist, ignore the error
-            pass
-        
-        # Insert default admin user (username: admin, password: admin123)
-        admin_hash = generate_password_hash('admin123')
+            insert_telemetry_rows(cursor, rows)
+            connection.commit()
+            written = True
+        except Error as e:
+            print(f"Telemetry flush failed: {e}")
+            connection.rollback()
+        finally:
+            cursor.close()
+            connection.release()
+    if not written:
+        # Keep the rows for the next attempt, up to the buffer limit
+        with _telemetry_lock:
+            room = max(0, TELEMETRY_MAX_BUFFERED - len(_telemetry_buffer))
+            _telemetry_buffer[:0] = rows[:room]
+            _telemetry_stats['flush_errors'] += 1
+            _telemetry_stats['dropped'] += len(rows) - min(room, len(rows))
+        return 0
+    
+    oldest = min(row[0] for row in rows)
+    with _telemetry_lock:
+        pending = _telemetry_stats['rollup_pending_since']
+        _telemetry_stats['rollup_pending_since'] = oldest if pending is None else min(pending, oldest)
+        _telemetry_stats['written'] += len(rows)
+        _telemetry_stats['flushes'] += 1
+        _telemetry_stats['last_flush_seconds'] = round(time.perf_counter() - started, 4)
+    return len(rows)
+
+def local_day_start(ts):
+    """Unix time at which the TELEMETRY_UTC_OFFSET day containing ts begins"""
+    return (ts + TELEMETRY_UTC_OFFSET) // 86400 * 86400 - TELEMETRY_UTC_OFFSET
+
+def rollup_telemetry(since=None, now=None):
+    """Recompute hourly and daily aggregates from `since` (default: the lookback window) to now.
+
+    Upserts make reruns and late readings harmless; a named lock keeps
+    several processes from rolling up the same window at once.
+    """
+    now = int(now or time.time())
+    since = int(since if since is not None else now - TELEMETRY_ROLLUP_LOOKBACK_HOURS * 3600)
+    hour_start = since - since % 3600
+    day_start = local_day_start(hour_start)
+    
+    connection = checkout_db_connection()
+    if not connection:
+        return False
+    cursor = connection.cursor()
+    cursor.execute("SELECT GET_LOCK('telemetry_rollup', 0)")
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        connection.release()
+        return False
+    try:
         cursor.execute("""
-            INSERT IGNORE INTO users (username, password_hash, email, first_name, last_name, role) 
-            VALUES ('admin', %s, 'admin@veeteqsolar.com', 'Admin', 'User', 'admin')
-        """, (admin_hash,))
-        
-        # Insert default settings
-        default_settings = [
-            ('company_name', 'Veeteq Solar', 'string', 'The name of the company'),
-            ('default_currency', 'KSh', 'string', 'Currency symbol for prices'),
-            ('residential_cost_per_watt', '375', 'float', 'Cost per watt for residential installations'),
-            ('commercial_cost_per_watt', '325', 'float', 'Cost per watt for commercial installations'),
-            ('cost_per_kwh', '20', 'float', 'Average utility cost per kWh'),
-            ('email_notification_enabled', 'false', 'boolean', 'Enable email notifications'),
-            ('session_timeout', '30', 'integer', 'Session timeout in minutes'),
-            ('max_login_attempts', '5', 'integer', 'Maximum login attempts before lockout')
-        ]
-        
-        for key, value, type_key, description in default_settings:
-            cursor.execute("""
-                INSERT IGNORE INTO settings (setting_key, setting_value, setting_type, description)
-                VALUES (%s, %s, %s, %s)
-            """, (key, value, type_key, description))
-            
-        # Create team_members table and migrate data
+            INSERT INTO telemetry_hourly (installation_id, hour_ts, samples, avg_power_w, max_power_w,
+                                          energy_start_wh, energy_end_wh, min_soc, max_soc)
+            SELECT installation_id, ts DIV 3600 * 3600 as hour_ts, COUNT(*), ROUND(AVG(power_w)), MAX(power_w),
+                   MIN(energy_wh), MAX(energy_wh), MIN(soc), MAX(soc)
+            FROM telemetry_raw
+            WHERE ts >= %s AND ts <= %s
+            GROUP BY installation_id, hour_ts
+            ON DUPLICATE KEY UPDATE
+            samples = VALUES(samples), avg_power_w = VALUES(avg_power_w), max_power_w = VALUES(max_power_w),
+            energy_start_wh = VALUES(energy_start_wh), energy_end_wh = VALUES(energy_end_wh),
+            min_soc = VALUES(min_soc), max_soc = VALUES(max_soc)
+        """, (hour_start, now))
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS team_members (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                role VARCHAR(100) NOT NULL,
-                bio TEXT,
-                image_url VARCHAR(255),
-                bg_color VARCHAR(50) DEFAULT 'solar-blue',
-                display_order INT DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Check if team members table is empty
-        cursor.execute("SELECT COUNT(*) as count FROM team_members")
-        if cursor.fetchone()[0] == 0:
-            print("Migrating default team members...")
-            default_team = [
-                ('Cedric Sumba', 'CEO & Founder', '4+ years in renewable energy', 'cedric_sumba.jpg', 'solar-blue', 1),
-                ('Grace Wanjiku', 'Head of Engineering', 'Expert in system design', 'grace_wanjiku.jpg', 'solar-green', 2),
-                ('Peter Kamau', 'Installation Manager', 'Certified master electrician', 'peter_kamau.jpg', 'solar-orange', 3),
-                ('Mary Akinyi', 'Customer Success', 'Dedicated to customer satisfaction', 'mary_akinyi.jpg', 'solar-yellow', 4)
-            ]
-            
-            for name, role, bio, image, color, order in default_team:
-                cursor.execute("""
-                    INSERT INTO team_members (name, role, bio, image_url, bg_color, display_order)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (name, role, bio, image, color, order))
-        
-        # Drop old tables if they exist (for migration from old system)
+            INSERT INTO telemetry_daily (installation_id, day, samples, avg_power_w, max_power_w,
+                                         energy_start_wh, energy_end_wh, min_soc, max_soc)
+            SELECT installation_id, DATE('1970-01-01') + INTERVAL (hour_ts + %s) DIV 86400 DAY as day,
+                   SUM(samples), ROUND(SUM(avg_power_w * samples) / SUM(samples)), MAX(max_power_w),
+                   MIN(energy_start_wh), MAX(energy_end_wh), MIN(min_soc), MAX(max_soc)
+            FROM telemetry_hourly
+            WHERE hour_ts >= %s AND hour_ts <= %s
+            GROUP BY installation_id, day
+            ON DUPLICATE KEY UPDATE
+            samples = VALUES(samples), avg_power_w = VALUES(avg_power_w), max_power_w = VALUES(max_power_w),
+            energy_start_wh = VALUES(energy_start_wh), energy_end_wh = VALUES(energy_end_wh),
+            min_soc = VALUES(min_soc), max_soc = VALUES(max_soc)
+        """, (TELEMETRY_UTC_OFFSET, day_start, now))
+        connection.commit()
+    finally:
+        cursor.execute("DO RELEASE_LOCK('telemetry_rollup')")
+        cursor.close()
+        connection.release()
+    with _telemetry_lock:
+        _telemetry_stats['last_rollup_at'] = now
+    return True
+
+def expire_telemetry(now=None):
+    """Delete raw and hourly rows past retention, in small batches; returns rows deleted"""
+    now = int(now or time.time())
+    connection = checkout_db_connection()
+    if not connection:
+        return 0
+    cursor = connection.cursor()
+    deleted = 0
+    for table, column, days in (('telemetry_raw', 'ts', TELEMETRY_RAW_RETENTION_DAYS),
+                                ('telemetry_hourly', 'hour_ts', TELEMETRY_HOURLY_RETENTION_DAYS)):
+        while True:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} < %s LIMIT %s", (now - days * 86400, TELEMETRY_DELETE_BATCH))
+            connection.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < TELEMETRY_DELETE_BATCH:
+                break
+    cursor.close()
+    connection.release()
+    return deleted
+
+def rollup_pending_telemetry():
+    """Roll up the lookback window, extended back to the oldest reading flushed since the last rollup"""
+    now = int(time.time())
+    since = now - TELEMETRY_ROLLUP_LOOKBACK_HOURS * 3600
+    with _telemetry_lock:
+        pending = _telemetry_stats['rollup_pending_since']
+        _telemetry_stats['rollup_pending_since'] = None
+    if pending is not None:
+        since = min(since, pending)
+    done = False
+    try:
+        done = rollup_telemetry(since=since, now=now)
+    finally:
+        if not done and pending is not None:
+            # Try the same window again next time
+            with _telemetry_lock:
+                current = _telemetry_stats['rollup_pending_since']
+                _telemetry_stats['rollup_pending_since'] = pending if current is None else min(current, pending)
+    return done
+
+def run_telemetry_worker(stop=None):
+    """Flush the buffer every few seconds (sooner when it fills) and run rollups and retention on schedule"""
+    last_rollup = last_retention = time.monotonic()
+    while stop is None or not stop.is_set():
+        _telemetry_wakeup.wait(TELEMETRY_FLUSH_SECONDS)
+        _telemetry_wakeup.clear()
         try:
-            cursor.execute("DROP TABLE IF EXISTS admin_users")
-            cursor.execute("DROP TABLE IF EXISTS client_users")
-            cursor.execute("DROP TABLE IF EXISTS customers")
-            print("Old admin_users, client_users, and customers tables removed successfully!")
+            flush_telemetry()
+            if time.monotonic() - last_rollup >= TELEMETRY_ROLLUP_SECONDS:
+                last_rollup = time.monotonic()
+                rollup_pending_telemetry()
+            if time.monotonic() - last_retention >= TELEMETRY_RETENTION_SECONDS:
+                last_retention = time.monotonic()
+                expire_telemetry()
         except Exception as e:
-            print(f"Note: Old tables may not exist yet: {e}")
-        
-        # Update foreign key constraints for quotes and installations
+            print(f"Telemetry worker error: {e}")
+
+def ensure_telemetry_worker():
+    """Start this process's telemetry worker thread on first use"""
+    global _telemetry_worker
+    if _telemetry_worker is None or not _telemetry_worker.is_alive():
+        with _telemetry_lock:
+            if _telemetry_worker is None or not _telemetry_worker.is_alive():
+                _telemetry_worker = threading.Thread(target=run_telemetry_worker, name='telemetry-worker', daemon=True)
+                _telemetry_worker.start()
+
+# Don't lose the last couple of seconds of readings on a clean shutdown
+atexit.register(flush_telemetry)
+
+@app.route('/api/telemetry', methods=['POST'])
+def ingest_telemetry():
+    if not TELEMETRY_API_KEY:
+        return jsonify({'error': 'Telemetry ingestion is not configured'}), 503
+    key = request.headers.get('X-Telemetry-Key', '')
+    if not hmac.compare_digest(key.encode(), TELEMETRY_API_KEY.encode()):
+        return jsonify({'error': 'Invalid telemetry key'}), 401
+    
+    payload = request.get_json(silent=True)
+    points = payload.get('points') if isinstance(payload, dict) else None
+    if not isinstance(points, list):
+        return jsonify({'error': 'Expected {"points": [[installation_id, ts, power_w, energy_wh, soc], ...]}'}), 400
+    if len(points) > TELEMETRY_MAX_POINTS:
+        return jsonify({'error': f'At most {TELEMETRY_MAX_POINTS} points per request'}), 413
+    
+    rows, errors = parse_telemetry_points(points, telemetry_site_ids(), int(time.time()))
+    with _telemetry_lock:
+        if len(_telemetry_buffer) + len(rows) > TELEMETRY_MAX_BUFFERED:
+            full = True
+        else:
+            full = False
+            _telemetry_buffer.extend(rows)
+            buffered = len(_telemetry_buffer)
+            _telemetry_stats['received'] += len(rows)
+            _telemetry_stats['rejected'] += len(errors)
+    if full:
+        response = jsonify({'error': 'Telemetry buffer is full, retry shortly'})
+        response.headers['Retry-After'] = str(TELEMETRY_FLUSH_SECONDS * 2)
+        return response, 503
+    
+    ensure_telemetry_worker()
+    if buffered >= TELEMETRY_FLUSH_ROWS:
+        _telemetry_wakeup.set()
+    return jsonify({
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': [{'index': index, 'error': reason} for index, reason in errors[:20]]
+    }), 202
+
+@app.route('/admin/installations/<int:installation_id>/telemetry')
+def admin_installation_telemetry(installation_id):
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    
+    resolution = request.args.get('resolution', 'hourly')
+    days = min(max(request.args.get('days', 7, type=int), 1), 366)
+    if resolution not in ('hourly', 'daily'):
+        return jsonify({'error': 'resolution must be hourly or daily'}), 400
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 503
+    cursor = connection.cursor(dictionary=True)
+    since = int(time.time()) - days * 86400
+    if resolution == 'hourly':
+        cursor.execute("""
+            SELECT hour_ts as ts, samples, avg_power_w, max_power_w,
+                   energy_end_wh - energy_start_wh as energy_wh, min_soc, max_soc
+            FROM telemetry_hourly
+            WHERE installation_id = %s AND hour_ts >= %s
+            ORDER BY hour_ts
+        """, (installation_id, since))
+    else:
+        cursor.execute("""
+            SELECT day, samples, avg_power_w, max_power_w,
+                   energy_end_wh - energy_start_wh as energy_wh, min_soc, max_soc
+            FROM telemetry_daily
+            WHERE installation_id = %s AND day >= %s
+            ORDER BY day
+        """, (installation_id, date(1970, 1, 1) + timedelta(days=(since + TELEMETRY_UTC_OFFSET) // 86400)))
+    rows = cursor.fetchall()
+    cursor.close()
+    connection.close()
+    for row in rows:
+        if 'day' in row:
+            row['day'] = row['day'].isoformat()
+    return jsonify({'installation_id': installation_id, 'resolution': resolution, 'points': rows})
+
+@app.cli.command('telemetry-rollup')
+@click.option('--hours', default=TELEMETRY_ROLLUP_LOOKBACK_HOURS, show_default=True, help='How far back to recompute.')
+@click.option('--expire', is_flag=True, help='Also delete rows past retention.')
+def telemetry_rollup_command(hours, expire):
+    """Rebuild hourly/daily telemetry aggregates and optionally apply retention"""
+    started = time.perf_counter()
+    if not rollup_telemetry(since=int(time.time()) - hours * 3600):
+        raise click.ClickException("Rollup did not run (database unavailable or another rollup in progress)")
+    print(f"Rolled up the last {hours} hours in {time.perf_counter() - started:.2f}s")
+    if expire:
+        print(f"Deleted {expire_telemetry():,} expired rows")
+
+@app.cli.command('telemetry-loadgen')
+@click.option('--url', default='http://127.0.0.1:5000/api/telemetry', show_default=True)
+@click.option('--key', default=lambda: TELEMETRY_API_KEY, help='Defaults to TELEMETRY_API_KEY.')
+@click.option('--sites', default=2000, show_default=True, help='Simulated sites.')
+@click.option('--site-ids', default=None, help='Comma-separated completed installation ids to report as (default: from the database).')
+@click.option('--interval', default=300, show_default=True, help='Simulated seconds between readings.')
+@click.option('--batch', default=1000, show_default=True, help='Points per request.')
+@click.option('--concurrency', default=8, show_default=True)
+@click.option('--duration', default=30.0, show_default=True, help='Seconds to run.')
+def telemetry_loadgen_command(url, key, sites, site_ids, interval, batch, concurrency, duration):
+    """Post synthetic inverter readings as fast as the endpoint accepts them and report throughput"""
+    if site_ids:
+        ids = [int(value) for value in site_ids.split(',') if value.strip()]
+    else:
+        ids = sorted(telemetry_site_ids())
+    if not ids:
+        raise click.ClickException("No completed installations; pass --site-ids")
+    
+    # Simulated sites beyond the real ones reuse their ids with a seconds offset
+    sites_by_virtual = [(ids[site % len(ids)], site // len(ids) % interval) for site in range(sites)]
+    clock = {'ts': int(time.time()) - (TELEMETRY_RAW_RETENTION_DAYS - 1) * 86400}
+    clock_lock = threading.Lock()
+    energy = [random.randint(0, 50000000) for _ in range(sites)]
+    deadline = time.monotonic() + duration
+    
+    def next_batch():
+        with clock_lock:
+            ts = clock['ts']
+            clock['ts'] += interval
+        hour = (ts + TELEMETRY_UTC_OFFSET) // 3600 % 24
+        sun = max(0.0, 1 - abs(hour - 12.5) / 6.5)
+        points = []
+        for site, (installation_id, offset) in enumerate(sites_by_virtual):
+            power = int(5000 * sun * random.uniform(0.6, 1.0))
+            energy[site] += power * interval // 3600
+            points.append([installation_id, ts + offset, power, energy[site], random.randint(20, 100)])
+        return [points[start:start + batch] for start in range(0, len(points), batch)]
+    
+    def post(points):
+        body = json.dumps({'points': points}).encode()
+        req = urllib.request.Request(url, data=body, method='POST',
+                                     headers={'Content-Type': 'application/json', 'X-Telemetry-Key': key or ''})
+        started = time.perf_counter()
         try:
-            # Remove old foreign key constraints
-            cursor.execute("ALTER TABLE quotes DROP FOREIGN KEY IF EXISTS quotes_ibfk_1")
-            cursor.execute("ALTER TABLE installations DROP FOREIGN KEY IF EXISTS installations_ibfk_1")
-            print("Old foreign key constraints removed successfully!")
-        except Exception as e:
-            print(f"Note: Foreign key constraints may not exist yet: {e}")
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        print("Database initialized successfully!")
+            with urllib.request.urlopen(req, timeout=30) as response:
+                result = json.loads(response.read())
+                return time.perf_counter() - started, result['accepted'], result['rejected'], None
+        except urllib.error.HTTPError as e:
+            return time.perf_counter() - started, 0, 0, e.code
+        except OSError as e:
+            return time.perf_counter() - started, 0, 0, str(e)
+    
+    latencies = []
+    totals = {'accepted': 0, 'rejected': 0, 'failed': 0}
+    errors = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while time.monotonic() < deadline and clock['ts'] < time.time():
+            batches = []
+            while len(batches) < concurrency * 2:
+                batches.extend(next_batch())
+            for latency, accepted, rejected, error in pool.map(post, batches):
+                latencies.append(latency)
+                totals['accepted'] += accepted
+                totals['rejected'] += rejected
+                if error is not None:
+                    totals['failed'] += 1
+                    errors[error] = errors.get(error, 0) + 1
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    print(f"{len(latencies):,} requests in {elapsed:.1f}s: {totals['accepted']:,} points accepted "
+          f"({totals['accepted'] / elapsed:,.0f}/s), {totals['rejected']:,} rejected, {totals['failed']:,} failed requests")
+    if latencies:
+        print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    for error, count in errors.items():
+        print(f"  {error}: {count}")
+
+# Files under static/uploads that templates reference directly rather than
+# through a database row; the upload collector never removes them.
+PROTECTED_UPLOADS = {'placeholder.jpg', 'solar_install.jpg', 'Veeteq Solar.jpg'}
+VARIANT_NAME = re.compile(r'^(?P<stem>.+)-\d+w\.\w+$')
+
+def upload_filename(image_url):
+    """Filename under static/uploads for any stored image_url convention.
+
+    Portfolio and product rows store "/static/uploads/<name>", team members
+    store the bare "<name>".
+    """
+    if not image_url:
+        return None
+    return os.path.basename(image_url.strip())
+
+def find_orphaned_uploads(grace_seconds):
+    """Upload files (and variants) no row references, older than the grace period"""
+    connection = get_db_connection()
+    if not connection:
+        return None
+    cursor = connection.cursor()
+    referenced = set(PROTECTED_UPLOADS)
+    for table in ('portfolio', 'products', 'team_members'):
+        cursor.execute(f"SELECT DISTINCT image_url FROM {table} WHERE image_url IS NOT NULL AND image_url <> ''")
+        referenced.update(upload_filename(image_url) for (image_url,) in cursor.fetchall())
+    cursor.close()
+    connection.close()
+    referenced_stems = {os.path.splitext(name)[0] for name in referenced}
+    
+    cutoff = time.time() - grace_seconds
+    folder = os.path.join(app.root_path, UPLOAD_FOLDER)
+    variant_folder = os.path.join(app.root_path, VARIANT_FOLDER)
+    orphans = []
+    for directory, is_variant in ((folder, False), (variant_folder, True)):
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                if is_variant:
+                    match = VARIANT_NAME.match(entry.name)
+                    in_use = match is not None and match.group('stem') in referenced_stems
+                else:
+                    in_use = entry.name in referenced
+                if not in_use:
+                    orphans.append((entry.path, stat.st_size))
+    return orphans
+
+@app.cli.command('gc-uploads')
+@click.option('--grace-hours', default=24.0, show_default=True, help='Leave files younger than this alone.')
+@click.option('--batch-size', default=500, show_default=True, help='Files removed per batch.')
+@click.option('--delete', is_flag=True, help='Remove the files; without it only a report is printed.')
+def gc_uploads_command(grace_hours, batch_size, delete):
+    """Remove uploads that no portfolio, product or team member row references"""
+    orphans = find_orphaned_uploads(grace_hours * 3600)
+    if orphans is None:
+        print("Database connection failed.")
+        raise SystemExit(1)
+    
+    total_bytes = sum(size for _, size in orphans)
+    if not delete:
+        for path, size in orphans:
+            print(f"{size:>12,} {os.path.relpath(path, app.root_path)}")
+        print(f"Dry run: {len(orphans)} unreferenced files, {total_bytes / 1e6:.2f} MB reclaimable. Re-run with --delete to remove them.")
+        return
+    
+    removed = 0
+    reclaimed = 0
+    for start in range(0, len(orphans), batch_size):
+        for path, size in orphans[start:start + batch_size]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            reclaimed += size
+        print(f"Removed {removed}/{len(orphans)} files ({reclaimed / 1e6:.2f} MB)")
+    _variant_widths.clear()
+    print(f"Reclaimed {reclaimed / 1e6:.2f} MB from {removed} files.")
 
 # Routes
 @app.route('/')
@@ -335,23 +2573,78 @@ def services():
     return render_template('services.html')
 
 @app.route('/products')
+@cached_page('products', query_args=('page',))
 def products():
+    search = request.args.get('q', '').strip()
+    page = min(max(request.args.get('page', 1, type=int), 1), SEARCH_MAX_PAGES)
     connection = get_db_connection()
     products = []
+    has_more = False
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM products ORDER BY category, name")
-        products = cursor.fetchall()
+        if search:
+            products, has_more = search_records(cursor, 'products', search, page)
+        else:
+            cursor.execute("SELECT * FROM products ORDER BY category, name")
+            products = cursor.fetchall()
         cursor.close()
         connection.close()
-    return render_template('products.html', products=products)
+    return render_template('products.html', products=products, search=search, page=page, has_more=has_more)
 
 @app.route('/quote')
 def quote():
-    return render_template('quote.html')
+    counties = sorted((slug, slug.replace('-', ' ').title()) for slug in COUNTY_SITES)
+    return render_template('quote.html', idempotency_key=uuid.uuid4().hex, counties=counties)
+
+# Quote sizing model shared by the calculator and bulk lead import.
+# Hybrid System Sizing: Factor 1.8x to cover Day Loads + Battery Charging
+SIZING_FACTOR = 1.8
+# Assume 1 kW generates ~135 kWh per month on average (Improved efficiency/sun hours)
+KWH_PER_KW_MONTH = 135
+# Assume 1 kW needs ~100 sq ft of roof
+SQFT_PER_KW = 100
+# The calculator sends 2000 sq ft when the roof size is unknown; treat that as unlimited
+UNKNOWN_ROOF_SIZE = 2000
+UNLIMITED_ROOF_SIZE = 5000000
+PANEL_KW = 0.55
+MIN_PANELS = 6
+ANNUAL_KWH_PER_KW = 1200
+
+def get_quote_rates():
+    """(residential cost/W, commercial cost/W, savings/kWh) from settings"""
+    return (get_setting('cost_per_watt_residential', 210),
+            get_setting('cost_per_watt_commercial', 180),
+            get_setting('savings_per_kwh', 20))
+
+def estimate_quotes(monthly_usage, roof_size, residential, rates=None, panel_kw=PANEL_KW):
+    """Vectorised quote sizing over NumPy arrays of monthly usage, roof size and residential flags.
+
+    All inputs, including the rates and panel size, broadcast against each
+    other, so the same code prices a list of leads or a what-if grid.
+    Returns a dict of arrays with the same fields as calculate_quote.
+    """
+    residential_rate, commercial_rate, savings_per_kwh = rates or get_quote_rates()
+    system_size_kw = monthly_usage * SIZING_FACTOR / KWH_PER_KW_MONTH
+    roof_size = np.where(roof_size == UNKNOWN_ROOF_SIZE, UNLIMITED_ROOF_SIZE, roof_size)
+    system_size_kw = np.minimum(system_size_kw, roof_size / SQFT_PER_KW)
+    panel_count = np.maximum(MIN_PANELS, np.ceil(system_size_kw / panel_kw)).astype(np.int64)
+    real_system_size_kw = panel_count * panel_kw
+    system_cost = real_system_size_kw * 1000 * np.where(residential, residential_rate, commercial_rate)
+    annual_savings = real_system_size_kw * ANNUAL_KWH_PER_KW * savings_per_kwh
+    payback = np.zeros(np.broadcast_shapes(system_cost.shape, annual_savings.shape))
+    np.divide(system_cost, annual_savings, out=payback, where=annual_savings > 0)
+    return {
+        'systemSize': real_system_size_kw,
+        'panelCount': panel_count,
+        'systemCost': system_cost,
+        'annualSavings': annual_savings,
+        'paybackPeriod': payback
+    }
 
 @app.route('/calculate_quote', methods=['POST'])
 def calculate_quote():
+    if np is None:
+        return jsonify({'error': 'NumPy is not installed'}), 501
     try:
         data = request.json
         
@@ -360,59 +2653,723 @@ def calculate_quote():
         roof_size = float(data.get('roofSize', 0))
         property_type = data.get('propertyType', 'residential')
         
-        # Calculate system size (kW) based on monthly usage
-        # Hybrid System Sizing: Factor 1.8x to cover Day Loads + Battery Charging
-        # Assume 1 kW generates ~135 kWh per month on average (Improved efficiency/sun hours)
-        required_kwh_monthly = monthly_usage * 1.8
-        system_size_kw = required_kwh_monthly / 135
-        
-        # Limit by roof size (assume 1 kW needs ~100 sq ft)
-        # If roof_size is the default 2000 sent by frontend, treat it as effectively unlimited
-        if roof_size == 2000:
-            roof_size = 5000000 # Boost to 5 million sq ft to allow industrial scale quotes
-            
-        max_system_by_roof = roof_size / 100
-        system_size_kw = min(system_size_kw, max_system_by_roof)
-        
-        # Calculate panel count (assuming 550W panels)
-        import math
-        panel_count = max(6, math.ceil(system_size_kw / 0.55))
-        
-        # Recalculate exact system size based on panel count
-        real_system_size_kw = panel_count * 0.55
-        
-        # Calculate costs (in Kenyan Shillings) - using dynamic settings
-        if property_type == 'residential':
-            cost_per_watt = get_setting('cost_per_watt_residential', 210)
-        else:
-            cost_per_watt = get_setting('cost_per_watt_commercial', 180)
-        
-        system_cost = real_system_size_kw * 1000 * cost_per_watt
+        # Logged-in clients can size from their uploaded meter data instead of one bill
+        load_profile = None
+        if data.get('useLoadProfile') and session.get('user', {}).get('role') == 'client':
+            load_profile = get_load_profile(session['user']['id'])
+            if load_profile:
+                monthly_usage = float(load_profile[0].sum(dtype=np.float64)) / 12
         
-        # Calculate savings using dynamic settings
-        annual_generation = real_system_size_kw * 1200  # kWh per year
-        savings_per_kwh = get_setting('savings_per_kwh', 20)
-        annual_savings = annual_generation * savings_per_kwh
-        
-        # No tax credit in Kenya, but we can show the full system cost
-        tax_credit = 0
-        net_cost = system_cost
+        # Same sizing and pricing as bulk quotes, for a single row
+        estimate = estimate_quotes(np.array([monthly_usage]), np.array([roof_size]), np.array([property_type == 'residential']))
+        system_cost = float(estimate['systemCost'][0])
         
+        # No tax credit in Kenya, so the net cost is the full system cost
         result = {
-            'systemSize': round(real_system_size_kw, 2),
-            'panelCount': panel_count,
+            'systemSize': round(float(estimate['systemSize'][0]), 2),
+            'panelCount': int(estimate['panelCount'][0]),
             'systemCost': round(system_cost, 2),
-            'taxCredit': round(tax_credit, 2),
-            'netCost': round(net_cost, 2),
-            'annualSavings': round(annual_savings, 2),
-            'paybackPeriod': round(net_cost / annual_savings, 1) if annual_savings > 0 else 0
+            'taxCredit': 0,
+            'netCost': round(system_cost, 2),
+            'annualSavings': round(float(estimate['annualSavings'][0]), 2),
+            'paybackPeriod': round(float(estimate['paybackPeriod'][0]), 1)
         }
         
+        # Hourly simulation when the caller says where the system will be installed
+        if load_profile:
+            hourly, info = load_profile
+            result['loadProfile'] = {'source': info['source'], 'annualKwh': float(info['annual_kwh']), 'coverage': float(info['coverage'])}
+            if data.get('county'):
+                result['simulation'] = size_from_load_profile(hourly, data['county'], property_type)['simulation']
+        elif data.get('county'):
+            result['simulation'] = quote_simulation(data['county'], monthly_usage, property_type)
+        
         return jsonify(result)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+# What-if grid: every combination of usage, panel wattage, cost per watt and
+# tariff, priced in one broadcast call to estimate_quotes. Each result is
+# returned over only the axes it depends on, flattened in C order.
+SCENARIO_AXIS_STEPS = 20
+SCENARIO_MAX_AXIS_VALUES = 50
+SCENARIO_MAX_CELLS = 250000
+
+def scenario_axis(spec, default_min, default_max, name):
+    """Values for one grid axis from a list, a {min, max, steps} dict or the defaults"""
+    if spec is None:
+        spec = {'min': default_min, 'max': default_max}
+    if isinstance(spec, dict):
+        steps = int(spec.get('steps', SCENARIO_AXIS_STEPS))
+        if not 1 <= steps <= SCENARIO_MAX_AXIS_VALUES:
+            raise ValueError(f"{name}.steps must be between 1 and {SCENARIO_MAX_AXIS_VALUES}")
+        values = np.linspace(float(spec.get('min', default_min)), float(spec.get('max', default_max)), steps)
+    else:
+        values = np.asarray(spec, dtype=np.float64).ravel()
+        if not 1 <= values.size <= SCENARIO_MAX_AXIS_VALUES:
+            raise ValueError(f"{name} must have between 1 and {SCENARIO_MAX_AXIS_VALUES} values")
+    if not np.all(np.isfinite(values)) or np.any(values <= 0):
+        raise ValueError(f"{name} values must be positive numbers")
+    return values
+
+def compute_scenario_grid(monthly_usage, roof_size, property_type, axes=None, rates=None):
+    """Price the full usage x panel x cost x tariff grid; returns a columnar dict"""
+    axes = axes or {}
+    residential_rate, commercial_rate, savings_per_kwh = rates or get_quote_rates()
+    cost_per_watt = residential_rate if property_type == 'residential' else commercial_rate
+    usage = scenario_axis(axes.get('usage'), monthly_usage * 0.5, monthly_usage * 2, 'usage')
+    panel_watts = scenario_axis(axes.get('panelWatts'), 400, 700, 'panelWatts')
+    costs = scenario_axis(axes.get('costPerWatt'), cost_per_watt * 0.7, cost_per_watt * 1.3, 'costPerWatt')
+    tariffs = scenario_axis(axes.get('tariff'), savings_per_kwh * 0.5, savings_per_kwh * 1.5, 'tariff')
+    cells = usage.size * panel_watts.size * costs.size * tariffs.size
+    if cells > SCENARIO_MAX_CELLS:
+        raise ValueError(f"grid has {cells} cells; the limit is {SCENARIO_MAX_CELLS}")
+    
+    # Axis order: usage, panelWatts, costPerWatt, tariff. The cost rate is passed
+    # as both residential and commercial since the property type is fixed.
+    result = estimate_quotes(
+        usage[:, None, None, None], roof_size, True,
+        (costs[None, None, :, None], costs[None, None, :, None], tariffs[None, None, None, :]),
+        panel_kw=panel_watts[None, :, None, None] / 1000
+    )
+    
+    def column(values, dims, decimals):
+        # Independent axes have length 1, so ravel() walks only the listed dims
+        return {'dims': dims, 'values': np.round(values, decimals).ravel().tolist()}
+    
+    return {
+        'axes': {
+            'usage': usage.round(2).tolist(),
+            'panelWatts': panel_watts.round(1).tolist(),
+            'costPerWatt': costs.round(2).tolist(),
+            'tariff': tariffs.round(2).tolist()
+        },
+        'cells': cells,
+        'systemSize': column(result['systemSize'], ['usage', 'panelWatts'], 2),
+        'panelCount': column(result['panelCount'], ['usage', 'panelWatts'], 0),
+        'systemCost': column(result['systemCost'], ['usage', 'panelWatts', 'costPerWatt'], 0),
+        'annualSavings': column(result['annualSavings'], ['usage', 'panelWatts', 'tariff'], 0),
+        'paybackPeriod': column(result['paybackPeriod'], ['usage', 'panelWatts', 'costPerWatt', 'tariff'], 2)
+    }
+
+@app.route('/admin/quotes/scenarios', methods=['POST'])
+def admin_quote_scenarios():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    if np is None:
+        return jsonify({'error': 'NumPy is not installed'}), 501
+    
+    try:
+        data = request.json or {}
+        grid = compute_scenario_grid(
+            float(data.get('monthlyUsage', 0)) or 1,
+            float(data.get('roofSize', UNKNOWN_ROOF_SIZE)),
+            data.get('propertyType', 'residential'),
+            data.get('axes')
+        )
+        return jsonify(grid)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.cli.command('bench-scenarios')
+@click.option('--steps', default=SCENARIO_AXIS_STEPS, show_default=True, help='Values per axis.')
+@click.option('--repeat', default=20, show_default=True)
+def bench_scenarios_command(steps, repeat):
+    """Time the what-if grid computation per cell"""
+    axes = {name: {'steps': steps} for name in ('usage', 'panelWatts', 'costPerWatt', 'tariff')}
+    rates = (375, 325, 20)
+    
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        grid = compute_scenario_grid(5000, UNKNOWN_ROOF_SIZE, 'residential', axes, rates)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    started = time.perf_counter()
+    payload = json.dumps(grid)
+    encode = time.perf_counter() - started
+    print(f"{grid['cells']:,} cells: best {best * 1000:.2f} ms ({best / grid['cells'] * 1e9:.0f} ns/cell), "
+          f"JSON {len(payload) / 1e6:.2f} MB in {encode * 1000:.1f} ms")
+
+# Hourly simulation. Each county has an 8760-hour irradiance profile (W/m2) in
+# data/irradiance/<county>.npy, memory-mapped on first use. The bundled
+# profiles are synthesised from solar geometry (Haurwitz clear-sky model) and
+# a per-county sky factor with seasonal rains by `flask build-irradiance`;
+# measured TMY data can replace a file in place. Battery dispatch is a prefix
+# scan over the hours, vectorised across every PV/battery combination the
+# optimizer considers.
+IRRADIANCE_FOLDER = 'data/irradiance'
+HOURS_PER_YEAR = 8760
+PV_PERFORMANCE_RATIO = 0.8
+BATTERY_ROUND_TRIP_EFFICIENCY = 0.9
+BATTERY_DEPTH_OF_DISCHARGE = 0.9
+BATTERY_COST_PER_KWH = 60000
+PV_LIFETIME_YEARS = 25
+BATTERY_LIFETIME_YEARS = 10
+# Share of clear-sky irradiance by month; the long (Mar-May) and short (Oct-Dec) rains are cloudier
+MONTHLY_SKY_FACTOR = (1.0, 1.0, 0.92, 0.82, 0.86, 0.95, 0.93, 0.95, 1.0, 0.93, 0.87, 0.95)
+# Hourly load shapes (fraction of daily use)
+LOAD_SHAPES = {
+    'residential': (2, 2, 2, 2, 2, 3, 5, 6, 4, 3, 3, 3, 3, 3, 3, 3, 4, 5, 8, 9, 8, 6, 4, 3),
+    'commercial': (2, 2, 2, 2, 2, 2, 3, 5, 7, 8, 8, 8, 7, 8, 8, 8, 7, 6, 4, 3, 2, 2, 2, 2)
+}
+# county: (latitude, longitude, sky factor)
+COUNTY_SITES = {
+    'mombasa': (-4.04, 39.67, 0.74), 'kwale': (-4.17, 39.45, 0.73), 'kilifi': (-3.51, 39.85, 0.74),
+    'tana-river': (-1.50, 40.00, 0.77), 'lamu': (-2.27, 40.90, 0.75), 'taita-taveta': (-3.40, 38.37, 0.74),
+    'garissa': (-0.45, 39.65, 0.79), 'wajir': (1.75, 40.06, 0.80), 'mandera': (3.94, 41.86, 0.81),
+    'marsabit': (2.33, 37.99, 0.80), 'isiolo': (0.35, 37.58, 0.78), 'meru': (0.05, 37.65, 0.69),
+    'tharaka-nithi': (-0.30, 37.90, 0.70), 'embu': (-0.54, 37.46, 0.68), 'kitui': (-1.37, 38.01, 0.74),
+    'machakos': (-1.52, 37.26, 0.72), 'makueni': (-1.80, 37.62, 0.73), 'nyandarua': (-0.18, 36.52, 0.64),
+    'nyeri': (-0.42, 36.95, 0.65), 'kirinyaga': (-0.50, 37.28, 0.67), 'muranga': (-0.72, 37.15, 0.67),
+    'kiambu': (-1.17, 36.83, 0.68), 'turkana': (3.12, 35.60, 0.82), 'west-pokot': (1.62, 35.36, 0.74),
+    'samburu': (1.10, 36.70, 0.77), 'trans-nzoia': (1.02, 35.00, 0.67), 'uasin-gishu': (0.52, 35.27, 0.66),
+    'elgeyo-marakwet': (0.80, 35.50, 0.67), 'nandi': (0.18, 35.12, 0.64), 'baringo': (0.47, 35.97, 0.74),
+    'laikipia': (0.20, 36.80, 0.72), 'nakuru': (-0.30, 36.07, 0.70), 'narok': (-1.08, 35.87, 0.70),
+    'kajiado': (-1.85, 36.78, 0.74), 'kericho': (-0.37, 35.28, 0.63), 'bomet': (-0.78, 35.34, 0.65),
+    'kakamega': (0.28, 34.75, 0.63), 'vihiga': (0.08, 34.72, 0.63), 'bungoma': (0.56, 34.56, 0.64),
+    'busia': (0.46, 34.11, 0.66), 'siaya': (0.06, 34.29, 0.67), 'kisumu': (-0.09, 34.77, 0.69),
+    'homa-bay': (-0.53, 34.46, 0.69), 'migori': (-1.06, 34.47, 0.67), 'kisii': (-0.68, 34.77, 0.63),
+    'nyamira': (-0.56, 34.93, 0.63), 'nairobi': (-1.29, 36.82, 0.70)
+}
+
+_irradiance_profiles = {}
+_irradiance_lock = threading.Lock()
+
+def county_slug(name):
+    """COUNTY_SITES key for a free-text county name such as "Murang'a County" """
+    slug = re.sub(r'[^a-z]+', '-', (name or '').lower().replace("'", '')).strip('-')
+    return re.sub(r'-county$', '', slug)
+
+def synthesize_irradiance(latitude, longitude, sky_factor, seed):
+    """8760 hourly global horizontal irradiance values (W/m2) for a typical year"""
+    hours = np.arange(HOURS_PER_YEAR)
+    day = hours // 24 + 1
+    # Mid-hour in East Africa Time (UTC+3) converted to apparent solar time
+    b = 2 * np.pi * (day - 81) / 364
+    equation_of_time = 9.87 * np.sin(2 * b) - 7.53 * np.cos(b) - 1.5 * np.sin(b)
+    solar_time = hours % 24 + 0.5 + (longitude - 45) / 15 + equation_of_time / 60
+    hour_angle = np.radians(15 * (solar_time - 12))
+    declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + day) / 365)
+    phi = np.radians(latitude)
+    cos_zenith = np.sin(phi) * np.sin(declination) + np.cos(phi) * np.cos(declination) * np.cos(hour_angle)
+    cos_zenith = np.clip(cos_zenith, 0, None)
+    clear_sky = np.where(cos_zenith > 0, 1098 * cos_zenith * np.exp(-0.057 / np.maximum(cos_zenith, 1e-3)), 0)
+    
+    # Day-to-day cloudiness drawn around the month's mean so batteries see runs of dull days
+    months = (np.arange(365) * 12) // 365
+    mean = sky_factor * np.asarray(MONTHLY_SKY_FACTOR)[months]
+    daily = np.random.default_rng(seed).beta(mean * 10, (1 - mean) * 10)
+    return (clear_sky * np.repeat(daily, 24)).astype(np.float32)
+
+def irradiance_path(county):
+    """Path of a county's irradiance profile"""
+    return os.path.join(app.root_path, IRRADIANCE_FOLDER, f"{county}.npy")
+
+def build_irradiance_profile(county, force=False):
+    """Write a county's synthesised profile unless it already exists"""
+    path = irradiance_path(county)
+    if os.path.exists(path) and not force:
+        return path
+    latitude, longitude, sky_factor = COUNTY_SITES[county]
+    profile = synthesize_irradiance(latitude, longitude, sky_factor, zlib.crc32(county.encode()))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a concurrent reader never maps a half-written file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.save(f, profile)
+    os.replace(temp_path, path)
+    return path
+
+def get_irradiance(county):
+    """Memory-mapped irradiance profile for a county"""
+    profile = _irradiance_profiles.get(county)
+    if profile is None:
+        if county not in COUNTY_SITES:
+            raise KeyError(f"Unknown county '{county}'")
+        with _irradiance_lock:
+            profile = _irradiance_profiles.get(county)
+            if profile is None:
+                profile = np.load(irradiance_path(county), mmap_mode='r')
+                _irradiance_profiles[county] = profile
+    return profile
+
+def hourly_load_profile(monthly_kwh, property_type='residential'):
+    """8760 hourly kWh values spreading monthly use over a typical daily shape"""
+    shape = np.asarray(LOAD_SHAPES['residential' if property_type == 'residential' else 'commercial'], dtype=np.float64)
+    daily_kwh = monthly_kwh * 12 / 365
+    return np.tile(shape / shape.sum() * daily_kwh, 365)
+
+def battery_states(net, capacity):
+    """Stored energy after each hour, state[t] = clip(state[t - 1] + net[t], 0, capacity).
+
+    An hour is the map x -> clip(x + shift, low, high), and two such maps
+    compose into another, so the recurrence is a scan: each day's hours are
+    composed in 24 steps across all days at once, the daily maps are scanned
+    by doubling, and every hour then follows from its day's starting state.
+    """
+    hours, configs = net.shape
+    net = np.concatenate([net, np.zeros((-hours % 24, configs))])
+    # (hour of day, day, configuration)
+    steps = net.reshape(-1, 24, configs).transpose(1, 0, 2)
+    shift = np.cumsum(steps, axis=0)
+    low = np.empty_like(steps)
+    high = np.empty_like(steps)
+    low[0] = 0
+    high[0] = capacity
+    for hour in range(1, 24):
+        np.minimum(np.maximum(low[hour - 1] + steps[hour], 0, out=low[hour]), capacity, out=low[hour])
+        np.minimum(np.maximum(high[hour - 1] + steps[hour], 0, out=high[hour]), capacity, out=high[hour])
+    
+    # Hillis-Steele scan of the daily maps; day d then ends at clip(0 + shift, low, high)
+    day_shift, day_low, day_high = shift[-1].copy(), low[-1].copy(), high[-1].copy()
+    step = 1
+    while step < len(day_shift):
+        later_low, later_high = day_low[step:], day_high[step:]
+        composed_low = np.minimum(np.maximum(day_low[:-step] + day_shift[step:], later_low), later_high)
+        composed_high = np.minimum(np.maximum(day_high[:-step] + day_shift[step:], later_low), later_high)
+        day_shift[step:] = day_shift[:-step] + day_shift[step:]
+        day_low[step:], day_high[step:] = composed_low, composed_high
+        step *= 2
+    day_end = np.minimum(np.maximum(day_shift, day_low), day_high)
+    
+    shift[:, 1:] += day_end[:-1]
+    np.maximum(shift, low, out=shift)
+    np.minimum(shift, high, out=shift)
+    return shift.transpose(1, 0, 2).reshape(-1, configs)[:hours]
+
+def simulate_systems(irradiance, load, pv_kw, battery_kwh):
+    """Simulate a year for every (pv_kw[i], battery_kwh[i]) pair at once.
+
+    Returns a dict of per-configuration annual totals (kWh) and ratios.
+    """
+    pv_per_kwp = np.asarray(irradiance, dtype=np.float64) / 1000 * PV_PERFORMANCE_RATIO
+    pv = pv_per_kwp[:, None] * pv_kw[None, :]
+    direct = np.minimum(pv, load[:, None])
+    # Each hour has either surplus or deficit after direct use, never both, so
+    # the battery only needs its net flow: stored = surplus * eff, drawn = deficit / eff
+    efficiency = np.sqrt(BATTERY_ROUND_TRIP_EFFICIENCY)
+    net = (pv - direct) * efficiency - (load[:, None] - direct) / efficiency
+    capacity = battery_kwh * BATTERY_DEPTH_OF_DISCHARGE
+    
+    change = np.diff(battery_states(net, capacity), axis=0, prepend=0)
+    stored = np.clip(change, 0, None).sum(axis=0)
+    delivered = -np.clip(change, None, 0).sum(axis=0) * efficiency
+    
+    generation = pv.sum(axis=0)
+    direct_total = direct.sum(axis=0)
+    load_total = load.sum()
+    used = direct_total + stored / efficiency
+    return {
+        'generation': generation,
+        'grid_import': load_total - direct_total - delivered,
+        'curtailed': generation - used,
+        'self_consumption': np.divide(used, generation, out=np.zeros_like(used), where=generation > 0),
+        'self_sufficiency': (direct_total + delivered) / load_total if load_total else np.zeros_like(used),
+        'battery_cycles': np.divide(stored, capacity, out=np.zeros_like(stored), where=capacity > 0)
+    }
+
+def optimize_system(irradiance, load, cost_per_watt, tariff, battery_cost_per_kwh=BATTERY_COST_PER_KWH):
+    """Cheapest PV/battery combination over the PV lifetime: capex, battery replacements and grid imports"""
+    annual_load = load.sum()
+    yield_per_kwp = float(np.sum(irradiance, dtype=np.float64)) / 1000 * PV_PERFORMANCE_RATIO
+    base_kw = annual_load / yield_per_kwp if yield_per_kwp else PANEL_KW
+    pv_options = np.unique(np.maximum(MIN_PANELS, np.ceil(base_kw * np.linspace(0.25, 2.5, 12) / PANEL_KW)) * PANEL_KW)
+    daily_kwh = annual_load / 365
+    battery_options = np.unique(np.round(daily_kwh * np.array([0, 0.25, 0.5, 0.75, 1.0, 1.5]), 1))
+    pv_kw, battery_kwh = (grid.ravel() for grid in np.meshgrid(pv_options, battery_options, indexing='ij'))
+    
+    results = simulate_systems(irradiance, load, pv_kw, battery_kwh)
+    capex = pv_kw * 1000 * cost_per_watt + battery_kwh * battery_cost_per_kwh
+    battery_purchases = -(-PV_LIFETIME_YEARS // BATTERY_LIFETIME_YEARS)
+    grid_cost = results['grid_import'] * tariff
+    total_cost = capex + (battery_purchases - 1) * battery_kwh * battery_cost_per_kwh + PV_LIFETIME_YEARS * grid_cost
+    best = int(np.argmin(total_cost))
+    baseline = annual_load * tariff
+    return {
+        'pvKw': round(float(pv_kw[best]), 2),
+        'panelCount': int(round(pv_kw[best] / PANEL_KW)),
+        'batteryKwh': round(float(battery_kwh[best]), 1),
+        'systemCost': round(float(capex[best]), 2),
+        'annualGeneration': round(float(results['generation'][best]), 1),
+        'annualGridImport': round(float(results['grid_import'][best]), 1),
+        'selfConsumption': round(float(results['self_consumption'][best]), 3),
+        'selfSufficiency': round(float(results['self_sufficiency'][best]), 3),
+        'batteryCycles': round(float(results['battery_cycles'][best]), 1),
+        'annualSavings': round(float(baseline - grid_cost[best]), 2),
+        'paybackPeriod': round(float(capex[best] / (baseline - grid_cost[best])), 1) if baseline > grid_cost[best] else 0,
+        'configurationsTried': int(pv_kw.size)
+    }
+
+@functools.lru_cache(maxsize=512)
+def simulate_quote(county, monthly_kwh, property_type, cost_per_watt, tariff, battery_cost_per_kwh):
+    """Optimised system for a quote; cached since the calculator is re-run with the same inputs"""
+    return optimize_system(get_irradiance(county), hourly_load_profile(monthly_kwh, property_type),
+                           cost_per_watt, tariff, battery_cost_per_kwh)
+
+def quote_simulation(county_name, monthly_kwh, property_type):
+    """Simulation block for calculate_quote, or None when it can't be run"""
+    county = county_slug(county_name)
+    if np is None or county not in COUNTY_SITES or monthly_kwh <= 0:
+        return None
+    residential_rate, commercial_rate, tariff = get_quote_rates()
+    cost_per_watt = residential_rate if property_type == 'residential' else commercial_rate
+    result = simulate_quote(county, round(monthly_kwh, 1), property_type, cost_per_watt, tariff,
+                            get_setting('battery_cost_per_kwh', BATTERY_COST_PER_KWH))
+    return dict(result, county=county)
+
+@app.cli.command('build-irradiance')
+@click.option('--force', is_flag=True, help='Regenerate existing profiles.')
+def build_irradiance_command(force):
+    """Write the per-county hourly irradiance profiles"""
+    for county in sorted(COUNTY_SITES):
+        path = build_irradiance_profile(county, force=force)
+        yearly = float(np.load(path, mmap_mode='r').sum(dtype=np.float64)) / 1000
+        print(f"{county:<18} {yearly:,.0f} kWh/m2/year")
+
+@app.cli.command('simulate')
+@click.option('--county', default='nairobi', show_default=True)
+@click.option('--monthly-usage', default=400.0, show_default=True, help='kWh per month.')
+@click.option('--property-type', type=click.Choice(['residential', 'commercial']), default='residential', show_default=True)
+def simulate_command(county, monthly_usage, property_type):
+    """Size a PV/battery system with the hourly simulation and print the result"""
+    county = county_slug(county)
+    irradiance = get_irradiance(county)
+    load = hourly_load_profile(monthly_usage, property_type)
+    residential_rate, commercial_rate, tariff = get_quote_rates()
+    started = time.perf_counter()
+    result = optimize_system(irradiance, load, residential_rate if property_type == 'residential' else commercial_rate, tariff,
+                             get_setting('battery_cost_per_kwh', BATTERY_COST_PER_KWH))
+    elapsed = time.perf_counter() - started
+    for key, value in result.items():
+        print(f"{key:<20} {value}")
+    print(f"Optimised in {elapsed * 1000:.0f} ms")
+
+# Customer load profiles. Interval meter exports or a year of bills are
+# reduced while streaming to one typical year of 8760 hourly kWh values,
+# stored as a zlib-compressed float32 blob in load_profiles (one row per
+# customer rather than one per reading).
+METER_CHUNK_ROWS = 8192
+METER_TIMESTAMP_FORMATS = ('%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%Y/%m/%d %H:%M', '%d-%m-%Y %H:%M')
+BILL_MONTH_FORMATS = ('%Y-%m', '%b %Y', '%B %Y', '%m/%Y', '%b-%y', '%Y-%m-%d')
+DAYS_PER_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def meter_columns(header):
+    """(timestamp index, value index, values are power) for an interval meter header"""
+    names = [name.strip().lower() for name in header]
+    time_index = next((i for i, name in enumerate(names) if 'time' in name or 'date' in name), 0)
+    value_index = next((i for i, name in enumerate(names) if i != time_index and re.search(r'kwh|wh|kw|value|reading|consumption|usage', name)),
+                       1 if time_index == 0 else 0)
+    value_name = names[value_index]
+    is_power = bool(re.search(r'\bkw\b|demand|power', value_name)) and 'kwh' not in value_name
+    return time_index, value_index, is_power
+
+def parse_meter_timestamps(values):
+    """datetime64[m] array from timestamp strings, trying ISO first"""
+    try:
+        return np.array(values, dtype='datetime64[m]')
+    except ValueError:
+        pass
+    for fmt in METER_TIMESTAMP_FORMATS:
+        try:
+            return np.array([datetime.strptime(value, fmt) for value in values], dtype='datetime64[m]')
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised timestamp '{values[0]}'")
+
+def typical_year_hour(timestamps):
+    """Hour of a 365-day year (0-8759) for each timestamp; -1 for 29 February"""
+    days = timestamps.astype('datetime64[D]')
+    years = timestamps.astype('datetime64[Y]')
+    day_of_year = (days - years.astype('datetime64[D]')).astype(np.int64)
+    hour = (timestamps - days.astype('datetime64[m]')).astype(np.int64) // 60
+    year = years.astype(np.int64) + 1970
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    # Fold leap years onto 365 days by dropping 29 February
+    index = np.where(leap & (day_of_year > 59), day_of_year - 1, day_of_year) * 24 + hour
+    return np.where(leap & (day_of_year == 59), -1, index)
+
+def fill_missing_hours(hourly, present):
+    """Fill hours without readings from the same hour of day in that month, else across the year"""
+    if present.all():
+        return hourly
+    by_day = hourly.reshape(365, 24)
+    present_by_day = present.reshape(365, 24)
+    month_of_day = np.repeat(np.arange(12), DAYS_PER_MONTH)
+    yearly_count = present_by_day.sum(axis=0)
+    yearly_mean = np.divide(by_day.sum(axis=0), yearly_count, out=np.zeros(24), where=yearly_count > 0)
+    for month in range(12):
+        days = month_of_day == month
+        count = present_by_day[days].sum(axis=0)
+        mean = np.where(count > 0, by_day[days].sum(axis=0) / np.maximum(count, 1), yearly_mean)
+        by_day[days] = np.where(present_by_day[days], by_day[days], mean)
+    return by_day.ravel()
+
+def parse_interval_meter(reader, header):
+    """Hourly typical-year profile from interval readings, processed in fixed-size chunks"""
+    time_index, value_index, is_power = meter_columns(header)
+    energy = np.zeros(HOURS_PER_YEAR)
+    readings = np.zeros(HOURS_PER_YEAR)
+    interval = None
+    total_readings = 0
+    
+    while True:
+        rows = [row for _, row in zip(range(METER_CHUNK_ROWS), reader) if len(row) > max(time_index, value_index)]
+        if not rows:
+            break
+        timestamps = parse_meter_timestamps([row[time_index].strip() for row in rows])
+        try:
+            values = np.array([row[value_index] or 'nan' for row in rows], dtype=np.float64)
+        except ValueError:
+            raise ValueError("meter readings must be numbers")
+        if interval is None and len(timestamps) > 1:
+            steps = np.diff(timestamps).astype(np.int64)
+            steps = steps[steps > 0]
+            interval = int(np.median(steps)) if steps.size else 60
+        index = typical_year_hour(timestamps)
+        keep = (index >= 0) & np.isfinite(values)
+        energy += np.bincount(index[keep], weights=values[keep], minlength=HOURS_PER_YEAR)
+        readings += np.bincount(index[keep], minlength=HOURS_PER_YEAR)
+        total_readings += int(keep.sum())
+    
+    if not total_readings:
+        raise ValueError("no meter readings found")
+    interval = interval or 60
+    present = readings > 0
+    # Mean reading per slot averages across duplicate years; a mean kW over an
+    # hour is already kWh, energy readings scale up by readings per hour
+    hourly = np.divide(energy, readings, out=np.zeros(HOURS_PER_YEAR), where=present)
+    if not is_power:
+        hourly *= max(1.0, 60 / interval)
+    return fill_missing_hours(hourly, present), {
+        'source': 'interval',
+        'interval_minutes': interval,
+        'readings': total_readings,
+        'coverage': float(present.mean())
+    }
+
+def parse_bill_month(value):
+    """Month number (1-12) from a billing period label"""
+    value = value.strip()
+    for fmt in BILL_MONTH_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).month
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised billing month '{value}'")
+
+def parse_bills(reader, header):
+    """Hourly typical-year profile from monthly kWh totals on bills"""
+    names = [name.strip().lower() for name in header]
+    month_index = next((i for i, name in enumerate(names) if 'month' in name or 'period' in name), 0)
+    kwh_index = next((i for i, name in enumerate(names) if i != month_index and re.search(r'kwh|units|usage|consumption', name)),
+                     1 if month_index == 0 else 0)
+    totals = np.zeros(12)
+    counts = np.zeros(12)
+    for row in reader:
+        if len(row) <= max(month_index, kwh_index) or not row[month_index].strip():
+            continue
+        month = parse_bill_month(row[month_index]) - 1
+        try:
+            totals[month] += float(row[kwh_index].replace(',', ''))
+        except ValueError:
+            raise ValueError(f"bill usage must be a number, got '{row[kwh_index]}'")
+        counts[month] += 1
+    if not counts.any():
+        raise ValueError("no bills found")
+    monthly = np.where(counts > 0, totals / np.maximum(counts, 1), totals.sum() / counts.sum())
+    
+    shape = np.asarray(LOAD_SHAPES['residential'], dtype=np.float64)
+    days = np.asarray(DAYS_PER_MONTH)
+    daily = np.repeat(monthly / days, days)
+    hourly = (daily[:, None] * (shape / shape.sum())[None, :]).ravel()
+    return hourly, {
+        'source': 'bills',
+        'interval_minutes': None,
+        'readings': int(counts.sum()),
+        'coverage': float((counts > 0).mean())
+    }
+
+def parse_load_data(lines):
+    """Parse an interval meter export or a bill history CSV into (hourly kWh, info)"""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("the file is empty")
+    names = ' '.join(header).lower()
+    if re.search(r'month|period|bill', names) and not re.search(r'time', names):
+        hourly, info = parse_bills(reader, header)
+    else:
+        hourly, info = parse_interval_meter(reader, header)
+    info['annual_kwh'] = float(hourly.sum())
+    return hourly.astype(np.float32), info
+
+def save_load_profile(cursor, user_id, hourly, info):
+    """Store (or replace) a customer's hourly profile"""
+    blob = zlib.compress(np.asarray(hourly, dtype='<f4').tobytes())
+    cursor.execute("""
+        INSERT INTO load_profiles (user_id, source, interval_minutes, readings, coverage, annual_kwh, hourly_kwh)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        source = VALUES(source), interval_minutes = VALUES(interval_minutes), readings = VALUES(readings),
+        coverage = VALUES(coverage), annual_kwh = VALUES(annual_kwh), hourly_kwh = VALUES(hourly_kwh)
+    """, (user_id, info['source'], info['interval_minutes'], info['readings'], round(info['coverage'], 4),
+          round(info['annual_kwh'], 2), blob))
+
+def get_load_profile(user_id):
+    """(hourly kWh array, info dict) for a customer, or None"""
+    if np is None:
+        return None
+    connection = get_db_connection()
+    if not connection:
+        return None
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT source, interval_minutes, readings, coverage, annual_kwh, hourly_kwh, updated_at
+        FROM load_profiles WHERE user_id = %s
+    """, (user_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    if not row:
+        return None
+    hourly = np.frombuffer(zlib.decompress(row.pop('hourly_kwh')), dtype='<f4')
+    return hourly, row
+
+def load_profile_summary(hourly):
+    """Monthly totals and the average day, for display"""
+    days = np.asarray(DAYS_PER_MONTH)
+    by_day = np.asarray(hourly, dtype=np.float64).reshape(365, 24)
+    month_ends = np.cumsum(days)
+    monthly = np.add.reduceat(by_day.sum(axis=1), np.concatenate(([0], month_ends[:-1])))
+    return {
+        'monthly_kwh': monthly.round(1).tolist(),
+        'average_day_kwh': by_day.mean(axis=0).round(3).tolist(),
+        'peak_hour_kwh': round(float(by_day.max()), 3)
+    }
+
+def size_from_load_profile(hourly, county_name, property_type='residential'):
+    """Calculator estimate and hourly-simulation optimum for a measured profile"""
+    hourly = np.asarray(hourly, dtype=np.float64)
+    monthly_kwh = hourly.sum() / 12
+    estimate = estimate_quotes(np.array([monthly_kwh]), np.array([UNKNOWN_ROOF_SIZE]), np.array([property_type == 'residential']))
+    sizing = {
+        'monthlyUsage': round(float(monthly_kwh), 1),
+        'systemSize': round(float(estimate['systemSize'][0]), 2),
+        'panelCount': int(estimate['panelCount'][0]),
+        'systemCost': round(float(estimate['systemCost'][0]), 2),
+        'paybackPeriod': round(float(estimate['paybackPeriod'][0]), 1),
+        'simulation': None
+    }
+    county = county_slug(county_name)
+    if county in COUNTY_SITES:
+        residential_rate, commercial_rate, tariff = get_quote_rates()
+        sizing['simulation'] = dict(optimize_system(
+            get_irradiance(county), hourly, residential_rate if property_type == 'residential' else commercial_rate,
+            tariff, get_setting('battery_cost_per_kwh', BATTERY_COST_PER_KWH)), county=county)
+    return sizing
+
+def store_uploaded_load_data(user_id, file):
+    """Parse an uploaded meter/bill CSV and save it for the customer; flashes the outcome"""
+    if np is None:
+        flash('Load profiles need NumPy installed on the server', 'error')
+        return False
+    if not file or not file.filename:
+        flash('Choose a CSV file to upload', 'error')
+        return False
+    started = time.perf_counter()
+    try:
+        hourly, info = parse_load_data(io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline=''))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        flash(f'Could not read the file: {e}', 'error')
+        return False
+    connection = get_db_connection()
+    if not connection:
+        flash('Database connection failed', 'error')
+        return False
+    cursor = connection.cursor()
+    save_load_profile(cursor, user_id, hourly, info)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    flash(f"Load profile saved: {info['readings']:,} {'readings' if info['source'] == 'interval' else 'bills'}, "
+          f"{info['annual_kwh']:,.0f} kWh/year (parsed in {time.perf_counter() - started:.2f}s)", 'success')
+    return True
+
+@app.route('/admin/customers/<int:customer_id>/load-profile', methods=['GET', 'POST'])
+def admin_customer_load_profile(customer_id):
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        store_uploaded_load_data(customer_id, request.files.get('meter_data'))
+        return redirect(url_for('admin_customer_load_profile', customer_id=customer_id))
+    
+    customer = None
+    connection = get_db_connection()
+    if connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT id, username, first_name, last_name, email, city, state FROM users WHERE id = %s", (customer_id,))
+        customer = cursor.fetchone()
+        cursor.close()
+        connection.close()
+    if not customer:
+        flash('Customer not found', 'error')
+        return redirect(url_for('admin_customers'))
+    
+    profile = get_load_profile(customer_id)
+    summary = sizing = info = None
+    if profile:
+        hourly, info = profile
+        summary = load_profile_summary(hourly)
+        sizing = size_from_load_profile(hourly, customer['state'] or customer['city'])
+    return render_template('admin_load_profile.html', customer=customer, info=info, summary=summary, sizing=sizing)
+
+@app.route('/client/load-profile', methods=['POST'])
+def client_load_profile():
+    if 'user' not in session or session['user']['role'] != 'client':
+        return redirect(url_for('login'))
+    store_uploaded_load_data(session['user']['id'], request.files.get('meter_data'))
+    return redirect(url_for('client_dashboard'))
+
+@app.cli.command('import-meter-data')
+@click.argument('user_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_meter_data_command(user_id, path):
+    """Build a customer's load profile from an interval meter or bill CSV"""
+    started = time.perf_counter()
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        hourly, info = parse_load_data(f)
+    parsed = time.perf_counter() - started
+    connection = get_db_connection()
+    if not connection:
+        raise click.ClickException("Database connection failed")
+    cursor = connection.cursor()
+    save_load_profile(cursor, user_id, hourly, info)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    print(f"{info['source']}: {info['readings']:,} readings, {info['coverage']:.0%} of hours covered, "
+          f"{info['annual_kwh']:,.0f} kWh/year; parsed in {parsed * 1000:.0f} ms")
+
+IDEMPOTENCY_KEY = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+MYSQL_DUPLICATE_ENTRY = 1062
+
+# Clients created by the quote form or lead import get a username derived
+# from their email in a form people can't register (see reserved_username), so
+# the email-keyed upsert can never land on another account's username.
+CLIENT_USERNAME = re.compile(r'~[0-9a-f]{16}$')
+
+def client_username(email):
+    """Username for a client created without registering, e.g. wanjiku.k~3fa9c0d2e1b4a7c8"""
+    local = email.split('@')[0][:33]
+    return f"{local}~{hashlib.sha1(email.lower().encode()).hexdigest()[:16]}"
+
+def reserved_username(username):
+    """Whether a username is in the namespace client_username() generates"""
+    return bool(CLIENT_USERNAME.search(username or ''))
+
 @app.route('/submit_quote', methods=['POST'])
 def submit_quote():
     try:
@@ -424,6 +3381,9 @@ def submit_quote():
         city = request.form.get('city')
         state = request.form.get('state')
         zip_code = request.form.get('zipCode', '')
+        idempotency_key = request.form.get('idempotency_key', '')
+        if not IDEMPOTENCY_KEY.match(idempotency_key):
+            idempotency_key = None
         
         property_type = request.form.get('propertyType')
         roof_size = float(request.form.get('roofSize', 0))
@@ -433,38 +3393,57 @@ def submit_quote():
         estimated_savings = float(request.form.get('estimatedSavings', 0))
         panel_count = request.form.get('panelCount', '0')
         
-        connection = get_db_connection()
-        if connection:
-            cursor = connection.cursor()
-            
-            # Check if user already exists
-            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-            existing_user = cursor.fetchone()
-            
-            if existing_user:
-                customer_id = existing_user[0]
-                # Update user info if needed
-                cursor.execute("""
-                    UPDATE users SET phone = %s, address = %s, city = %s, state = %s, zip_code = %s
-                    WHERE id = %s
-                """, (phone, address, city, state, zip_code, customer_id))
-            else:
-                # Create new user with role 'client'
-                cursor.execute("""
-                    INSERT INTO users (username, email, phone, address, city, state, zip_code, role, first_name, last_name)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (name, email, phone, address, city, state, zip_code, 'client', name.split()[0] if name else '', name.split()[-1] if name and len(name.split()) > 1 else ''))
-                customer_id = cursor.lastrowid
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
             
-            # Insert quote
+            # Create the client or refresh their contact details in one statement.
+            # Only the email can clash (client_username is reserved), and
+            # LAST_INSERT_ID(id) makes lastrowid the existing row's id.
+            name_parts = name.split() if name else []
             cursor.execute("""
-                INSERT INTO quotes (customer_id, property_type, roof_size, energy_usage, 
-                                  system_size, estimated_cost, estimated_savings, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (customer_id, property_type, roof_size, monthly_usage, 
-                  system_size, estimated_cost, estimated_savings, 'pending'))
+                INSERT INTO users (username, password_hash, email, phone, address, city, state, zip_code, role, first_name, last_name)
+                VALUES (%s, '', %s, %s, %s, %s, %s, %s, 'client', %s, %s)
+                ON DUPLICATE KEY UPDATE
+                id = LAST_INSERT_ID(id),
+                phone = VALUES(phone), address = VALUES(address), city = VALUES(city),
+                state = VALUES(state), zip_code = VALUES(zip_code)
+            """, (client_username(email), email, phone, address, city, state, zip_code,
+                  name_parts[0] if name_parts else '', name_parts[-1] if len(name_parts) > 1 else ''))
+            customer_id = cursor.lastrowid
             
-            connection.commit()
+            # Insert quote; a form submitted twice carries the same key and hits the unique index
+            try:
+                cursor.execute("""
+                    INSERT INTO quotes (customer_id, property_type, roof_size, energy_usage, 
+                                      system_size, estimated_cost, estimated_savings, status, idempotency_key)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (customer_id, property_type, roof_size, monthly_usage, 
+                      system_size, estimated_cost, estimated_savings, 'pending', idempotency_key))
+                duplicate = False
+            except Error as e:
+                if e.errno != MYSQL_DUPLICATE_ENTRY:
+                    raise
+                duplicate = True
+            
+            if duplicate:
+                # Already recorded (and announced) by the first submission
+                connection.rollback()
+            else:
+                quote_id = cursor.lastrowid
+                apply_quote_rollup(cursor, quote_id, 1)
+                
+                if notifications_enabled():
+                    enqueue_notification(cursor, 'quote_submitted', f"New quote request #{quote_id} from {name}", (
+                        f"Name: {name}\nEmail: {email}\nPhone: {phone}\n"
+                        f"Location: {address}, {city}, {state} {zip_code}\n\n"
+                        f"Property: {property_type}\nMonthly usage: {monthly_usage} KSh\n"
+                        f"System size: {system_size} kW ({panel_count} panels)\n"
+                        f"Estimated cost: {estimated_cost:,.2f} KSh\nEstimated savings: {estimated_savings:,.2f} KSh\n"
+                    ))
+                
+                connection.commit()
+                wake_outbox_worker()
             cursor.close()
             connection.close()
             
@@ -505,6 +3484,7 @@ def contact():
 
 
 @app.route('/about')
+@cached_page('team')
 def about():
     # Fetch team members for dynamic display
     connection = get_db_connection()
@@ -519,6 +3499,7 @@ def about():
     return render_template('about.html', team_members=team_members)
 
 @app.route('/portfolio')
+@cached_page('portfolio', 'stats')
 def portfolio():
     connection = get_db_connection()
     portfolio_items = []
@@ -609,50 +3590,93 @@ def admin_dashboard():
     connection = get_db_connection()
     stats = {}
     recent_quotes = []
-    customers = []
+    recent_clients = []
     if connection:
         cursor = connection.cursor(dictionary=True)
         
-        # Get statistics
-        cursor.execute("SELECT COUNT(*) as count FROM users WHERE role = 'client'")
-        stats['customers'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM quotes WHERE status = 'pending'")
-        stats['quotes'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM installations")
-        stats['installations'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT SUM(estimated_cost) as total FROM quotes WHERE status = 'approved'")
+        # Get statistics in one pass of conditional aggregation
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users WHERE role = 'client') AS customers,
+                q.total_quotes, q.pending_quotes, q.revenue,
+                i.installations, i.completed_installations
+            FROM (
+                SELECT COUNT(*) AS total_quotes,
+                       COALESCE(SUM(q.status = 'pending'), 0) AS pending_quotes,
+                       COALESCE(SUM(CASE WHEN q.status = 'approved' THEN q.estimated_cost END), 0) AS revenue
+                FROM quotes q
+                JOIN users u ON q.customer_id = u.id
+                WHERE u.role = 'client'
+            ) q, (
+                SELECT COUNT(*) AS installations,
+                       COALESCE(SUM(status = 'completed'), 0) AS completed_installations
+                FROM installations
+            ) i
+        """)
         result = cursor.fetchone()
-        stats['revenue'] = result['total'] if result['total'] else 0
+        stats = {
+            'customers': int(result['customers']),
+            'total_quotes': int(result['total_quotes']),
+            'quotes': int(result['pending_quotes']),
+            'installations': int(result['installations']),
+            'completed_installations': int(result['completed_installations']),
+            'revenue': result['revenue']
+        }
         
-        # Get all lists for the dashboard calculations
+        # Recent activity only needs the newest few rows
         cursor.execute("""
-            SELECT q.*, u.first_name, u.last_name, u.email as customer_email
+            SELECT q.id, q.property_type, q.status, q.created_at, u.first_name, u.last_name, u.email as customer_email
             FROM quotes q 
-            LEFT JOIN users u ON q.customer_id = u.id 
+            JOIN users u ON q.customer_id = u.id 
             WHERE u.role = 'client'
             ORDER BY q.created_at DESC 
+            LIMIT 5
         """)
-        quotes = cursor.fetchall()
-        
-        cursor.execute("SELECT * FROM users WHERE role = 'client' ORDER BY created_at DESC")
-        clients = cursor.fetchall()
+        recent_quotes = cursor.fetchall()
         
         cursor.execute("""
-            SELECT i.*, u.first_name, u.last_name, q.property_type
-            FROM installations i
-            JOIN users u ON i.customer_id = u.id
-            JOIN quotes q ON i.quote_id = q.id
-            ORDER BY i.installation_date DESC
+            SELECT id, first_name, last_name, email, created_at
+            FROM users WHERE role = 'client'
+            ORDER BY created_at DESC
+            LIMIT 5
         """)
-        installations = cursor.fetchall()
+        recent_clients = cursor.fetchall()
         
         cursor.close()
         connection.close()
     
-    return render_template('admin_dashboard.html', stats=stats, quotes=quotes, clients=clients, installations=installations)
+    return render_template('admin_dashboard.html', stats=stats, recent_quotes=recent_quotes, recent_clients=recent_clients)
+
+@app.route('/admin/search')
+def admin_search():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    
+    search = request.args.get('q', '').strip()
+    scope = request.args.get('scope')
+    if scope not in SEARCH_SCOPES:
+        scope = None
+    page = min(max(request.args.get('page', 1, type=int), 1), SEARCH_MAX_PAGES)
+    
+    results = {}
+    has_more = {}
+    started = time.perf_counter()
+    if search:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor(dictionary=True)
+            # Without a scope, show the best few of each kind with links to page through them
+            for name in [scope] if scope else SEARCH_SCOPES:
+                results[name], has_more[name] = search_records(cursor, name, search, page if scope else 1,
+                                                               SEARCH_PAGE_SIZE if scope else 5)
+            cursor.close()
+            connection.close()
+        else:
+            flash('Database connection failed', 'error')
+    
+    return render_template('admin_search.html', search=search, scope=scope, page=page, results=results,
+                           has_more=has_more, indexable=bool(fulltext_query(search)), max_pages=SEARCH_MAX_PAGES,
+                           elapsed_ms=(time.perf_counter() - started) * 1000)
 
 @app.route('/admin/customers')
 def admin_customers():
@@ -661,14 +3685,24 @@ def admin_customers():
     
     connection = get_db_connection()
     customers = []
+    pagination = {}
+    total_customers = 0
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE role = 'client' ORDER BY created_at DESC")
-        customers = cursor.fetchall()
+        conditions = ["u.role = 'client'"]
+        params = []
+        search, search_params = search_condition(['u.first_name', 'u.last_name', 'u.email', 'u.phone', 'u.city'], fulltext=['users'])
+        if search:
+            conditions.append(search)
+            params += search_params
+        customers, pagination = fetch_keyset_page(cursor, "SELECT * FROM users u", 'u', conditions, params)
+        
+        cursor.execute("SELECT COUNT(*) as count FROM users WHERE role = 'client'")
+        total_customers = cursor.fetchone()['count']
         cursor.close()
         connection.close()
     
-    return render_template('admin_customers.html', customers=customers)
+    return render_template('admin_customers.html', customers=customers, pagination=pagination, total_customers=total_customers)
 
 @app.route('/admin/customers/add', methods=['GET', 'POST'])
 def admin_add_customer():
@@ -687,6 +3721,10 @@ def admin_add_customer():
         state = request.form.get('state')
         zip_code = request.form.get('zip_code')
         
+        if reserved_username(username):
+            flash('That username format is reserved for quote-form clients', 'error')
+            return redirect(url_for('admin_add_customer'))
+        
         # Check if username or email already exists
         connection = get_db_connection()
         if connection:
@@ -737,6 +3775,12 @@ def admin_edit_customer(customer_id):
             state = request.form.get('state')
             zip_code = request.form.get('zip_code')
             
+            if reserved_username(username) and username != customer['username']:
+                flash('That username format is reserved for quote-form clients', 'error')
+                cursor.close()
+                connection.close()
+                return redirect(url_for('admin_edit_customer', customer_id=customer_id))
+            
             cursor.execute("""
                 UPDATE users 
                 SET username = %s, email = %s, first_name = %s, last_name = %s, phone = %s, address = %s, city = %s, state = %s, zip_code = %s
@@ -778,20 +3822,38 @@ def admin_quotes():
     
     connection = get_db_connection()
     quotes = []
+    pagination = {}
+    quote_totals = {}
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
+        conditions = ["u.role = 'client'"]
+        params = []
+        status = request.args.get('status', '')
+        if status:
+            conditions.append("q.status = %s")
+            params.append(status)
+        search, search_params = search_condition(['u.first_name', 'u.last_name', 'u.email', 'u.phone', 'q.notes'], fulltext=['users', 'quotes'])
+        if search:
+            conditions.append(search)
+            params += search_params
+        quotes, pagination = fetch_keyset_page(cursor, """
             SELECT q.*, u.first_name, u.last_name, u.email, u.phone 
             FROM quotes q 
-            LEFT JOIN users u ON q.customer_id = u.id 
-            WHERE u.role = 'client'
-            ORDER BY q.created_at DESC
-        """)
-        quotes = cursor.fetchall()
+            JOIN users u ON q.customer_id = u.id
+        """, 'q', conditions, params)
+        quote_totals = get_quote_totals(cursor)
         cursor.close()
         connection.close()
     
-    return render_template('admin_quotes.html', quotes=quotes)
+    summary = {
+        'count': sum(row['count'] for row in quote_totals.values()),
+        'pending': quote_totals.get('pending', {}).get('count', 0),
+        'total_value': sum(row['total'] for row in quote_totals.values()),
+        'system_size': sum(row['system_size'] for row in quote_totals.values())
+    }
+    summary['average_system_size'] = summary['system_size'] / summary['count'] if summary['count'] else 0
+    
+    return render_template('admin_quotes.html', quotes=quotes, pagination=pagination, summary=summary)
 
 @app.route('/admin/quotes/approve/<int:quote_id>', methods=['POST'])
 def admin_approve_quote(quote_id):
@@ -801,7 +3863,9 @@ def admin_approve_quote(quote_id):
     connection = get_db_connection()
     if connection:
         cursor = connection.cursor()
+        apply_quote_rollup(cursor, quote_id, -1)
         cursor.execute("UPDATE quotes SET status = 'approved' WHERE id = %s", (quote_id,))
+        apply_quote_rollup(cursor, quote_id, 1)
         connection.commit()
         cursor.close()
         connection.close()
@@ -817,7 +3881,9 @@ def admin_reject_quote(quote_id):
     connection = get_db_connection()
     if connection:
         cursor = connection.cursor()
+        apply_quote_rollup(cursor, quote_id, -1)
         cursor.execute("UPDATE quotes SET status = 'rejected' WHERE id = %s", (quote_id,))
+        apply_quote_rollup(cursor, quote_id, 1)
         connection.commit()
         cursor.close()
         connection.close()
@@ -877,12 +3943,14 @@ def admin_edit_quote(quote_id):
             status = request.form.get('status')
             notes = request.form.get('notes')
             
+            apply_quote_rollup(cursor, quote_id, -1)
             cursor.execute("""
                 UPDATE quotes 
                 SET property_type = %s, roof_size = %s, energy_usage = %s, system_size = %s, 
                     estimated_cost = %s, estimated_savings = %s, status = %s, notes = %s
                 WHERE id = %s
             """, (property_type, roof_size, energy_usage, system_size, estimated_cost, estimated_savings, status, notes, quote_id))
+            apply_quote_rollup(cursor, quote_id, 1)
             connection.commit()
             flash('Quote updated successfully!', 'success')
             return redirect(url_for('admin_quotes'))
@@ -921,6 +3989,10 @@ def register_post():
         flash('Password must be at least 6 characters long', 'error')
         return redirect(url_for('register'))
     
+    if reserved_username(username):
+        flash('Please choose a different username', 'error')
+        return redirect(url_for('register'))
+    
     connection = get_db_connection()
     if connection:
         cursor = connection.cursor()
@@ -1112,14 +4184,24 @@ def admin_portfolio():
     
     connection = get_db_connection()
     portfolio_items = []
+    pagination = {}
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM portfolio ORDER BY created_at DESC")
-        portfolio_items = cursor.fetchall()
+        conditions = []
+        params = []
+        category = request.args.get('category', '')
+        if category:
+            conditions.append("p.category = %s")
+            params.append(category)
+        search, search_params = search_condition(['p.title', 'p.location', 'p.description'])
+        if search:
+            conditions.append(search)
+            params += search_params
+        portfolio_items, pagination = fetch_keyset_page(cursor, "SELECT * FROM portfolio p", 'p', conditions, params)
         cursor.close()
         connection.close()
     
-    return render_template('admin_portfolio.html', portfolio_items=portfolio_items)
+    return render_template('admin_portfolio.html', portfolio_items=portfolio_items, pagination=pagination)
 
 @app.route('/admin/portfolio/add', methods=['GET', 'POST'])
 def admin_add_portfolio():
@@ -1139,8 +4221,7 @@ def admin_add_portfolio():
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename:
-                filename = f"portfolio_{int(time.time())}_{file.filename}"
-                file.save(os.path.join('static/uploads', filename))
+                filename = save_upload(file)
                 image_url = f"/static/uploads/{filename}"
             else:
                 image_url = "/static/uploads/placeholder.jpg"
@@ -1155,6 +4236,7 @@ def admin_add_portfolio():
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """, (title, description, image_url, category, location, system_size, installation_date, is_featured))
             connection.commit()
+            invalidate_page_cache('portfolio')
             cursor.close()
             connection.close()
             flash('Portfolio item added successfully!', 'success')
@@ -1188,8 +4270,7 @@ def admin_edit_portfolio(item_id):
             if 'image' in request.files:
                 file = request.files['image']
                 if file and file.filename:
-                    filename = f"portfolio_{int(time.time())}_{file.filename}"
-                    file.save(os.path.join('static/uploads', filename))
+                    filename = save_upload(file)
                     image_url = f"/static/uploads/{filename}"
             
             cursor.execute("""
@@ -1198,6 +4279,7 @@ def admin_edit_portfolio(item_id):
                 WHERE id = %s
             """, (title, description, image_url, category, location, system_size, installation_date, is_featured, item_id))
             connection.commit()
+            invalidate_page_cache('portfolio')
             flash('Portfolio item updated successfully!', 'success')
             return redirect(url_for('admin_portfolio'))
         
@@ -1220,6 +4302,7 @@ def admin_delete_portfolio(item_id):
         cursor = connection.cursor()
         cursor.execute("DELETE FROM portfolio WHERE id = %s", (item_id,))
         connection.commit()
+        invalidate_page_cache('portfolio')
         cursor.close()
         connection.close()
         flash('Portfolio item deleted successfully!', 'success')
@@ -1253,14 +4336,28 @@ def admin_products():
     
     connection = get_db_connection()
     products = []
+    pagination = {}
+    total_products = 0
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM products ORDER BY category, name")
-        products = cursor.fetchall()
+        conditions = []
+        params = []
+        category = request.args.get('category', '')
+        if category:
+            conditions.append("p.category = %s")
+            params.append(category)
+        search, search_params = search_condition(['p.name', 'p.manufacturer', 'p.description'], fulltext=['products'])
+        if search:
+            conditions.append(search)
+            params += search_params
+        products, pagination = fetch_keyset_page(cursor, "SELECT * FROM products p", 'p', conditions, params)
+        
+        cursor.execute("SELECT COUNT(*) as count FROM products")
+        total_products = cursor.fetchone()['count']
         cursor.close()
         connection.close()
     
-    return render_template('admin_products.html', products=products)
+    return render_template('admin_products.html', products=products, pagination=pagination, total_products=total_products)
 
 @app.route('/admin/products/add', methods=['GET', 'POST'])
 def admin_add_product():
@@ -1282,8 +4379,7 @@ def admin_add_product():
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename:
-                filename = f"product_{int(time.time())}_{file.filename}"
-                file.save(os.path.join('static/uploads', filename))
+                filename = save_upload(file)
                 image_url = f"/static/uploads/{filename}"
         
         connection = get_db_connection()
@@ -1294,6 +4390,7 @@ def admin_add_product():
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (name, description, category, price, wattage, efficiency, warranty_years, manufacturer, image_url))
             connection.commit()
+            invalidate_page_cache('products')
             cursor.close()
             connection.close()
             flash('Product added successfully!', 'success')
@@ -1311,6 +4408,7 @@ def admin_delete_product(product_id):
         cursor = connection.cursor()
         cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
         connection.commit()
+        invalidate_page_cache('products')
         cursor.close()
         connection.close()
         flash('Product deleted successfully!', 'success')
@@ -1325,53 +4423,168 @@ def admin_installations():
     
     connection = get_db_connection()
     installations = []
+    pagination = {}
+    total_installations = 0
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
+        conditions = ["u.role = 'client'"]
+        params = []
+        status = request.args.get('status', '')
+        if status:
+            conditions.append("i.status = %s")
+            params.append(status)
+        search, search_params = search_condition(['u.first_name', 'u.last_name', 'u.email', 'i.technician'])
+        if search:
+            conditions.append(search)
+            params += search_params
+        installations, pagination = fetch_keyset_page(cursor, """
             SELECT i.*, u.first_name, u.last_name, u.email, u.phone, q.system_size as quote_system_size
             FROM installations i 
-            LEFT JOIN users u ON i.customer_id = u.id 
+            JOIN users u ON i.customer_id = u.id 
             LEFT JOIN quotes q ON i.quote_id = q.id
-            WHERE u.role = 'client'
-            ORDER BY i.created_at DESC
-        """)
-        installations = cursor.fetchall()
+        """, 'i', conditions, params)
+        total_installations = sum(row['count'] for row in get_installation_totals(cursor).values())
         cursor.close()
         connection.close()
     
-    return render_template('admin_installations.html', installations=installations)
+    return render_template('admin_installations.html', installations=installations, pagination=pagination, total_installations=total_installations)
+
+# Typeahead lookups for the installation forms: a few prefix matches on
+# indexed columns instead of rendering every client and quote into <select>s
+LOOKUP_LIMIT = 10
+LOOKUP_MAX_LIMIT = 25
+LOOKUP_MIN_CHARS = 2
+LOOKUP_MAX_QUOTE_ID_DIGITS = 9
+
+def like_prefix(text):
+    """LIKE pattern matching values that start with text, wildcards escaped"""
+    return re.sub(r'([\\%_])', r'\\\1', text) + '%'
+
+def customer_label(row):
+    """How a client is shown in pickers: name and email, or just the email"""
+    if row.get('first_name') and row.get('last_name'):
+        return f"{row['first_name']} {row['last_name']} ({row['email']})"
+    return row['email']
+
+def quote_label(row):
+    """How an approved quote is shown in pickers"""
+    who = f"{row['first_name']} {row['last_name']}" if row.get('first_name') and row.get('last_name') else row.get('email')
+    return f"Quote #{row['id']} - {who} ({row['system_size']}kW - KSh {float(row['estimated_cost'] or 0):,.0f})"
+
+def lookup_limit():
+    """?limit= clamped to LOOKUP_MAX_LIMIT"""
+    return min(max(request.args.get('limit', LOOKUP_LIMIT, type=int), 1), LOOKUP_MAX_LIMIT)
+
+def lookup_customers(cursor, text, limit):
+    """Clients whose first name, last name, email or phone starts with text.
+
+    Each branch is a range scan on its own index; "first last" narrows the
+    first-name scan by last name.
+    """
+    columns = "id, first_name, last_name, email, phone"
+    words = text.split()
+    branches = []
+    params = []
+    if len(words) > 1:
+        branches.append("first_name LIKE %s AND last_name LIKE %s ORDER BY first_name, last_name")
+        params += [like_prefix(words[0]), like_prefix(' '.join(words[1:]))]
+    else:
+        prefix = like_prefix(text)
+        for column in ('first_name', 'last_name', 'email', 'phone'):
+            branches.append(f"{column} LIKE %s ORDER BY {column}")
+            params.append(prefix)
+    union = ' UNION '.join(f"(SELECT {columns} FROM users WHERE role = 'client' AND {branch} LIMIT {limit})" for branch in branches)
+    cursor.execute(f"{union} ORDER BY first_name, last_name, email LIMIT {limit}", params)
+    return cursor.fetchall()
+
+def lookup_approved_quotes(cursor, customer_ids=None, quote_id=None, limit=LOOKUP_LIMIT):
+    """Approved quotes, newest first, for the given customers or quote id (or the latest overall)"""
+    conditions = ["q.status = 'approved'"]
+    params = []
+    if quote_id is not None:
+        conditions.append("q.id = %s")
+        params.append(quote_id)
+    elif customer_ids is not None:
+        if not customer_ids:
+            return []
+        conditions.append(f"q.customer_id IN ({', '.join(['%s'] * len(customer_ids))})")
+        params += customer_ids
+    cursor.execute(f"""
+        SELECT q.id, q.customer_id, q.system_size, q.estimated_cost, u.first_name, u.last_name, u.email
+        FROM quotes q
+        JOIN users u ON q.customer_id = u.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY q.created_at DESC, q.id DESC
+        LIMIT %s
+    """, (*params, limit))
+    return cursor.fetchall()
+
+@app.route('/admin/lookup/customers')
+def admin_lookup_customers():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    text = request.args.get('q', '').strip()
+    if len(text) < LOOKUP_MIN_CHARS:
+        return jsonify({'results': []})
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 503
+    cursor = connection.cursor(dictionary=True)
+    rows = lookup_customers(cursor, text, lookup_limit())
+    cursor.close()
+    connection.close()
+    return jsonify({'results': [{'id': row['id'], 'label': customer_label(row), 'phone': row['phone']} for row in rows]})
+
+@app.route('/admin/lookup/quotes')
+def admin_lookup_quotes():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    text = request.args.get('q', '').strip()
+    customer_id = request.args.get('customer_id', type=int)
+    limit = lookup_limit()
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 503
+    cursor = connection.cursor(dictionary=True)
+    if text.startswith('#') and text[1:].isdigit():
+        rows = lookup_approved_quotes(cursor, quote_id=int(text[1:]), limit=limit)
+    elif len(text) >= LOOKUP_MIN_CHARS or (text.isdigit() and text[0] != '0'):
+        rows = []
+        # Plain digits may be a quote number or the start of a phone number:
+        # the quote comes first, then quotes of customers with that phone
+        if text.isdigit() and text[0] != '0' and len(text) <= LOOKUP_MAX_QUOTE_ID_DIGITS:
+            rows = lookup_approved_quotes(cursor, quote_id=int(text), limit=limit)
+        if len(text) >= LOOKUP_MIN_CHARS:
+            # Name/email/phone text finds the customers first, then their quotes
+            customers = lookup_customers(cursor, text, LOOKUP_MAX_LIMIT)
+            rows += [row for row in lookup_approved_quotes(cursor, customer_ids=[row['id'] for row in customers], limit=limit)
+                     if row['id'] not in {quote['id'] for quote in rows}]
+            rows = rows[:limit]
+    elif customer_id:
+        rows = lookup_approved_quotes(cursor, customer_ids=[customer_id], limit=limit)
+    else:
+        rows = lookup_approved_quotes(cursor, limit=limit)
+    cursor.close()
+    connection.close()
+    return jsonify({'results': [{
+        'id': row['id'],
+        'label': quote_label(row),
+        'customer_id': row['customer_id'],
+        'customer_label': customer_label(row),
+        'system_size': float(row['system_size'] or 0),
+        'estimated_cost': float(row['estimated_cost'] or 0)
+    } for row in rows]})
 
 @app.route('/admin/installations/add', methods=['GET', 'POST'])
 def admin_add_installation():
     if 'user' not in session or session['user']['role'] != 'admin':
         return redirect(url_for('login'))
     
-    connection = get_db_connection()
-    quotes = []
-    users = []
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get pending quotes for selection
-        cursor.execute("""
-            SELECT q.*, u.first_name, u.last_name, u.email
-            FROM quotes q 
-            LEFT JOIN users u ON q.customer_id = u.id 
-            WHERE q.status = 'approved' AND u.role = 'client'
-            ORDER BY q.created_at DESC
-        """)
-        quotes = cursor.fetchall()
-        
-        # Get client users
-        cursor.execute("SELECT * FROM users WHERE role = 'client' ORDER BY first_name, last_name")
-        users = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
-    
     if request.method == 'POST':
         customer_id = request.form.get('customer_id')
-        quote_id = request.form.get('quote_id')
+        quote_id = request.form.get('quote_id') or None
         installation_date = request.form.get('installation_date')
         system_size = request.form.get('system_size')
         total_cost = request.form.get('total_cost')
@@ -1386,13 +4599,15 @@ def admin_add_installation():
                 INSERT INTO installations (customer_id, quote_id, installation_date, system_size, total_cost, status, technician, notes)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """, (customer_id, quote_id, installation_date, system_size, total_cost, status, technician, notes))
+            apply_installation_rollup(cursor, cursor.lastrowid, 1)
             connection.commit()
+            invalidate_page_cache('stats')
             cursor.close()
             connection.close()
             flash('Installation scheduled successfully!', 'success')
             return redirect(url_for('admin_installations'))
     
-    return render_template('admin_add_installation.html', quotes=quotes, users=users)
+    return render_template('admin_add_installation.html')
 
 @app.route('/admin/installations/edit/<int:installation_id>', methods=['GET', 'POST'])
 def admin_edit_installation(installation_id):
@@ -1401,29 +4616,29 @@ def admin_edit_installation(installation_id):
     
     connection = get_db_connection()
     installation = None
-    quotes = []
-    users = []
+    customer = None
+    quote = None
     if connection:
         cursor = connection.cursor(dictionary=True)
         cursor.execute("SELECT * FROM installations WHERE id = %s", (installation_id,))
         installation = cursor.fetchone()
         
-        # Get quotes and users for dropdowns
-        cursor.execute("""
-            SELECT q.*, u.first_name, u.last_name, u.email
-            FROM quotes q 
-            LEFT JOIN users u ON q.customer_id = u.id 
-            WHERE q.status = 'approved' AND u.role = 'client'
-            ORDER BY q.created_at DESC
-        """)
-        quotes = cursor.fetchall()
-        
-        cursor.execute("SELECT * FROM users WHERE role = 'client' ORDER BY first_name, last_name")
-        users = cursor.fetchall()
+        # Only the current selections; the pickers look up anything else as the admin types
+        if installation and installation['customer_id']:
+            cursor.execute("SELECT id, first_name, last_name, email FROM users WHERE id = %s", (installation['customer_id'],))
+            customer = cursor.fetchone()
+        if installation and installation['quote_id']:
+            cursor.execute("""
+                SELECT q.id, q.system_size, q.estimated_cost, u.first_name, u.last_name, u.email
+                FROM quotes q
+                LEFT JOIN users u ON q.customer_id = u.id
+                WHERE q.id = %s
+            """, (installation['quote_id'],))
+            quote = cursor.fetchone()
         
         if request.method == 'POST':
             customer_id = request.form.get('customer_id')
-            quote_id = request.form.get('quote_id')
+            quote_id = request.form.get('quote_id') or None
             installation_date = request.form.get('installation_date')
             system_size = request.form.get('system_size')
             total_cost = request.form.get('total_cost')
@@ -1431,12 +4646,15 @@ def admin_edit_installation(installation_id):
             technician = request.form.get('technician')
             notes = request.form.get('notes')
             
+            apply_installation_rollup(cursor, installation_id, -1)
             cursor.execute("""
                 UPDATE installations 
                 SET customer_id = %s, quote_id = %s, installation_date = %s, system_size = %s, total_cost = %s, status = %s, technician = %s, notes = %s
                 WHERE id = %s
             """, (customer_id, quote_id, installation_date, system_size, total_cost, status, technician, notes, installation_id))
+            apply_installation_rollup(cursor, installation_id, 1)
             connection.commit()
+            invalidate_page_cache('stats')
             flash('Installation updated successfully!', 'success')
             return redirect(url_for('admin_installations'))
         
@@ -1447,7 +4665,9 @@ def admin_edit_installation(installation_id):
         flash('Installation not found!', 'error')
         return redirect(url_for('admin_installations'))
     
-    return render_template('admin_edit_installation.html', installation=installation, quotes=quotes, users=users)
+    return render_template('admin_edit_installation.html', installation=installation,
+                           customer_label=customer_label(customer) if customer else '',
+                           quote_label=quote_label(quote) if quote else '')
 
 @app.route('/admin/installations/delete/<int:installation_id>', methods=['POST'])
 def admin_delete_installation(installation_id):
@@ -1457,8 +4677,10 @@ def admin_delete_installation(installation_id):
     connection = get_db_connection()
     if connection:
         cursor = connection.cursor()
+        apply_installation_rollup(cursor, installation_id, -1)
         cursor.execute("DELETE FROM installations WHERE id = %s", (installation_id,))
         connection.commit()
+        invalidate_page_cache('stats')
         cursor.close()
         connection.close()
         flash('Installation deleted successfully!', 'success')
@@ -1476,55 +4698,43 @@ def admin_analytics():
     if connection:
         cursor = connection.cursor(dictionary=True)
         
-        # Get various analytics data
-        cursor.execute("SELECT COUNT(*) as count FROM users WHERE role = 'client'")
-        analytics['total_clients'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM quotes")
-        analytics['total_quotes'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM quotes WHERE status = 'pending'")
-        analytics['pending_quotes'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM quotes WHERE status = 'approved'")
-        analytics['approved_quotes'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM installations")
-        analytics['total_installations'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM installations WHERE status = 'completed'")
-        analytics['completed_installations'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM installations WHERE status = 'scheduled'")
-        analytics['scheduled_installations'] = cursor.fetchone()['count']
+        # Counts that are not rolled up
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM users WHERE role = 'client') AS total_clients,
+                   (SELECT COUNT(*) FROM portfolio) AS portfolio_items
+        """)
+        analytics.update(cursor.fetchone())
         
-        cursor.execute("SELECT COUNT(*) as count FROM portfolio")
-        analytics['portfolio_items'] = cursor.fetchone()['count']
+        # Quote and installation totals from the daily rollups
+        quote_totals = get_quote_totals(cursor)
+        installation_totals = get_installation_totals(cursor)
+        empty = {'count': 0, 'total': 0}
         
-        # Revenue analytics
-        cursor.execute("SELECT SUM(total_cost) as revenue FROM installations WHERE status = 'completed'")
-        revenue = cursor.fetchone()['revenue']
-        analytics['total_revenue'] = revenue if revenue else 0
+        analytics['total_quotes'] = sum(row['count'] for row in quote_totals.values())
+        analytics['pending_quotes'] = quote_totals.get('pending', empty)['count']
+        analytics['approved_quotes'] = quote_totals.get('approved', empty)['count']
+        analytics['potential_revenue'] = quote_totals.get('approved', empty)['total']
         
-        cursor.execute("SELECT SUM(estimated_cost) as potential FROM quotes WHERE status = 'approved'")
-        potential = cursor.fetchone()['potential']
-        analytics['potential_revenue'] = potential if potential else 0
+        analytics['total_installations'] = sum(row['count'] for row in installation_totals.values())
+        analytics['completed_installations'] = installation_totals.get('completed', empty)['count']
+        analytics['scheduled_installations'] = installation_totals.get('scheduled', empty)['count']
+        analytics['total_revenue'] = installation_totals.get('completed', empty)['total']
         
         # Monthly stats
         cursor.execute("""
-            SELECT DATE_FORMAT(created_at, '%Y-%m') as month, COUNT(*) as count 
-            FROM quotes 
-            WHERE created_at >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            GROUP BY DATE_FORMAT(created_at, '%Y-%m')
+            SELECT DATE_FORMAT(stat_date, '%Y-%m') as month, CAST(SUM(quote_count) AS SIGNED) as count 
+            FROM daily_quote_stats 
+            WHERE stat_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
+            GROUP BY DATE_FORMAT(stat_date, '%Y-%m')
             ORDER BY month DESC
         """)
         analytics['monthly_quotes'] = cursor.fetchall()
         
         cursor.execute("""
-            SELECT DATE_FORMAT(installation_date, '%Y-%m') as month, COUNT(*) as count 
-            FROM installations 
-            WHERE installation_date >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            GROUP BY DATE_FORMAT(installation_date, '%Y-%m')
+            SELECT DATE_FORMAT(stat_date, '%Y-%m') as month, CAST(SUM(installation_count) AS SIGNED) as count 
+            FROM daily_installation_stats 
+            WHERE stat_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
+            GROUP BY DATE_FORMAT(stat_date, '%Y-%m')
             ORDER BY month DESC
         """)
         analytics['monthly_installations'] = cursor.fetchall()
@@ -1568,11 +4778,7 @@ def admin_add_team_member():
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename != '':
-                filename = secure_filename(file.filename)
-                timestamp = int(datetime.now().timestamp())
-                filename = f"team_{timestamp}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image_url = filename
+                image_url = save_upload(file)
         
         connection = get_db_connection()
         if connection:
@@ -1582,6 +4788,7 @@ def admin_add_team_member():
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (name, role, bio, image_url, bg_color, display_order))
             connection.commit()
+            invalidate_page_cache('team')
             cursor.close()
             connection.close()
             flash('Team member added successfully!', 'success')
@@ -1615,12 +4822,8 @@ def admin_edit_team_member(member_id):
             if 'image' in request.files:
                 file = request.files['image']
                 if file and file.filename != '':
-                    filename = secure_filename(file.filename)
-                    timestamp = int(datetime.now().timestamp())
-                    filename = f"team_{timestamp}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
                     image_update_sql = ", image_url = %s"
-                    params.append(filename)
+                    params.append(save_upload(file))
             
             params.append(member_id)
             
@@ -1631,6 +4834,7 @@ def admin_edit_team_member(member_id):
             """, tuple(params))
             
             connection.commit()
+            invalidate_page_cache('team')
             cursor.close()
             connection.close()
             flash('Team member updated successfully!', 'success')
@@ -1657,6 +4861,7 @@ def admin_delete_team_member(member_id):
         cursor = connection.cursor()
         cursor.execute("DELETE FROM team_members WHERE id = %s", (member_id,))
         connection.commit()
+        invalidate_page_cache('team')
         cursor.close()
         connection.close()
         flash('Team member deleted successfully!', 'success')
@@ -1703,14 +4908,20 @@ def admin_settings():
                 return redirect(url_for('admin_settings'))
             
             # Save settings
-            set_setting('email_notifications', email_notifications, 'boolean', 'Send email alerts for new quotes')
-            set_setting('company_name', company_name, 'string', 'Company name displayed on the website')
-            set_setting('default_currency', default_currency, 'string', 'Default currency for pricing')
-            set_setting('session_timeout', session_timeout, 'number', 'Session timeout in minutes')
-            set_setting('max_login_attempts', max_login_attempts, 'number', 'Maximum login attempts before lockout')
-            set_setting('cost_per_watt_residential', cost_per_watt_residential, 'number', 'Cost per watt for residential installations (KSh)')
-            set_setting('cost_per_watt_commercial', cost_per_watt_commercial, 'number', 'Cost per watt for commercial installations (KSh)')
-            set_setting('savings_per_kwh', savings_per_kwh, 'number', 'Savings per kWh generated (KSh)')
+            saved = set_settings([
+                ('email_notifications', email_notifications, 'boolean', 'Send email alerts for new quotes'),
+                ('company_name', company_name, 'string', 'Company name displayed on the website'),
+                ('default_currency', default_currency, 'string', 'Default currency for pricing'),
+                ('session_timeout', session_timeout, 'number', 'Session timeout in minutes'),
+                ('max_login_attempts', max_login_attempts, 'number', 'Maximum login attempts before lockout'),
+                ('cost_per_watt_residential', cost_per_watt_residential, 'number', 'Cost per watt for residential installations (KSh)'),
+                ('cost_per_watt_commercial', cost_per_watt_commercial, 'number', 'Cost per watt for commercial installations (KSh)'),
+                ('savings_per_kwh', savings_per_kwh, 'number', 'Savings per kWh generated (KSh)')
+            ])
+            if not saved:
+                flash('An error occurred while saving settings.', 'error')
+                return redirect(url_for('admin_settings'))
+            invalidate_page_cache('settings')
             
             flash('Settings saved successfully!', 'success')
             return redirect(url_for('admin_settings'))
@@ -1726,14 +4937,865 @@ def admin_settings():
     settings = get_all_settings()
     return render_template('admin_settings.html', settings=settings)
 
+@app.route('/admin/health')
+def admin_health():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    
+    database_ok = False
+    connection = get_db_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            database_ok = True
+        except Error as e:
+            print(f"Health check query failed: {e}")
+        connection.close()
+    
+    return jsonify({
+        'status': 'ok' if database_ok else 'degraded',
+        'database': database_ok,
+        'pool': get_pool_stats(),
+        'outbox': get_outbox_stats() if database_ok else None,
+        'telemetry': get_telemetry_stats()
+    }), 200 if database_ok else 503
+
+# Per-endpoint request metrics, kept in this process and exported in the
+# Prometheus text format. Each request adds one observation to each
+# histogram under a single lock; bucket counts are stored per bucket and
+# made cumulative when exported.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+METRIC_HISTOGRAMS = {
+    'veeteq_request_duration_seconds': ('Time from request start to response ready', LATENCY_BUCKETS),
+    'veeteq_request_db_queries': ('Database statements executed per request', QUERY_COUNT_BUCKETS),
+    'veeteq_request_db_seconds': ('Time spent executing database statements per request', LATENCY_BUCKETS),
+    'veeteq_response_size_bytes': ('Response body size as sent, after compression', SIZE_BUCKETS),
+    'veeteq_template_render_seconds': ('Time spent rendering templates per request that renders one', LATENCY_BUCKETS)
+}
+
+_metrics_lock = threading.Lock()
+_request_counts = {}
+_histograms = {name: {} for name in METRIC_HISTOGRAMS}
+
+def record_query(operation, params, elapsed):
+    """Count a statement against the current request and log it if it was slow"""
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        note_slow_query(operation, params, elapsed)
+
+def observe(name, labels, value):
+    """Add one observation to a histogram; the caller holds _metrics_lock"""
+    buckets = METRIC_HISTOGRAMS[name][1]
+    counts = _histograms[name].get(labels)
+    if counts is None:
+        # One count per bucket, one for +Inf, then the running sum
+        counts = _histograms[name][labels] = [0] * (len(buckets) + 1) + [0.0]
+    counts[bisect.bisect_left(buckets, value)] += 1
+    counts[-1] += value
+
+def metrics_labels():
+    """(endpoint, method) for the current request; unmatched URLs share one label"""
+    return (request.endpoint or 'unmatched', request.method)
+
+@request_started.connect_via(app)
+def start_request_metrics(sender, **extra):
+    g.metrics_started = time.perf_counter()
+
+@before_render_template.connect_via(app)
+def start_render_metrics(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def finish_render_metrics(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        g.render_time = g.get('render_time', 0.0) + time.perf_counter() - started
+
+@request_finished.connect_via(app)
+def finish_request_metrics(sender, response, **extra):
+    started = g.get('metrics_started')
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    labels = metrics_labels()
+    # Streamed bodies have no length until they have been sent, and measuring
+    # one here would buffer it; files and rendered pages carry Content-Length
+    size = response.content_length
+    if size is None and response.is_sequence:
+        size = response.calculate_content_length()
+    with _metrics_lock:
+        key = labels + (str(response.status_code),)
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+        observe('veeteq_request_duration_seconds', labels, elapsed)
+        observe('veeteq_request_db_queries', labels, g.get('db_queries', 0))
+        observe('veeteq_request_db_seconds', labels, g.get('db_time', 0.0))
+        if size is not None:
+            observe('veeteq_response_size_bytes', labels, size)
+        if 'render_time' in g:
+            observe('veeteq_template_render_seconds', labels, g.render_time)
+
+def prometheus_labels(names, values):
+    """{name="value",...} with Prometheus escaping"""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+def format_bucket(bound):
+    """Bucket bound as Prometheus writes it"""
+    return str(bound) if isinstance(bound, int) else repr(float(bound))
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    with _metrics_lock:
+        request_counts = dict(_request_counts)
+        histograms = {name: {labels: list(counts) for labels, counts in series.items()} for name, series in _histograms.items()}
+    
+    lines = ['# HELP veeteq_requests_total Requests handled, by endpoint, method and status',
+             '# TYPE veeteq_requests_total counter']
+    for labels, count in sorted(request_counts.items()):
+        lines.append(f"veeteq_requests_total{prometheus_labels(('endpoint', 'method', 'status'), labels)} {count}")
+    
+    for name, (description, buckets) in METRIC_HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for labels, counts in sorted(histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), counts[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_bucket(bound)
+                lines.append(f"{name}_bucket{prometheus_labels(('endpoint', 'method', 'le'), labels + (le,))} {cumulative}")
+            series = prometheus_labels(('endpoint', 'method'), labels)
+            lines.append(f"{name}_sum{series} {counts[-1]:.6f}")
+            lines.append(f"{name}_count{series} {cumulative}")
+    
+    pool = get_pool_stats()
+    for key in ('in_use', 'available', 'peak_in_use'):
+        lines += [f'# TYPE veeteq_db_pool_{key} gauge', f'veeteq_db_pool_{key} {pool[key]}']
+    for key in ('checkouts', 'waits', 'timeouts', 'errors', 'leaks'):
+        lines += [f'# TYPE veeteq_db_pool_{key}_total counter', f'veeteq_db_pool_{key}_total {pool[key]}']
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics')
+def metrics():
+    # Scrapers authenticate with METRICS_TOKEN; people with an admin session
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization.encode(), f'Bearer {METRICS_TOKEN}'.encode())
+    if not token_ok and ('user' not in session or session['user']['role'] != 'admin'):
+        # A scraper needs an auth failure it can report, not the HTML login page
+        if authorization or 'user' not in session:
+            return app.response_class('Unauthorized\n', status=401, mimetype='text/plain',
+                                      headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+        return redirect(url_for('login'))
+    return app.response_class(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Slow-query log. Statements over SLOW_QUERY_MS are normalised and queued
+# from the cursor wrapper; a background thread EXPLAINs them on its own
+# connection (once per statement shape every SLOW_QUERY_EXPLAIN_TTL
+# seconds), keeps the latest in a ring buffer and appends them to a rotating
+# JSON Lines file. Parameter values are never stored, only their types.
+# Rotation isn't safe across processes, so each worker process writes its
+# own file (logs/slow_queries.<pid>.jsonl) and the admin page reads them all.
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'logs/slow_queries.jsonl')
+SLOW_QUERY_LOG_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_LOG_RETENTION_DAYS = 7
+SLOW_QUERY_BUFFER = 500
+SLOW_QUERY_QUEUE = 200
+SLOW_QUERY_EXPLAIN_TTL = 600
+SLOW_QUERY_TOP = 25
+EXPLAINABLE_SQL = re.compile(r'^\s*(SELECT|UPDATE|DELETE|REPLACE|INSERT\s+.*\bSELECT)\b', re.I | re.S)
+SQL_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b|%s")
+SQL_VALUE_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*')
+
+_slow_queries = deque(maxlen=SLOW_QUERY_BUFFER)
+_slow_query_lock = threading.Lock()
+_slow_query_queue = queue.Queue(maxsize=SLOW_QUERY_QUEUE)
+_slow_query_plans = {}
+_slow_query_worker = None
+_slow_query_logger = None
+_slow_query_connection = None
+
+def normalize_sql(sql):
+    """Statement shape: literals and placeholders become ?, value lists collapse, whitespace is squeezed"""
+    sql = SQL_LITERALS.sub('?', ' '.join(sql.split()))
+    return SQL_VALUE_LISTS.sub('(...)', sql)
+
+def params_shape(params):
+    """Types of the parameters (and row count for executemany), never their values"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    params = list(params)
+    if params and isinstance(params[0], (list, tuple, dict)):
+        return {'rows': len(params), 'row': params_shape(params[0])}
+    return [type(value).__name__ for value in params]
+
+def query_origin():
+    """Route (or CLI command / thread) that issued the current statement"""
+    if has_request_context():
+        return f"{request.method} {request.endpoint or request.path}"
+    context = click.get_current_context(silent=True)
+    if context is not None:
+        return f"cli {context.info_name}"
+    return threading.current_thread().name
+
+def note_slow_query(operation, params, elapsed):
+    """Hand a slow statement to the slow-query worker; never blocks the caller"""
+    if isinstance(operation, bytes):
+        operation = operation.decode('utf-8', 'replace')
+    sql = normalize_sql(operation)
+    entry = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'fingerprint': hashlib.sha1(sql.encode()).hexdigest()[:12],
+        'ms': round(elapsed * 1000, 2),
+        'sql': sql,
+        'params': params_shape(params),
+        'route': query_origin()
+    }
+    # The worker needs the real parameters to EXPLAIN; they stay in memory only
+    explain = (operation, params) if EXPLAINABLE_SQL.match(operation) and not isinstance(params_shape(params), dict) else None
+    try:
+        _slow_query_queue.put_nowait((entry, explain))
+    except queue.Full:
+        return
+    ensure_slow_query_worker()
+
+def explain_connection():
+    """The slow-query worker's own connection, outside the pool.
+
+    Slow queries cluster when the pool is already saturated, so EXPLAINs
+    must not compete with requests for a slot.
+    """
+    global _slow_query_connection
+    if _slow_query_connection is None or not _slow_query_connection.is_connected():
+        try:
+            _slow_query_connection = mysql.connector.connect(connection_timeout=DB_POOL_TIMEOUT, **DB_CONFIG)
+        except Error as e:
+            print(f"Slow query log could not connect for EXPLAIN: {e}")
+            _slow_query_connection = None
+    return _slow_query_connection
+
+def explain_statement(operation, params):
+    """EXPLAIN rows for a statement, or None and an error string"""
+    connection = explain_connection()
+    if connection is None:
+        return None, None
+    # Not an InstrumentedCursor, so the EXPLAIN isn't itself timed and logged
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"EXPLAIN {operation}", params)
+        return cursor.fetchall(), None
+    except Error as e:
+        return None, str(e)
+    finally:
+        cursor.close()
+
+def slow_query_log_path(pid='*'):
+    """This process's slow-query log (or, with the default, a glob matching every process's)"""
+    root, ext = os.path.splitext(SLOW_QUERY_LOG)
+    return f"{root}.{pid}{ext or '.jsonl'}"
+
+def prune_slow_query_logs():
+    """Delete logs (and rotations) that no process has written to for SLOW_QUERY_LOG_RETENTION_DAYS"""
+    cutoff = time.time() - SLOW_QUERY_LOG_RETENTION_DAYS * 86400
+    pattern = slow_query_log_path()
+    for path in glob.glob(pattern) + glob.glob(pattern + '.*'):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+def slow_query_logger():
+    """JSON Lines logger writing to this process's slow-query log with size-based rotation"""
+    global _slow_query_logger
+    # A logger inherited across fork() would write to the parent's file
+    if _slow_query_logger is None or _slow_query_logger[0] != os.getpid():
+        pid = os.getpid()
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or '.', exist_ok=True)
+        prune_slow_query_logs()
+        handler = logging.handlers.RotatingFileHandler(slow_query_log_path(pid), maxBytes=SLOW_QUERY_LOG_BYTES,
+                                                       backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger(f'veeteq.slow_queries.{pid}')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for old in logger.handlers[:]:
+            logger.removeHandler(old)
+        logger.addHandler(handler)
+        _slow_query_logger = (pid, logger)
+    return _slow_query_logger[1]
+
+def process_slow_query(entry, explain):
+    """Attach a (possibly cached) plan, then buffer and log the entry"""
+    cached = _slow_query_plans.get(entry['fingerprint'])
+    if cached and time.monotonic() - cached[0] < SLOW_QUERY_EXPLAIN_TTL:
+        entry['plan'], entry['explain_error'] = cached[1], cached[2]
+    elif explain:
+        plan, error = explain_statement(*explain)
+        # No plan and no error means no connection: try again next time
+        if plan is not None or error is not None:
+            _slow_query_plans[entry['fingerprint']] = (time.monotonic(), plan, error)
+        entry['plan'], entry['explain_error'] = plan, error
+    else:
+        entry['plan'], entry['explain_error'] = None, None
+    with _slow_query_lock:
+        _slow_queries.append(entry)
+    try:
+        slow_query_logger().info(json.dumps(entry, default=export_json_default))
+    except OSError as e:
+        print(f"Could not write slow query log: {e}")
+
+def run_slow_query_worker():
+    """Process queued slow statements forever"""
+    while True:
+        entry, explain = _slow_query_queue.get()
+        try:
+            process_slow_query(entry, explain)
+        except Exception as e:
+            print(f"Slow query worker error: {e}")
+
+def ensure_slow_query_worker():
+    """Start this process's slow-query worker thread on first use"""
+    global _slow_query_worker
+    # Threads don't survive fork(), so a forked worker process starts its own
+    if _slow_query_worker is None or not _slow_query_worker.is_alive():
+        with _slow_query_lock:
+            if _slow_query_worker is None or not _slow_query_worker.is_alive():
+                _slow_query_worker = threading.Thread(target=run_slow_query_worker, name='slow-query-worker', daemon=True)
+                _slow_query_worker.start()
+
+def read_slow_query_log():
+    """Entries from every process's log file and its rotations, oldest first within each process"""
+    paths = []
+    for current in sorted(glob.glob(slow_query_log_path())):
+        paths += [f"{current}.{n}" for n in range(SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [current]
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+def top_slow_queries(entries, limit=SLOW_QUERY_TOP):
+    """Statement shapes ranked by total time, each with its routes and latest plan"""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'routes': {}, 'plan': None, 'explain_error': None, 'last_seen': None
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['routes'][entry['route']] = group['routes'].get(entry['route'], 0) + 1
+        group['last_seen'] = entry['time']
+        if entry.get('plan') or entry.get('explain_error'):
+            group['plan'], group['explain_error'] = entry.get('plan'), entry.get('explain_error')
+    ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:limit]
+    for group in ranked:
+        group['avg_ms'] = group['total_ms'] / group['count']
+        group['routes'] = sorted(group['routes'].items(), key=lambda item: item[1], reverse=True)
+        group['full_scan'] = any(step.get('type') == 'ALL' for step in group['plan'] or [])
+    return ranked
+
+@app.route('/admin/slow-queries')
+def admin_slow_queries():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    
+    # The log file covers every worker process; the ring buffer only this one
+    source = 'memory' if request.args.get('source') == 'memory' else 'file'
+    if source == 'file':
+        offenders = top_slow_queries(read_slow_query_log())
+    else:
+        with _slow_query_lock:
+            recent = list(_slow_queries)
+        offenders = top_slow_queries(recent)
+    with _slow_query_lock:
+        latest = list(_slow_queries)[-20:][::-1]
+    return render_template('admin_slow_queries.html', offenders=offenders, latest=latest, source=source,
+                           threshold_ms=SLOW_QUERY_MS, log_path=slow_query_log_path())
+
+@app.cli.command('slow-queries')
+@click.option('--top', default=10, show_default=True)
+def slow_queries_command(top):
+    """Print the statements with the most total time in the slow-query log"""
+    for group in top_slow_queries(read_slow_query_log(), limit=top):
+        scan = '  FULL SCAN' if group['full_scan'] else ''
+        print(f"{group['total_ms']:>10,.0f} ms  {group['count']:>6}x  avg {group['avg_ms']:,.0f} ms  "
+              f"max {group['max_ms']:,.0f} ms{scan}")
+        print(f"    {group['sql'][:200]}")
+        print(f"    from {', '.join(f'{route} ({count})' for route, count in group['routes'][:3])}")
+
+# Lead import: CSV rows are validated one at a time but quoted, inserted and
+# committed a chunk at a time, with one multi-row statement per table.
+LEAD_IMPORT_CHUNK_SIZE = 1000
+LEAD_IMPORT_MAX_ERRORS = 200
+LEAD_PROPERTY_TYPES = ('residential', 'commercial', 'industrial')
+LEAD_PHONE = re.compile(r'^\+?[0-9][0-9 ()-]{5,18}[0-9]$')
+
+def parse_lead(row):
+    """Validate one CSV row; returns a lead dict or raises ValueError"""
+    name = (row.get('name') or '').strip()
+    phone = (row.get('phone') or '').strip()
+    city = (row.get('city') or '').strip()
+    email = (row.get('email') or '').strip().lower()
+    property_type = (row.get('property_type') or 'residential').strip().lower()
+    if not name:
+        raise ValueError("name is required")
+    if not LEAD_PHONE.match(phone):
+        raise ValueError(f"invalid phone '{phone}'")
+    if property_type not in LEAD_PROPERTY_TYPES:
+        raise ValueError(f"property_type must be one of {', '.join(LEAD_PROPERTY_TYPES)}")
+    try:
+        monthly_usage = float(row.get('monthly_usage') or '')
+        roof_size = float(row.get('roof_size') or UNKNOWN_ROOF_SIZE)
+    except ValueError:
+        raise ValueError("monthly_usage and roof_size must be numbers")
+    if monthly_usage <= 0 or roof_size <= 0:
+        raise ValueError("monthly_usage and roof_size must be positive")
+    if email and '@' not in email:
+        raise ValueError(f"invalid email '{email}'")
+    if not email:
+        # users.email is required and unique; a lead without one is keyed by phone
+        email = f"lead-{re.sub(r'[^0-9]', '', phone)}@leads.invalid"
+    return {
+        'name': name[:100],
+        'phone': phone[:20],
+        'city': city[:50],
+        'email': email[:100],
+        'property_type': property_type,
+        'monthly_usage': monthly_usage,
+        'roof_size': roof_size
+    }
+
+def insert_lead_chunk(connection, leads, rates, source):
+    """Quote and insert one chunk of leads in a single transaction.
+
+    Returns the summed payback period of the imported quotes and the indexes
+    of leads that could not be matched to a customer.
+    """
+    estimates = estimate_quotes(
+        np.fromiter((lead['monthly_usage'] for lead in leads), dtype=np.float64, count=len(leads)),
+        np.fromiter((lead['roof_size'] for lead in leads), dtype=np.float64, count=len(leads)),
+        np.fromiter((lead['property_type'] == 'residential' for lead in leads), dtype=bool, count=len(leads)),
+        rates
+    )
+    
+    cursor = connection.cursor()
+    try:
+        users = []
+        for lead in leads:
+            name_parts = lead['name'].split()
+            users.append((client_username(lead['email']), lead['email'], lead['phone'], lead['city'],
+                          name_parts[0][:50], name_parts[-1][:50] if len(name_parts) > 1 else ''))
+        # executemany rewrites this into one multi-row INSERT. An existing
+        # customer's contact details are only filled in, never overwritten
+        # from the CSV.
+        cursor.executemany("""
+            INSERT INTO users (username, password_hash, email, phone, city, role, first_name, last_name)
+            VALUES (%s, '', %s, %s, %s, 'client', %s, %s)
+            ON DUPLICATE KEY UPDATE
+            phone = IF(phone IS NULL OR phone = '', VALUES(phone), phone),
+            city = IF(city IS NULL OR city = '', VALUES(city), city)
+        """, users)
+        
+        emails = sorted({lead['email'] for lead in leads})
+        cursor.execute(f"SELECT LOWER(email), id FROM users WHERE email IN ({', '.join(['%s'] * len(emails))})", emails)
+        user_ids = dict(cursor.fetchall())
+        
+        # A lead whose username clashed with a different account has no row
+        # under its own email; it is reported rather than attached elsewhere
+        matched = [index for index, lead in enumerate(leads) if lead['email'] in user_ids]
+        unmatched = [index for index, lead in enumerate(leads) if lead['email'] not in user_ids]
+        
+        system_size = estimates['systemSize'].round(2).tolist()
+        panel_count = estimates['panelCount'].tolist()
+        system_cost = estimates['systemCost'].round(2).tolist()
+        annual_savings = estimates['annualSavings'].round(2).tolist()
+        payback = estimates['paybackPeriod'].round(1).tolist()
+        quotes = [
+            (user_ids[leads[index]['email']], leads[index]['property_type'], leads[index]['roof_size'],
+             leads[index]['monthly_usage'], system_size[index], system_cost[index], annual_savings[index],
+             f"Imported lead ({source}): {panel_count[index]} panels, estimated payback {payback[index]} years")
+            for index in matched
+        ]
+        if quotes:
+            cursor.executemany("""
+                INSERT INTO quotes (customer_id, property_type, roof_size, energy_usage,
+                                  system_size, estimated_cost, estimated_savings, status, notes)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending', %s)
+            """, quotes)
+            
+            # Every imported quote is pending and created today: one rollup row per chunk
+            cursor.execute("""
+                INSERT INTO daily_quote_stats (stat_date, status, quote_count, estimated_cost, system_size)
+                VALUES (CURDATE(), 'pending', %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                quote_count = quote_count + VALUES(quote_count),
+                estimated_cost = estimated_cost + VALUES(estimated_cost),
+                system_size = system_size + VALUES(system_size)
+            """, (len(quotes), sum(system_cost[index] for index in matched), sum(system_size[index] for index in matched)))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return float(sum(estimates['paybackPeriod'][matched])), unmatched
+
+def import_leads(lines, source='upload', chunk_size=LEAD_IMPORT_CHUNK_SIZE):
+    """Import leads from an iterable of CSV lines (header row first) and return a report"""
+    report = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'seconds': 0.0,
+              'rows_per_second': 0.0, 'average_payback': 0.0}
+    if np is None:
+        report['errors'].append((0, "NumPy is not installed"))
+        return report
+    connection = get_db_connection()
+    if not connection:
+        report['errors'].append((0, "Database connection failed"))
+        return report
+    
+    def record_error(line_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < LEAD_IMPORT_MAX_ERRORS:
+            report['errors'].append((line_number, message))
+    
+    payback_total = 0.0
+    
+    def flush(chunk):
+        nonlocal payback_total
+        try:
+            payback, unmatched = insert_lead_chunk(connection, [lead for _, lead in chunk], rates, source)
+        except Exception as e:
+            message = f"database error: {e.msg}" if isinstance(e, Error) else f"import error: {e}"
+            for line_number, _ in chunk:
+                record_error(line_number, message)
+            return
+        payback_total += payback
+        report['imported'] += len(chunk) - len(unmatched)
+        for index in unmatched:
+            line_number, lead = chunk[index]
+            record_error(line_number, f"username for {lead['email']} belongs to another account")
+    
+    started = time.perf_counter()
+    rates = get_quote_rates()
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or not {'name', 'phone', 'monthly_usage'} <= {field.strip().lower() for field in reader.fieldnames}:
+        report['errors'].append((1, "header must include name, phone and monthly_usage"))
+    else:
+        reader.fieldnames = [field.strip().lower() for field in reader.fieldnames]
+        chunk = []
+        for row in reader:
+            report['rows'] += 1
+            try:
+                chunk.append((reader.line_num, parse_lead(row)))
+            except ValueError as e:
+                record_error(reader.line_num, str(e))
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    connection.close()
+    
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+    report['average_payback'] = payback_total / report['imported'] if report['imported'] else 0.0
+    return report
+
+@app.route('/admin/quotes/import', methods=['GET', 'POST'])
+def admin_import_leads():
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    
+    report = None
+    if request.method == 'POST':
+        file = request.files.get('leads')
+        if not file or not file.filename:
+            flash('Choose a CSV file to import', 'error')
+            return redirect(url_for('admin_import_leads'))
+        # Decode the upload as it streams rather than reading it into memory
+        lines = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        report = import_leads(lines, source=secure_filename(file.filename))
+        if report['imported']:
+            flash(f"Imported {report['imported']} of {report['rows']} leads in {report['seconds']:.1f}s", 'success')
+        else:
+            flash('No leads were imported', 'error')
+    
+    return render_template('admin_import_leads.html', report=report, max_errors=LEAD_IMPORT_MAX_ERRORS)
+
+@app.cli.command('import-leads')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=LEAD_IMPORT_CHUNK_SIZE, show_default=True, help='Rows per transaction.')
+def import_leads_command(path, chunk_size):
+    """Import a CSV of leads (name, phone, city, monthly_usage, property_type) as pending quotes"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = import_leads(f, source=os.path.basename(path), chunk_size=chunk_size)
+    for line_number, message in report['errors']:
+        print(f"line {line_number}: {message}")
+    print(f"Imported {report['imported']}/{report['rows']} rows ({report['failed']} failed) in "
+          f"{report['seconds']:.2f}s, {report['rows_per_second']:,.0f} rows/s; "
+          f"average payback {report['average_payback']:.1f} years")
+
+# Exports stream straight from an unbuffered cursor: rows are read from the
+# server in batches as the client downloads them, so memory stays flat and the
+# first bytes go out before the query has finished. Rows are ordered by the
+# (status, created_at) / created_at indexes so MySQL never has to sort first.
+EXPORT_BATCH_SIZE = 1000
+EXPORTS = {
+    'customers': ("""
+        SELECT u.id, u.username, u.first_name, u.last_name, u.email, u.phone,
+               u.address, u.city, u.state, u.zip_code, u.is_active, u.created_at
+        FROM users u
+    """, 'u', ["u.role = 'client'"], None),
+    'quotes': ("""
+        SELECT q.id, q.created_at, q.status, q.property_type, q.roof_size, q.energy_usage,
+               q.system_size, q.estimated_cost, q.estimated_savings, q.notes,
+               q.customer_id, u.first_name, u.last_name, u.email, u.phone, u.city
+        FROM quotes q
+        LEFT JOIN users u ON q.customer_id = u.id
+    """, 'q', [], 'q.status'),
+    'installations': ("""
+        SELECT i.id, i.created_at, i.installation_date, i.status, i.system_size, i.total_cost,
+               i.technician, i.notes, i.quote_id, i.customer_id,
+               u.first_name, u.last_name, u.email, u.phone, u.city
+        FROM installations i
+        LEFT JOIN users u ON i.customer_id = u.id
+    """, 'i', [], 'i.status')
+}
+
+def parse_export_date(value, name):
+    """Parse a YYYY-MM-DD filter, raising ValueError with the parameter name"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+def build_export_query(kind, date_from=None, date_to=None, status=None):
+    """SQL and parameters for an export, filtered by created_at range and status"""
+    select_sql, alias, conditions, status_column = EXPORTS[kind]
+    conditions = list(conditions)
+    params = []
+    if status and status_column:
+        conditions.append(f"{status_column} = %s")
+        params.append(status)
+    if date_from:
+        conditions.append(f"{alias}.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        # Inclusive end date
+        conditions.append(f"{alias}.created_at < %s + INTERVAL 1 DAY")
+        params.append(date_to)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f"{select_sql}{where} ORDER BY {alias}.created_at, {alias}.id", params
+
+def export_value(value):
+    """Dates as ISO strings; everything else unchanged"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+# Spreadsheet apps evaluate text cells starting with these as formulas
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_safe(value):
+    """Quote text that a spreadsheet would run as a formula with a leading apostrophe"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def export_json_default(value):
+    """JSON encoding for DECIMAL columns and anything else the driver returns"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def stream_export(kind, export_format, date_from=None, date_to=None, status=None):
+    """Yield an export as CSV or JSON Lines chunks, one chunk per batch of rows.
+
+    Uses its own pool connection so it is unaffected by the request context
+    ending while the response is still streaming.
+    """
+    sql, params = build_export_query(kind, date_from, date_to, status)
+    connection = checkout_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+    cursor = None
+    try:
+        cursor = connection.cursor(buffered=False)
+        # Slow downloads must not trip the server's write timeout mid-export
+        cursor.execute("SET SESSION net_write_timeout = 3600")
+        cursor.execute(sql, params)
+        columns = cursor.column_names
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(columns)
+        
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                values = [export_value(value) for value in row]
+                if export_format == 'csv':
+                    writer.writerow([csv_safe(value) for value in values])
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, values)), default=export_json_default))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        # A client that disconnects mid-download leaves rows unread; closing
+        # the cursor drains them (the pool sets consume_results) so the
+        # connection goes back to the pool clean
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error as e:
+                print(f"Error closing export cursor: {e}")
+        connection.release()
+
+@app.route('/admin/export/<kind>')
+def admin_export(kind):
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return redirect(url_for('login'))
+    if kind not in EXPORTS:
+        return jsonify({'error': f"Unknown export '{kind}'"}), 404
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    try:
+        date_from = parse_export_date(request.args['from'], 'from') if request.args.get('from') else None
+        date_to = parse_export_date(request.args['to'], 'to') if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    chunks = stream_export(kind, export_format, date_from, date_to, request.args.get('status') or None)
+    try:
+        # Start the query now so a database outage is an error page, not an empty download
+        first_chunk = next(chunks, '')
+    except (Error, RuntimeError) as e:
+        print(f"Export failed: {e}")
+        return jsonify({'error': 'Database unavailable'}), 503
+    
+    def generate():
+        yield first_chunk
+        yield from chunks
+    
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    response = app.response_class(stream_with_context(generate()),
+                                  mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Tell nginx not to buffer the whole download before forwarding it
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'export_format', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), help='Created on or after this date.')
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), help='Created on or before this date.')
+@click.option('--status', help='Only rows with this status.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='File to write (default stdout).')
+def export_command(kind, export_format, date_from, date_to, status, output):
+    """Stream customers, quotes or installations to CSV or JSON Lines"""
+    try:
+        for chunk in stream_export(kind, export_format, date_from and date_from.date(), date_to and date_to.date(), status):
+            output.write(chunk)
+    except (Error, RuntimeError) as e:
+        raise click.ClickException(str(e))
+
+# Icons are cut from the sun mark at the left of the logo and written to
+# static/icons/ at startup whenever the logo is newer than them.
+LOGO_PATH = os.path.join(UPLOAD_FOLDER, 'Veeteq Solar.jpg')
+ICON_FOLDER = 'static/icons'
+ICON_SIZES = {
+    'favicon-16.png': 16,
+    'favicon-32.png': 32,
+    'apple-touch-icon.png': 180,
+    'icon-192.png': 192,
+    'icon-512.png': 512,
+}
+FAVICON_ICO_SIZES = [(16, 16), (32, 32), (48, 48)]
+
+def logo_mark(image):
+    """Square crop around the sun mark, ignoring the logo's white margin and wordmark"""
+    image = flatten_image(ImageOps.exif_transpose(image))
+    mask = image.convert('L').point(lambda value: 255 if value < 235 else 0)
+    left, top, right, bottom = mask.getbbox() or (0, 0) + image.size
+    side = bottom - top
+    mark = image.crop((left, top, left + side, bottom))
+    return ImageOps.expand(mark, border=side // 16, fill='white')
+
+def generate_favicons(force=False):
+    """Write favicon.ico and PNG touch icons from the logo; returns True when they exist"""
+    logo = os.path.join(app.root_path, LOGO_PATH)
+    folder = os.path.join(app.root_path, ICON_FOLDER)
+    ico_path = os.path.join(folder, 'favicon.ico')
+    if not force and os.path.exists(ico_path) and os.path.getmtime(ico_path) >= os.path.getmtime(logo):
+        return True
+    if Image is None:
+        return False
+    
+    os.makedirs(folder, exist_ok=True)
+    with Image.open(logo) as image:
+        mark = logo_mark(image)
+    for name, size in ICON_SIZES.items():
+        mark.resize((size, size), Image.LANCZOS).save(os.path.join(folder, name), optimize=True)
+    mark.resize((48, 48), Image.LANCZOS).save(ico_path, sizes=FAVICON_ICO_SIZES)
+    print(f"Generated favicons in {ICON_FOLDER}")
+    return True
+
+try:
+    app.config['FAVICONS'] = generate_favicons()
+except OSError as e:
+    print(f"Error generating favicons: {e}")
+    app.config['FAVICONS'] = False
+
 @app.route('/favicon.ico')
 def favicon():
     """Serve favicon to prevent 404 errors"""
-    from flask import send_from_directory
-    import os
-    static_folder = os.path.join(app.root_path, 'static', 'uploads')
-    return send_from_directory(static_folder, 'Veeteq Solar.jpg', mimetype='image/jpeg')
+    if not app.config['FAVICONS']:
+        return send_from_directory(os.path.join(app.root_path, UPLOAD_FOLDER), 'Veeteq Solar.jpg', mimetype='image/jpeg', max_age=86400)
+    return send_from_directory(os.path.join(app.root_path, ICON_FOLDER), 'favicon.ico', mimetype='image/x-icon', max_age=86400)
+
+@app.cli.command('build-static')
+@click.option('--force', is_flag=True, help='Regenerate favicons even if they are up to date.')
+def build_static_command(force):
+    """Generate favicons and print the static asset manifest"""
+    if not generate_favicons(force=force):
+        print("Pillow is not installed; favicons were not generated.")
+    compress_static_files(force=force)
+    for name, fingerprint in sorted(build_static_manifest().items()):
+        stem, extension = os.path.splitext(name)
+        print(f"{name} -> {stem}.{fingerprint}{extension}")
 
 if __name__ == '__main__':
-    init_db()
+    check_schema_version()
+    # The reloader runs the app in a child process; only start the worker there
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_outbox_worker()
     app.run(debug=True)
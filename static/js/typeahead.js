@@ -0,0 +1,113 @@
+// Typeahead pickers for the admin forms: a text box that queries a JSON
+// lookup endpoint as you type and stores the chosen id in a hidden input.
+
+function initTypeahead(options) {
+    const input = document.getElementById(options.input);
+    const hidden = document.getElementById(options.hidden);
+    const list = document.getElementById(options.results);
+    const minChars = options.minChars === undefined ? 2 : options.minChars;
+    let items = [];
+    let active = -1;
+    let timer = null;
+    let controller = null;
+
+    function close() {
+        list.classList.add('hidden');
+        active = -1;
+    }
+
+    function render() {
+        list.innerHTML = '';
+        if (!items.length) {
+            const empty = document.createElement('li');
+            empty.className = 'px-4 py-2 text-sm text-gray-500';
+            empty.textContent = 'No matches';
+            list.appendChild(empty);
+        }
+        items.forEach(function (item, index) {
+            const option = document.createElement('li');
+            option.className = 'px-4 py-2 text-sm cursor-pointer hover:bg-gray-100' + (index === active ? ' bg-gray-100' : '');
+            option.textContent = item.label;
+            option.addEventListener('mousedown', function (e) {
+                e.preventDefault();
+                select(index);
+            });
+            list.appendChild(option);
+        });
+        list.classList.remove('hidden');
+    }
+
+    function select(index) {
+        const item = items[index];
+        if (!item) return;
+        input.value = item.label;
+        hidden.value = item.id;
+        input.setCustomValidity('');
+        close();
+        if (options.onSelect) options.onSelect(item);
+    }
+
+    function search() {
+        const text = input.value.trim();
+        if (text.length < minChars) {
+            close();
+            return;
+        }
+        // Drop the previous request so a slow response can't overwrite a newer one
+        if (controller) controller.abort();
+        controller = new AbortController();
+        const params = new URLSearchParams(options.params ? options.params() : {});
+        params.set('q', text);
+        fetch(options.url + '?' + params.toString(), { signal: controller.signal, credentials: 'same-origin' })
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                items = data.results || [];
+                active = -1;
+                render();
+            })
+            .catch(function (error) {
+                if (error.name !== 'AbortError') close();
+            });
+    }
+
+    input.addEventListener('input', function () {
+        hidden.value = '';
+        clearTimeout(timer);
+        timer = setTimeout(search, 150);
+    });
+    input.addEventListener('focus', function () {
+        if (!hidden.value) search();
+    });
+    input.addEventListener('blur', close);
+    input.addEventListener('keydown', function (e) {
+        if (list.classList.contains('hidden')) return;
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            e.preventDefault();
+            active = (active + (e.key === 'ArrowDown' ? 1 : -1) + items.length) % items.length;
+            render();
+        } else if (e.key === 'Enter' && active >= 0) {
+            e.preventDefault();
+            select(active);
+        } else if (e.key === 'Escape') {
+            close();
+        }
+    });
+
+    if (options.required) {
+        input.form.addEventListener('submit', function (e) {
+            if (!hidden.value) {
+                e.preventDefault();
+                input.setCustomValidity('Choose an entry from the list');
+                input.reportValidity();
+            }
+        });
+    }
+
+    return {
+        set: function (id, label) {
+            hidden.value = id;
+            input.value = label;
+            input.setCustomValidity('');
+        }
+    };
+}
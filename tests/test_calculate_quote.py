@@ -0,0 +1,31 @@
+import pytest
+
+import app
+
+np = pytest.importorskip('numpy')
+
+RATES = (375.0, 325.0, 20.0)
+
+
+@pytest.fixture
+def calculate(monkeypatch):
+    monkeypatch.setattr(app, 'get_quote_rates', lambda: RATES)
+    client = app.app.test_client()
+    return lambda **body: client.post('/calculate_quote', json=body)
+
+
+@pytest.mark.parametrize('usage, roof, property_type', [
+    (3000, 2000, 'residential'), (450, 300, 'commercial'), (0, 100, 'residential'), (12000, 800, 'commercial')
+])
+def test_calculator_matches_bulk_estimates(calculate, usage, roof, property_type):
+    estimate = app.estimate_quotes(np.array([usage]), np.array([roof]), np.array([property_type == 'residential']), RATES)
+
+    result = calculate(monthlyUsage=usage, roofSize=roof, propertyType=property_type).get_json()
+
+    assert result['panelCount'] == estimate['panelCount'][0]
+    assert result['systemCost'] == result['netCost'] == round(float(estimate['systemCost'][0]), 2)
+    assert result['paybackPeriod'] == round(float(estimate['paybackPeriod'][0]), 1)
+
+
+def test_calculator_rejects_bad_input(calculate):
+    assert calculate(monthlyUsage='lots').status_code == 400
@@ -0,0 +1,68 @@
+import app
+
+
+class ExportCursor:
+    column_names = ('id', 'notes')
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.closed = False
+
+    def execute(self, operation, params=None):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class ExportConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.returned = False
+
+    def cursor(self, *args, **kwargs):
+        return self._cursor
+
+    def release(self):
+        assert self._cursor.closed, 'connection returned to the pool with an open cursor'
+        self.returned = True
+
+
+def test_csv_safe_neutralises_formulas():
+    assert app.csv_safe('=HYPERLINK("http://x")') == '\'=HYPERLINK("http://x")'
+    assert app.csv_safe('+254712345678') == "'+254712345678"
+    assert app.csv_safe('-1+1') == "'-1+1"
+    assert app.csv_safe('@SUM(A1)') == "'@SUM(A1)"
+    assert app.csv_safe('\t=1') == "'\t=1"
+    assert app.csv_safe('Nakuru') == 'Nakuru'
+    assert app.csv_safe('') == ''
+    assert app.csv_safe(-5) == -5
+    assert app.csv_safe(None) is None
+
+
+def test_export_rows_are_neutralised(monkeypatch):
+    cursor = ExportCursor([(1, '=cmd|calc'), (2, 'fine')])
+    connection = ExportConnection(cursor)
+    monkeypatch.setattr(app, 'checkout_db_connection', lambda: connection)
+
+    body = ''.join(app.stream_export('quotes', 'csv'))
+
+    assert body.splitlines() == ['id,notes', "1,'=cmd|calc", '2,fine']
+    assert connection.returned
+
+
+def test_abandoned_export_closes_its_cursor(monkeypatch):
+    cursor = ExportCursor([(i, 'row') for i in range(app.EXPORT_BATCH_SIZE * 3)])
+    connection = ExportConnection(cursor)
+    monkeypatch.setattr(app, 'checkout_db_connection', lambda: connection)
+
+    chunks = app.stream_export('quotes', 'csv')
+    next(chunks)
+    chunks.close()  # what the server does when the client disconnects
+
+    assert cursor.closed
+    assert connection.returned
@@ -0,0 +1,54 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'METRICS_TOKEN', 's3cret')
+    return app.app.test_client()
+
+
+def login(client, role):
+    with client.session_transaction() as session:
+        session['user'] = {'id': 1, 'username': role, 'role': role}
+
+
+def test_anonymous_scrape_gets_401(client):
+    response = client.get('/metrics')
+
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer realm="metrics"'
+    assert response.mimetype == 'text/plain'
+
+
+def test_wrong_token_gets_401_even_with_a_session(client):
+    login(client, 'client')
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+
+    assert response.status_code == 401
+
+
+def test_token_is_not_accepted_when_unset(client, monkeypatch):
+    monkeypatch.setattr(app, 'METRICS_TOKEN', None)
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+
+
+def test_non_admin_browser_is_sent_to_login(client):
+    login(client, 'client')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_token_and_admin_session_get_metrics(client):
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert 'veeteq_requests_total' in response.get_data(as_text=True)
+
+    login(client, 'admin')
+    assert client.get('/metrics').status_code == 200
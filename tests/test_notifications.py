@@ -0,0 +1,71 @@
+import app
+
+
+class DictCursor:
+    """Stands in for connection.cursor(dictionary=True)"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, operation, params=None):
+        self.executed.append(operation)
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_staff_recipients_reads_email_from_dict_rows(monkeypatch):
+    monkeypatch.setattr(app, 'NOTIFY_EMAIL', '')
+    cursor = DictCursor([{'email': 'ops@example.com'}, {'email': 'sales@example.com'}])
+
+    assert app.staff_recipients(cursor) == ['ops@example.com', 'sales@example.com']
+    assert cursor.executed
+
+
+def test_staff_recipients_prefers_notify_email(monkeypatch):
+    monkeypatch.setattr(app, 'NOTIFY_EMAIL', 'a@example.com, b@example.com')
+
+    assert app.staff_recipients(DictCursor([])) == ['a@example.com', 'b@example.com']
+
+
+class OutboxCursor(DictCursor):
+    rowcount = 2
+
+    def execute(self, operation, params=None):
+        self.executed.append(' '.join(operation.split()))
+
+    def close(self):
+        pass
+
+
+class OutboxConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, *args, **kwargs):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_drain_outbox_renews_the_lease_before_each_send(monkeypatch):
+    messages = [{'id': i, 'kind': 'quote', 'recipient': 'a@example.com', 'subject': 's', 'body': 'b', 'attempts': 0}
+                for i in (1, 2)]
+    cursor = OutboxCursor(messages)
+    sent = []
+    monkeypatch.setattr(app, 'get_db_connection', lambda: OutboxConnection(cursor))
+    monkeypatch.setattr(app, 'open_smtp', lambda: None)
+    monkeypatch.setattr(app, 'send_email', lambda smtp, recipients, subject, body: sent.append(len(cursor.executed)))
+
+    assert app.drain_outbox('worker-1') == 2
+
+    renewals = [i for i, sql in enumerate(cursor.executed) if sql.startswith('UPDATE notification_outbox SET locked_until')]
+    assert len(renewals) == 2
+    # Each send happens right after its renewal
+    assert sent == [renewals[0] + 1, renewals[1] + 1]
+    assert app.OUTBOX_LEASE_SECONDS > 4 * app.SMTP_TIMEOUT
@@ -0,0 +1,104 @@
+import re
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import app
+
+
+class KeysetCursor:
+    """Runs fetch_keyset_page's statement against in-memory (created_at, id) rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.limits = []
+
+    def execute(self, operation, params):
+        *params, limit = params
+        self.limits.append(limit)
+        rows = self.rows
+        bound = re.search(r'created_at ([<>]) %s', operation)
+        if bound:
+            created_at, row_id = params[-2], params[-1]
+            if bound.group(1) == '<':
+                rows = [row for row in rows if (row['created_at'], row['id']) < (created_at, row_id)]
+            else:
+                rows = [row for row in rows if (row['created_at'], row['id']) > (created_at, row_id)]
+        newest_first = 'created_at DESC' in operation
+        rows = sorted(rows, key=lambda row: (row['created_at'], row['id']), reverse=newest_first)
+        self.result = rows[:limit]
+
+    def fetchall(self):
+        return self.result
+
+
+# Several rows share a timestamp so the id tiebreak is exercised
+START = datetime(2025, 1, 1)
+ROWS = [{'id': i, 'created_at': START + timedelta(hours=i // 3)} for i in range(1, 24)]
+NEWEST_FIRST = sorted(ROWS, key=lambda row: (row['created_at'], row['id']), reverse=True)
+
+
+def fetch_page(cursor, query=''):
+    with app.app.test_request_context(f'/admin/quotes?{query}'):
+        return app.fetch_keyset_page(cursor, 'SELECT q.id, q.created_at FROM quotes q', 'q', [], [])
+
+
+def query_of(url):
+    return urlsplit(url).query
+
+
+def test_walking_forward_and_back_visits_every_row_once():
+    cursor = KeysetCursor(ROWS)
+
+    pages = []
+    rows, pagination = fetch_page(cursor, 'per_page=5')
+    assert pagination['prev_url'] is None
+    pages.append(rows)
+    while pagination['next_url']:
+        rows, pagination = fetch_page(cursor, query_of(pagination['next_url']))
+        pages.append(rows)
+    assert [row['id'] for page in pages for row in page] == [row['id'] for row in NEWEST_FIRST]
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+
+    back = []
+    while pagination['prev_url']:
+        rows, pagination = fetch_page(cursor, query_of(pagination['prev_url']))
+        back.append(rows)
+    assert back == pages[-2::-1]
+    assert pagination['next_url'] is not None
+
+
+def test_page_links_keep_filters_and_per_page():
+    rows, pagination = fetch_page(KeysetCursor(ROWS), 'per_page=5&status=pending')
+
+    args = parse_qs(query_of(pagination['next_url']))
+    assert args['status'] == ['pending']
+    assert args['per_page'] == ['5']
+    assert app.decode_page_cursor(args['after'][0]) == (rows[-1]['created_at'], rows[-1]['id'])
+
+
+@pytest.mark.parametrize('per_page, expected', [
+    ('0', 1), ('-3', 1), ('1', 1), ('5000', app.ADMIN_MAX_PAGE_SIZE), ('lots', app.ADMIN_PAGE_SIZE), ('', app.ADMIN_PAGE_SIZE)
+])
+def test_page_size_is_clamped(per_page, expected):
+    cursor = KeysetCursor(ROWS)
+
+    rows, pagination = fetch_page(cursor, f'per_page={per_page}')
+
+    assert pagination['page_size'] == expected
+    assert cursor.limits == [expected + 1]
+
+
+@pytest.mark.parametrize('token', ['', 'garbage', '2025-01-01T00:00:00', '2025-13-01T00:00:00_4', '2025-01-01T00:00:00_x'])
+def test_malformed_cursor_starts_from_the_newest_row(token):
+    rows, pagination = fetch_page(KeysetCursor(ROWS), f'after={token}&per_page=5')
+
+    assert [row['id'] for row in rows] == [row['id'] for row in NEWEST_FIRST[:5]]
+    assert pagination['prev_url'] is None
+
+
+def test_cursor_round_trip():
+    row = {'id': 42, 'created_at': datetime(2025, 6, 30, 23, 59, 58)}
+
+    assert app.decode_page_cursor(app.encode_page_cursor(row)) == (row['created_at'], 42)
@@ -0,0 +1,131 @@
+import re
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+class RollupDatabase:
+    """quotes/installations rows and their daily stats, enough for the rollup statements"""
+
+    def __init__(self, quotes=(), installations=()):
+        self.quotes = {row['id']: dict(row) for row in quotes}
+        self.installations = {row['id']: dict(row) for row in installations}
+        self.quote_stats = Counter()
+        self.installation_stats = Counter()
+
+    def connection(self):
+        return RollupConnection(self)
+
+    def expected_quote_stats(self):
+        stats = Counter()
+        for quote in self.quotes.values():
+            key = (quote['created_at'].date(), quote['status'] or '')
+            stats[key + ('count',)] += 1
+            stats[key + ('cost',)] += quote['estimated_cost'] or 0
+        return +stats
+
+
+class RollupConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, *args, **kwargs):
+        return RollupCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class RollupCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, operation, params=None):
+        sql = ' '.join(operation.split())
+        if sql.startswith('INSERT INTO daily_quote_stats'):
+            sign, _, _, quote_id = params
+            quote = self.db.quotes.get(quote_id)
+            if quote:
+                key = (quote['created_at'].date(), quote['status'] or '')
+                self.db.quote_stats[key + ('count',)] += sign
+                self.db.quote_stats[key + ('cost',)] += sign * (quote['estimated_cost'] or 0)
+        elif sql.startswith('INSERT INTO daily_installation_stats'):
+            sign, _, installation_id = params
+            installation = self.db.installations.get(installation_id)
+            if installation:
+                self.db.installation_stats[(installation['installation_date'], installation['status'])] += sign
+        elif sql.startswith('UPDATE quotes SET status'):
+            self.db.quotes[params[0]]['status'] = re.search(r"status = '(\w+)'", sql).group(1)
+        elif sql.startswith('DELETE FROM installations'):
+            self.db.installations.pop(params[0], None)
+        else:
+            raise AssertionError(f'unexpected statement: {sql}')
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    def admin(db):
+        monkeypatch.setattr(app, 'get_db_connection', db.connection)
+        monkeypatch.setattr(app, 'invalidate_page_cache', lambda *tags: None)
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['user'] = {'id': 1, 'username': 'admin', 'role': 'admin'}
+        return client
+    return admin
+
+
+QUOTES = [
+    {'id': 1, 'created_at': datetime(2025, 3, 1, 9), 'status': 'pending', 'estimated_cost': 500000},
+    {'id': 2, 'created_at': datetime(2025, 3, 1, 15), 'status': 'pending', 'estimated_cost': 250000},
+    {'id': 3, 'created_at': datetime(2025, 3, 2, 10), 'status': None, 'estimated_cost': None}
+]
+
+
+def seeded(db):
+    cursor = RollupCursor(db)
+    for quote_id in db.quotes:
+        app.apply_quote_rollup(cursor, quote_id, 1)
+    return db
+
+
+@pytest.mark.parametrize('action, status', [('approve', 'approved'), ('reject', 'rejected')])
+def test_status_change_moves_the_quote_between_buckets(admin, action, status):
+    db = seeded(RollupDatabase(QUOTES))
+
+    admin(db).post(f'/admin/quotes/{action}/1')
+    admin(db).post(f'/admin/quotes/{action}/3')
+
+    assert db.quotes[1]['status'] == status
+    assert +db.quote_stats == db.expected_quote_stats()
+    day = datetime(2025, 3, 1).date()
+    assert db.quote_stats[(day, 'pending', 'count')] == 1
+    assert db.quote_stats[(day, status, 'cost')] == 500000
+
+
+def test_repeated_status_change_is_not_double_counted(admin):
+    db = seeded(RollupDatabase(QUOTES))
+    client = admin(db)
+
+    client.post('/admin/quotes/approve/2')
+    client.post('/admin/quotes/approve/2')
+
+    assert +db.quote_stats == db.expected_quote_stats()
+
+
+def test_deleted_installation_leaves_no_count(admin):
+    db = RollupDatabase(installations=[{'id': 5, 'installation_date': datetime(2025, 4, 1).date(), 'status': 'completed'}])
+    app.apply_installation_rollup(RollupCursor(db), 5, 1)
+
+    admin(db).post('/admin/installations/delete/5')
+
+    assert 5 not in db.installations
+    assert +db.installation_stats == Counter()
@@ -0,0 +1,62 @@
+import app
+
+
+class SettingsCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def executemany(self, operation, seq_params):
+        self.log.append(('executemany', list(seq_params)))
+
+    def close(self):
+        pass
+
+
+class SettingsConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self, *args, **kwargs):
+        return SettingsCursor(self.log)
+
+    def commit(self):
+        self.log.append(('commit',))
+
+    def close(self):
+        pass
+
+
+def test_set_settings_writes_once_and_invalidates_once(monkeypatch):
+    connection = SettingsConnection()
+    invalidations = []
+    monkeypatch.setattr(app, 'get_db_connection', lambda: connection)
+    monkeypatch.setattr(app, 'invalidate_settings_cache', lambda: invalidations.append(1))
+
+    assert app.set_settings([
+        ('email_notifications', True, 'boolean', None),
+        ('session_timeout', 30, 'number', None),
+        ('company_name', 'Veeteq Solar', 'string', None)
+    ])
+
+    assert connection.log == [
+        ('executemany', [('email_notifications', 'true', 'boolean', None), ('session_timeout', '30', 'number', None),
+                         ('company_name', 'Veeteq Solar', 'string', None)]),
+        ('commit',)
+    ]
+    assert invalidations == [1]
+
+
+def test_parse_setting_value_handles_every_seeded_type():
+    assert app.parse_setting_value('true', 'boolean') is True
+    assert app.parse_setting_value('False', 'boolean') is False
+    assert app.parse_setting_value('30', 'integer') == 30
+    assert app.parse_setting_value('375', 'float') == 375.0
+    assert isinstance(app.parse_setting_value('375', 'float'), float)
+    assert app.parse_setting_value('2.5', 'number') == 2.5
+    assert app.parse_setting_value('5', 'number') == 5
+    assert app.parse_setting_value('KSh', 'string') == 'KSh'
+
+
+def test_parse_setting_value_keeps_null():
+    for setting_type in ('boolean', 'integer', 'float', 'number', 'string'):
+        assert app.parse_setting_value(None, setting_type) is None
@@ -0,0 +1,28 @@
+import pytest
+
+import app
+
+np = pytest.importorskip('numpy')
+
+
+def stepwise_states(net, capacity):
+    state = np.zeros(net.shape[1])
+    history = np.empty_like(net)
+    for hour in range(len(net)):
+        state = np.clip(state + net[hour], 0, capacity)
+        history[hour] = state
+    return history
+
+
+@pytest.mark.parametrize('hours', [app.HOURS_PER_YEAR, 100, 25, 1])
+def test_battery_states_match_the_hourly_recurrence(hours):
+    rng = np.random.default_rng(hours)
+    net = rng.normal(0, 2, (hours, 6))
+    capacity = np.array([0, 0.5, 1, 3, 10, 100])
+
+    assert np.allclose(app.battery_states(net, capacity), stepwise_states(net, capacity))
+
+
+def test_every_county_has_a_bundled_profile():
+    for county in app.COUNTY_SITES:
+        assert app.get_irradiance(county).shape == (app.HOURS_PER_YEAR,)
@@ -0,0 +1,126 @@
+import pytest
+from mysql.connector import Error
+
+import app
+
+
+class QuoteDatabase:
+    """In-memory users/quotes with the unique keys submit_quote relies on"""
+
+    def __init__(self, users=()):
+        self.users = [dict(user) for user in users]
+        self.quotes = []
+        self.statements = []
+
+    def connection(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.lastrowid = None
+
+    def execute(self, operation, params=None):
+        sql = ' '.join(operation.split())
+        self.db.statements.append(sql)
+        if sql.startswith('INSERT INTO users'):
+            self.upsert_user(sql, params)
+        elif sql.startswith('INSERT INTO quotes'):
+            key = params[-1]
+            if key is not None and any(quote['idempotency_key'] == key for quote in self.db.quotes):
+                raise Error(msg='Duplicate entry', errno=app.MYSQL_DUPLICATE_ENTRY)
+            self.db.quotes.append({'id': len(self.db.quotes) + 1, 'customer_id': params[0], 'idempotency_key': key})
+            self.lastrowid = len(self.db.quotes)
+
+    def upsert_user(self, sql, params):
+        username, email = params[0].lower(), params[1].lower()
+        # MySQL checks every unique key; the first conflicting row is updated
+        for user in self.db.users:
+            if user['username'].lower() == username or user['email'].lower() == email:
+                assert 'LAST_INSERT_ID(id)' in sql
+                self.lastrowid = user['id']
+                return
+        self.db.users.append({'id': len(self.db.users) + 1, 'username': params[0], 'email': params[1]})
+        self.lastrowid = len(self.db.users)
+
+    def close(self):
+        pass
+
+
+FORM = {
+    'name': 'Wanjiku Kamau', 'email': 'wanjiku@example.com', 'phone': '0712345678',
+    'address': '1 Moi Avenue', 'city': 'Nakuru', 'state': 'Nakuru', 'propertyType': 'residential',
+    'roofSize': '2000', 'monthlyUsage': '3000', 'systemSize': '3.3', 'estimatedCost': '500000',
+    'estimatedSavings': '60000', 'panelCount': '6', 'idempotency_key': 'form-render-0001'
+}
+
+
+@pytest.fixture
+def submit(monkeypatch):
+    def submit(db, **changes):
+        monkeypatch.setattr(app, 'get_db_connection', db.connection)
+        monkeypatch.setattr(app, 'notifications_enabled', lambda: False)
+        db.statements.clear()
+        return app.app.test_client().post('/submit_quote', data=dict(FORM, **changes))
+    return submit
+
+
+def test_duplicate_submit_records_one_quote_in_two_statements(submit):
+    db = QuoteDatabase()
+
+    first = submit(db)
+    again = submit(db)
+
+    assert len(db.quotes) == 1
+    assert len(db.users) == 1
+    assert again.status_code == first.status_code == 302
+    assert again.headers['Location'] == first.headers['Location']
+    # User upsert and the quote insert that hits the idempotency key
+    assert len(db.statements) == 2
+
+
+def test_existing_email_gets_the_quote(submit):
+    db = QuoteDatabase([{'id': 7, 'username': 'wanjiku', 'email': 'Wanjiku@Example.com'}])
+
+    submit(db)
+
+    assert db.quotes[0]['customer_id'] == 7
+    assert len(db.users) == 1
+
+
+def test_username_equal_to_submitter_email_is_not_matched(submit):
+    # Someone registered with the submitter's address as their username
+    db = QuoteDatabase([{'id': 3, 'username': 'wanjiku@example.com', 'email': 'other@example.com'}])
+
+    submit(db)
+
+    assert db.quotes[0]['customer_id'] != 3
+    assert db.users[-1]['email'] == 'wanjiku@example.com'
+
+
+def test_client_usernames_are_reserved():
+    username = app.client_username('Wanjiku.Kamau@Example.com')
+
+    assert len(username) <= 50
+    assert app.reserved_username(username)
+    assert username.lower() == app.client_username('wanjiku.kamau@example.com')
+    assert not app.reserved_username('wanjiku@example.com')
+    assert app.client_username('a@x.com') != app.client_username('b@x.com')
@@ -0,0 +1,49 @@
+import hashlib
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import app
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(app, 'VARIANT_FOLDER', str(tmp_path / 'variants'))
+    return tmp_path
+
+
+def jpeg_with_exif():
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90
+    Image.new('RGB', (40, 20), 'orange').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+def upload(data):
+    return FileStorage(stream=io.BytesIO(data), filename='roof.JPG')
+
+
+def test_upload_is_named_by_the_stored_bytes(folders):
+    data = jpeg_with_exif()
+
+    filename = app.save_upload(upload(data))
+
+    stored = (folders / filename).read_bytes()
+    assert stored != data
+    assert filename == hashlib.sha256(stored).hexdigest() + '.jpg'
+    assert list((folders / 'variants').iterdir())
+
+
+def test_identical_upload_reuses_the_blob(folders):
+    data = jpeg_with_exif()
+
+    first = app.save_upload(upload(data))
+    again = app.save_upload(upload(data))
+
+    assert again == first
+    assert sorted(path.name for path in folders.iterdir() if path.is_file()) == [first]